@@ -10,12 +10,36 @@ const PatternGenerator = () => {
   const [patternData, setPatternData] = useState(null);
   const navigate = useNavigate();
 
+  // Server-Sent Events arrive as "event: name\ndata: {json}" blocks separated by blank lines
+  const readEventStream = async (response, onEvent) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const blocks = buffer.split('\n\n');
+      buffer = blocks.pop();
+      for (const block of blocks) {
+        const fields = {};
+        for (const line of block.split('\n')) {
+          const separator = line.indexOf(': ');
+          if (separator > 0) fields[line.slice(0, separator)] = line.slice(separator + 2);
+        }
+        if (fields.event && fields.data) onEvent(fields.event, JSON.parse(fields.data));
+      }
+    }
+  };
+
   const generatePattern = async () => {
     if (!description.trim()) return;
-    
+
     setLoading(true);
+    setPattern('');
+    setPatternData(null);
     try {
-      const response = await fetch('http://localhost:8081/generate-simple-pattern', {
+      const response = await fetch('http://localhost:8081/generate-pattern-from-text/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -25,16 +49,25 @@ const PatternGenerator = () => {
           skill_level: skillLevel
         })
       });
-      
-      const data = await response.json();
-      
-      if (data.success) {
-        setPattern(data.pattern);
-        setPatternData(data);
-      } else {
-        setPattern(`Error: ${data.error}`);
-        setPatternData(null);
+
+      if (!response.ok) {
+        const data = await response.json();
+        const detail = Array.isArray(data.detail) ? data.detail[0].msg : data.detail;
+        throw new Error(detail || `Request failed with status ${response.status}`);
       }
+
+      // Show the pattern as it is written instead of waiting for all of it
+      let text = '';
+      await readEventStream(response, (event, data) => {
+        if (event === 'chunk') {
+          text += data.text;
+          setPattern(text);
+        } else if (event === 'metadata') {
+          setPatternData(data);
+        } else if (event === 'error') {
+          setPattern(`${text}\n\nError: ${data.error}`);
+        }
+      });
     } catch (error) {
       setPattern(`Error: ${error.message}`);
       setPatternData(null);
@@ -157,8 +190,8 @@ const PatternGenerator = () => {
             <div className="p-6 text-white" style={{backgroundColor: '#c9c9ff'}}>
               <div className="flex flex-col sm:flex-row justify-between items-start sm:items-center gap-4">
                 <div>
-                  <h2 className="text-2xl font-bold mb-1">Your Pattern is Ready!</h2>
-                  <p className="opacity-90">Time to start crocheting!</p>
+                  <h2 className="text-2xl font-bold mb-1">{loading ? 'Writing Your Pattern...' : 'Your Pattern is Ready!'}</h2>
+                  <p className="opacity-90">{loading ? 'Instructions appear as they are written' : 'Time to start crocheting!'}</p>
                 </div>
                 <div className="flex space-x-3">
                   <button
@@ -167,7 +200,13 @@ const PatternGenerator = () => {
                   >
                     Download TXT
                   </button>
-
+                  <button
+                    onClick={downloadPDF}
+                    disabled={loading}
+                    className="px-4 py-2 bg-white/20 hover:bg-white/30 text-white rounded-lg transition-all duration-200 hover:scale-105"
+                  >
+                    Download PDF
+                  </button>
                 </div>
               </div>
             </div>
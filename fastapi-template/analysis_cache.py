@@ -0,0 +1,136 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Optional
+
+# Disk hits only note their access time in memory; it is written at most this often
+TOUCH_FLUSH_INTERVAL = float(os.getenv('ANALYSIS_CACHE_TOUCH_FLUSH', '30'))
+
+
+class AnalysisCache:
+    """Content-addressed LRU cache for image analysis results.
+
+    Entries are keyed by (kind, image digest) so the OpenCV analysis and the
+    Gemini description of the same photo are cached independently. The
+    optional variant names the settings a result was computed with (feature
+    version, downscale budget), so persisted entries from an older
+    configuration are never served after it changes. When a
+    SQLite path is given, entries are written through to disk and survive
+    restarts; the in-memory LRU stays the first lookup. A disk hit does not
+    write: its recency is buffered and flushed with the next put() or after
+    TOUCH_FLUSH_INTERVAL. SQLite connections must not cross fork(), so a
+    forked worker reopens its own.
+    """
+
+    def __init__(self, max_entries: int = 256, db_path: Optional[str] = None, max_disk_entries: int = 10000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = defaultdict(int)
+        self._misses = defaultdict(int)
+        self.db_path = db_path
+        self._db = None
+        self._touched = {}
+        self._flushed_at = time.time()
+        if db_path:
+            self._connect()
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._after_fork)
+
+    def _connect(self) -> None:
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS analysis_cache (
+                kind TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                value TEXT NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (kind, digest)
+            )"""
+        )
+        self._db.commit()
+
+    def _after_fork(self) -> None:
+        # Another thread may have held the lock at fork time
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._connect()
+
+    def _write_touched(self, now: float) -> None:
+        """Write buffered access times; the caller commits"""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE analysis_cache SET accessed_at = MAX(accessed_at, ?) WHERE kind = ? AND digest = ?",
+                [(accessed_at, *key) for key, accessed_at in self._touched.items()]
+            )
+            self._touched.clear()
+        self._flushed_at = now
+
+    @staticmethod
+    def _key(kind: str, digest: str, variant: str) -> tuple:
+        return (kind, f"{digest}:{variant}" if variant else digest)
+
+    def get(self, kind: str, digest: str, variant: str = "") -> Optional[Any]:
+        key = self._key(kind, digest, variant)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits[kind] += 1
+                return self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM analysis_cache WHERE kind = ? AND digest = ?", key
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    now = time.time()
+                    self._touched[key] = now
+                    if now - self._flushed_at >= TOUCH_FLUSH_INTERVAL:
+                        self._write_touched(now)
+                        self._db.commit()
+                    self._remember(key, value)
+                    self._hits[kind] += 1
+                    return value
+
+            self._misses[kind] += 1
+            return None
+
+    def put(self, kind: str, digest: str, value: Any, variant: str = "") -> None:
+        key = self._key(kind, digest, variant)
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                now = time.time()
+                # Eviction below needs current recency
+                self._write_touched(now)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (kind, digest, value, accessed_at) VALUES (?, ?, ?, ?)",
+                    (*key, json.dumps(value), now)
+                )
+                self._db.execute(
+                    """DELETE FROM analysis_cache WHERE rowid IN (
+                        SELECT rowid FROM analysis_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_disk_entries,)
+                )
+                self._db.commit()
+
+    def _remember(self, key, value) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            kinds = set(self._hits) | set(self._misses)
+            return {
+                "entries": len(self._entries),
+                "persistent": self._db is not None,
+                **{kind: {"hits": self._hits[kind], "misses": self._misses[kind]} for kind in sorted(kinds)}
+            }
@@ -0,0 +1,305 @@
+"""Build or incrementally update the FAISS index used by RAGPipeline.
+
+Embeds every example in training_data.jsonl with the same MiniLM encoder the
+API uses, L2-normalizes the vectors so inner-product search is cosine
+similarity, and writes pattern_vectors.faiss plus pattern_metadata.pkl.
+Runs append only the examples whose source_file is not indexed yet.
+
+The index type is configurable for larger corpora: RAG_INDEX_TYPE selects
+flat (exact), ivf or hnsw, and RAG_INDEX_PQ=1 stores product-quantized codes
+instead of full vectors. IVF and PQ indexes are trained on the first
+TRAIN_SIZE embeddings; appends reuse the trained quantizer, so pass
+--rebuild after the corpus has grown substantially. A corpus too small to
+train them is indexed flat instead. `--benchmark` reports
+recall and latency of each option against the flat index.
+"""
+import argparse
+import json
+import math
+import os
+import pickle
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from training_store import parse_example
+
+TRAINING_FILE = Path("training_data/training_data.jsonl")
+INDEX_PATH = Path("pattern_vectors.faiss")
+METADATA_PATH = Path("pattern_metadata.pkl")
+ENCODER_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_DIM = 384
+
+INDEX_TYPE = os.getenv('RAG_INDEX_TYPE', 'flat')
+USE_PQ = os.getenv('RAG_INDEX_PQ', '0') == '1'
+PQ_M = int(os.getenv('RAG_PQ_M', '48'))
+PQ_BITS = int(os.getenv('RAG_PQ_BITS', '8'))
+HNSW_M = int(os.getenv('RAG_HNSW_M', '32'))
+NPROBE = int(os.getenv('RAG_NPROBE', '16'))
+EF_SEARCH = int(os.getenv('RAG_EF_SEARCH', '64'))
+TRAIN_SIZE = int(os.getenv('RAG_TRAIN_SIZE', '100000'))
+
+
+def ivf_nlist(n_vectors):
+    """About 4 * sqrt(N) lists, keeping at least 39 training points per list"""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def training_points_needed(index_type, n_vectors, pq=False, pq_bits=PQ_BITS):
+    """Fewest vectors that train the index's quantizers: 39 per centroid"""
+    needed = ivf_nlist(n_vectors) * 39 if index_type == 'ivf' else 0
+    if pq:
+        needed = max(needed, 2 ** pq_bits * 39)
+    return needed
+
+
+def index_description(index_type, n_vectors, pq=False, pq_m=PQ_M, pq_bits=PQ_BITS, hnsw_m=HNSW_M):
+    """faiss.index_factory string for a configured index type"""
+    storage = f"PQ{pq_m}x{pq_bits}" if pq else "Flat"
+    if index_type == 'flat':
+        return storage
+    if index_type == 'ivf':
+        return f"IVF{ivf_nlist(n_vectors)},{storage}"
+    if index_type == 'hnsw':
+        return f"HNSW{hnsw_m}_{storage}" if pq else f"HNSW{hnsw_m},Flat"
+    raise ValueError(f"Unknown index type: {index_type}")
+
+
+def create_index(index_type=INDEX_TYPE, n_vectors=0, pq=USE_PQ, **options):
+    description = index_description(index_type, n_vectors, pq, **options)
+    # HNSW over PQ codes only supports L2; on normalized vectors it ranks like cosine
+    metric = faiss.METRIC_L2 if index_type == 'hnsw' and pq else faiss.METRIC_INNER_PRODUCT
+    return faiss.index_factory(EMBEDDING_DIM, description, metric)
+
+
+def configure_search(index, nprobe=NPROBE, ef_search=EF_SEARCH):
+    """Apply query-time recall/latency knobs for IVF and HNSW indexes"""
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass
+    hnsw = getattr(faiss.downcast_index(index), 'hnsw', None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search
+    return index
+
+
+def read_shared_index(path):
+    """Read an index for serving with its vectors left in the page cache.
+
+    The memory-mapped codes are shared by every process that opens the file,
+    so multiple API workers do not each hold a private copy. Flat indexes
+    are only memory-mapped by IO_FLAG_MMAP_IFC (faiss 1.11+); older faiss
+    reads them into private memory. The result is read-only; build and
+    append through load_existing instead.
+    """
+    flag = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP)
+    return faiss.read_index(str(path), flag | faiss.IO_FLAG_READ_ONLY)
+
+
+def similarity_scores(index, distances):
+    """Convert search output to cosine similarity regardless of index metric"""
+    if index.metric_type == faiss.METRIC_L2:
+        return 1 - distances / 2
+    return distances
+
+
+def load_encoder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(ENCODER_NAME)
+
+
+def pattern_metadata(example):
+    """Metadata entry in the shape RAGPipeline.retrieve_similar_patterns returns"""
+    record = parse_example(example)
+    title = record.title or example.get('input', '').replace("Generate a crochet pattern for: ", "") or "Pattern"
+    return {
+        'title': title,
+        'skill_level': record.skill_level,
+        'materials': record.materials or 'N/A',
+        'instructions': record.instructions or example.get('output', '')[:1000],
+        'source_file': record.source_file,
+    }
+
+
+def embedding_text(metadata):
+    """Text embedded for retrieval: what the pattern is, then how it is made"""
+    return f"{metadata['title']}. {metadata['skill_level']}. {metadata['materials']} {metadata['instructions']}"[:2000]
+
+
+def read_new_examples(training_file, indexed_sources):
+    """Yield metadata for examples whose source_file is not indexed yet"""
+    seen = set(indexed_sources)
+    with open(training_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                example = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            source = example.get('source_file')
+            if source in seen:
+                continue
+            seen.add(source)
+            yield pattern_metadata(example)
+
+
+def embed(encoder, texts, batch_size):
+    vectors = encoder.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def load_existing(index_path, metadata_path):
+    """Return the current index and metadata, or (None, []) when absent or inconsistent"""
+    if Path(index_path).exists() and Path(metadata_path).exists():
+        index = faiss.read_index(str(index_path))
+        with open(metadata_path, 'rb') as f:
+            metadata = pickle.load(f)
+        if index.ntotal == len(metadata):
+            return index, metadata
+        print(f"Index has {index.ntotal} vectors but metadata has {len(metadata)} entries, rebuilding")
+    return None, []
+
+
+def write_atomically(index, metadata, index_path, metadata_path):
+    """Write both files via temp files and rename.
+
+    The index is replaced first: a reader that loads between the two renames
+    sees extra vectors without metadata, which retrieval already skips.
+    """
+    index_tmp = f"{index_path}.{os.getpid()}.tmp"
+    metadata_tmp = f"{metadata_path}.{os.getpid()}.tmp"
+    faiss.write_index(index, index_tmp)
+    with open(metadata_tmp, 'wb') as f:
+        pickle.dump(metadata, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(index_tmp, index_path)
+    os.replace(metadata_tmp, metadata_path)
+
+
+def build_vector_db(training_file=TRAINING_FILE, index_path=INDEX_PATH, metadata_path=METADATA_PATH,
+                    encoder=None, batch_size=64, rebuild=False, index_type=INDEX_TYPE, pq=USE_PQ):
+    """Embed new training examples into the index; returns how many were added"""
+    index, metadata = (None, []) if rebuild else load_existing(index_path, metadata_path)
+
+    new_entries = list(read_new_examples(training_file, (entry.get('source_file') for entry in metadata)))
+    if index is None:
+        if len(new_entries) < training_points_needed(index_type, len(new_entries), pq):
+            print(f"Only {len(new_entries)} examples, too few to train "
+                  f"{index_description(index_type, len(new_entries), pq)}; building a flat index instead")
+            index_type, pq = 'flat', False
+        index = create_index(index_type, len(new_entries), pq)
+
+    untrained = []
+    chunk = batch_size * 8
+    for start in range(0, len(new_entries), chunk):
+        entries = new_entries[start:start + chunk]
+        encoder = encoder or load_encoder()
+        vectors = embed(encoder, [embedding_text(e) for e in entries], batch_size)
+        metadata.extend(entries)
+        if index.is_trained:
+            index.add(vectors)
+        else:
+            # Buffer embeddings until there are enough to train the quantizers
+            untrained.append(vectors)
+            if sum(len(v) for v in untrained) >= TRAIN_SIZE:
+                train_and_add(index, untrained)
+                untrained = []
+        print(f"Embedded {min(start + chunk, len(new_entries))}/{len(new_entries)} new patterns...")
+
+    if untrained:
+        train_and_add(index, untrained)
+
+    if new_entries or rebuild:
+        write_atomically(index, metadata, index_path, metadata_path)
+    return len(new_entries)
+
+
+def train_and_add(index, batches):
+    vectors = np.concatenate(batches)
+    index.train(vectors)
+    index.add(vectors)
+
+
+def benchmark_indexes(vectors, queries, configs, k=10):
+    """Recall@k and single-query latency of each config against exact search.
+
+    configs is a list of dicts with index_type, pq and optional nprobe,
+    ef_search and index_description options; vectors must be normalized.
+    """
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for config in configs:
+        config = dict(config)
+        nprobe = config.pop('nprobe', NPROBE)
+        ef_search = config.pop('ef_search', EF_SEARCH)
+        index = create_index(n_vectors=len(vectors), **config)
+
+        build_start = time.perf_counter()
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        build_time = time.perf_counter() - build_start
+        configure_search(index, nprobe, ef_search)
+
+        found = []
+        search_start = time.perf_counter()
+        for query in queries:
+            found.append(index.search(query[None, :], k)[1][0])
+        latency = (time.perf_counter() - search_start) / len(queries)
+
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        rows.append({
+            'index': index_description(config.pop('index_type', INDEX_TYPE), len(vectors), config.pop('pq', USE_PQ), **config),
+            'nprobe': nprobe,
+            'ef_search': ef_search,
+            'recall': float(recall),
+            'latency_ms': latency * 1000,
+            'build_s': build_time,
+            'bytes': faiss.serialize_index(index).size,
+        })
+    return rows
+
+
+def print_benchmark(rows):
+    print(f"{'index':<22}{'nprobe':>7}{'efSearch':>9}{'recall':>8}{'ms/query':>10}{'build s':>9}{'MB':>8}")
+    for row in rows:
+        print(f"{row['index']:<22}{row['nprobe']:>7}{row['ef_search']:>9}{row['recall']:>8.3f}"
+              f"{row['latency_ms']:>10.3f}{row['build_s']:>9.2f}{row['bytes'] / 2**20:>8.1f}")
+
+
+DEFAULT_BENCHMARK = [
+    {'index_type': 'flat', 'pq': False},
+    {'index_type': 'ivf', 'pq': False, 'nprobe': 1},
+    {'index_type': 'ivf', 'pq': False, 'nprobe': 8},
+    {'index_type': 'ivf', 'pq': False, 'nprobe': 32},
+    {'index_type': 'ivf', 'pq': True, 'nprobe': 32},
+    {'index_type': 'hnsw', 'pq': False, 'ef_search': 16},
+    {'index_type': 'hnsw', 'pq': False, 'ef_search': 64},
+    {'index_type': 'hnsw', 'pq': False, 'ef_search': 256},
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the RAG vector database from training data")
+    parser.add_argument('--rebuild', action='store_true', help="re-embed the full corpus instead of appending")
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--benchmark', action='store_true', help="compare index types on the built corpus")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        index, _ = load_existing(INDEX_PATH, METADATA_PATH)
+        if index is None:
+            raise SystemExit("Build the vector database first")
+        vectors = index.reconstruct_n(0, index.ntotal)
+        queries = vectors[np.random.default_rng(0).choice(len(vectors), min(200, len(vectors)), replace=False)]
+        print_benchmark(benchmark_indexes(vectors, queries, DEFAULT_BENCHMARK))
+        raise SystemExit(0)
+
+    added = build_vector_db(batch_size=args.batch_size, rebuild=args.rebuild)
+    print(f"Added {added} patterns to {INDEX_PATH}")
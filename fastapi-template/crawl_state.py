@@ -0,0 +1,219 @@
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from pdf_downloader import filename_for
+
+# Failed downloads wait RETRY_BASE * 2**(failures - 1) seconds, capped at RETRY_MAX
+RETRY_BASE = 15 * 60
+RETRY_MAX = 24 * 3600
+
+
+class CrawlState:
+    """What the scraper has seen and fetched, kept in SQLite across runs.
+
+    `patterns` holds every PDF URL found on a listing page with its download
+    status, content hash and failure count. Failed URLs wait out an
+    exponential backoff and are handed back by due_retries(). `pages`
+    records when each listing page was last crawled and how many new
+    patterns it had, `failed_pages` the pages a crawl had to skip, and
+    `crawl_meta` the last listing page seen when a walk reached the end.
+
+    An incremental crawl may only stop at the first page holding known
+    patterns once full_pass_complete(): some walk reached the end and every
+    page up to it was crawled. Until then a walk that died part way would
+    leave later pages undiscovered. Afterwards pages_to_revisit() names the
+    pages an incremental crawl must still visit.
+    """
+
+    def __init__(self, db_path: str = "scraped_patterns/crawl_state.db", max_failures: int = 5):
+        self.db_path = db_path
+        self.max_failures = max_failures
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(
+            """CREATE TABLE IF NOT EXISTS patterns (
+                url TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                listing_page INTEGER,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                content_hash TEXT,
+                size INTEGER,
+                downloaded_at REAL,
+                failures INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_retry_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                page_number INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                last_crawled REAL NOT NULL,
+                pattern_count INTEGER NOT NULL,
+                new_patterns INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS failed_pages (
+                page_number INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                failed_at REAL NOT NULL,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS crawl_meta (
+                key TEXT PRIMARY KEY,
+                value
+            );
+            CREATE INDEX IF NOT EXISTS patterns_retry ON patterns (status, next_retry_at);"""
+        )
+        self._db.commit()
+
+    def record_page(self, page_number: int, url: str, hrefs: Iterable[str]) -> tuple:
+        """Mark a listing page's links as seen.
+
+        Returns (new, pending): links never seen before, and links seen
+        before that have not been downloaded yet and are not waiting out a
+        retry backoff.
+        """
+        hrefs = list(dict.fromkeys(hrefs))
+        now = time.time()
+        with self._lock:
+            known = self._known(hrefs)
+            new = [href for href in hrefs if href not in known]
+            pending = [href for href in hrefs if href in known and known[href] == 'pending']
+            self._db.executemany(
+                "INSERT INTO patterns (url, filename, listing_page, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)",
+                [(href, filename_for(href), page_number, now, now) for href in new]
+            )
+            self._db.executemany(
+                "UPDATE patterns SET last_seen = ?, listing_page = ? WHERE url = ?",
+                [(now, page_number, href) for href in hrefs if href in known]
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (page_number, url, now, len(hrefs), len(new))
+            )
+            self._db.execute("DELETE FROM failed_pages WHERE page_number = ?", (page_number,))
+            self._db.commit()
+        return new, pending
+
+    def record_page_failure(self, page_number: int, url: str, error: Optional[str] = None) -> None:
+        """Remember a listing page the crawl had to skip"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO failed_pages VALUES (?, ?, ?, ?)",
+                (page_number, url, time.time(), (error or '')[:500])
+            )
+            self._db.commit()
+
+    def record_end(self, page_number: int) -> None:
+        """A walk found page_number loaded but empty, so the catalogue ends before it"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO crawl_meta VALUES ('last_page', ?)", (page_number - 1,)
+            )
+            self._db.commit()
+
+    def last_page(self) -> Optional[int]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM crawl_meta WHERE key = 'last_page'").fetchone()
+        return row[0] if row else None
+
+    def pages_to_revisit(self) -> List[int]:
+        """Skipped pages, and pages up to the known end that were never crawled"""
+        last_page = self.last_page()
+        with self._lock:
+            failed = {row[0] for row in self._db.execute("SELECT page_number FROM failed_pages")}
+            crawled = {row[0] for row in self._db.execute("SELECT page_number FROM pages")}
+        missing = set(range(1, last_page + 1)) - crawled if last_page is not None else set()
+        return sorted(failed | missing)
+
+    def full_pass_complete(self) -> bool:
+        """True once some walk reached the end with every page crawled; it stays true"""
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM crawl_meta WHERE key = 'full_pass_at'").fetchone():
+                return True
+        if self.last_page() is None or self.pages_to_revisit():
+            return False
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO crawl_meta VALUES ('full_pass_at', ?)", (time.time(),))
+            self._db.commit()
+        return True
+
+    def _known(self, hrefs: List[str]) -> dict:
+        known = {}
+        for start in range(0, len(hrefs), 500):
+            batch = hrefs[start:start + 500]
+            rows = self._db.execute(
+                f"SELECT url, status FROM patterns WHERE url IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            known.update(rows)
+        return known
+
+    def record_download(self, url: str, content_hash: Optional[str] = None, size: Optional[int] = None) -> None:
+        with self._lock:
+            self._db.execute(
+                """INSERT INTO patterns (url, filename, status, first_seen, last_seen, content_hash, size,
+                                         downloaded_at, failures)
+                   VALUES (?, ?, 'downloaded', ?, ?, ?, ?, ?, 0)
+                   ON CONFLICT(url) DO UPDATE SET status = 'downloaded',
+                       content_hash = COALESCE(excluded.content_hash, content_hash),
+                       size = COALESCE(excluded.size, size), downloaded_at = excluded.downloaded_at,
+                       failures = 0, last_error = NULL, next_retry_at = NULL""",
+                (url, filename_for(url), time.time(), time.time(), content_hash, size, time.time())
+            )
+            self._db.commit()
+
+    def record_failure(self, url: str, error: Optional[str] = None) -> None:
+        """Count a failed download and schedule its next attempt"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT failures FROM patterns WHERE url = ?", (url,)).fetchone()
+            failures = (row[0] if row else 0) + 1
+            status = 'failed' if failures < self.max_failures else 'abandoned'
+            next_retry_at = now + min(RETRY_MAX, RETRY_BASE * 2 ** (failures - 1))
+            self._db.execute(
+                """INSERT INTO patterns (url, filename, status, first_seen, last_seen, failures, last_error,
+                                         next_retry_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(url) DO UPDATE SET status = excluded.status, failures = excluded.failures,
+                       last_error = excluded.last_error, next_retry_at = excluded.next_retry_at""",
+                (url, filename_for(url), status, now, now, failures, (error or '')[:500], next_retry_at)
+            )
+            self._db.commit()
+
+    def due_retries(self, now: Optional[float] = None) -> List[str]:
+        """Failed URLs whose backoff has elapsed, oldest first"""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT url FROM patterns WHERE status = 'failed' AND next_retry_at <= ? ORDER BY next_retry_at",
+                (now,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def pending(self) -> List[str]:
+        """URLs seen on a listing page but never downloaded, oldest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT url FROM patterns WHERE status = 'pending' ORDER BY first_seen"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def record_result(self, result) -> None:
+        """Store the outcome of one pdf_downloader.DownloadResult"""
+        if result.status == 'failed':
+            self.record_failure(result.url, result.error)
+        else:
+            self.record_download(result.url, result.sha256, result.size)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM patterns GROUP BY status").fetchall())
+            pages, last_crawled = self._db.execute("SELECT COUNT(*), MAX(last_crawled) FROM pages").fetchone()
+            failed_pages = self._db.execute("SELECT COUNT(*) FROM failed_pages").fetchone()[0]
+        return {"patterns": counts, "pages": pages, "failed_pages": failed_pages, "last_page": self.last_page(),
+                "last_crawled": last_crawled}
+
+    def close(self) -> None:
+        self._db.close()
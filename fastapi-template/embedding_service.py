@@ -0,0 +1,118 @@
+import asyncio
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Cache key for a query: case and whitespace differences share an embedding"""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingService:
+    """Micro-batching front end for a SentenceTransformer-style encoder.
+
+    Callers on any thread submit single texts; a worker thread gathers the
+    requests that arrive within max_wait seconds (up to max_batch) and encodes
+    them in one forward pass. Results are kept in a bounded LRU keyed by the
+    normalized text, so repeated descriptions skip the encoder entirely.
+    """
+
+    def __init__(self, encoder, max_batch: int = 32, max_wait: float = 0.005, cache_size: int = 1024):
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._queue = queue.Queue()
+        self._worker = None
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.encoded = 0
+
+    def _cached(self, key: str) -> Optional[np.ndarray]:
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        return None
+
+    def submit(self, text: str) -> Future:
+        """Return a future for the embedding of text"""
+        key = normalize_text(text)
+        with self._lock:
+            cached = self._cached(key)
+            if cached is not None:
+                self.hits += 1
+                future = Future()
+                future.set_result(cached)
+                return future
+            self.misses += 1
+            # Identical texts already queued share one slot in the batch
+            if key in self._pending:
+                return self._pending[key]
+            future = Future()
+            self._pending[key] = future
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+        self._queue.put(key)
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.submit(text).result()
+
+    async def encode_async(self, text: str) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=self.max_wait))
+            except queue.Empty:
+                pass
+            self._encode_batch(batch)
+
+    def _encode_batch(self, keys):
+        try:
+            vectors = np.asarray(
+                self.encoder.encode(keys, batch_size=len(keys), convert_to_numpy=True, show_progress_bar=False),
+                dtype=np.float32
+            )
+        except Exception as e:
+            with self._lock:
+                futures = [self._pending.pop(key) for key in keys]
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.encoded += len(keys)
+            futures = []
+            for key, vector in zip(keys, vectors):
+                self._cache[key] = vector
+                self._cache.move_to_end(key)
+                futures.append(self._pending.pop(key))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        for future, vector in zip(futures, vectors):
+            future.set_result(vector)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "cached": len(self._cache),
+                "batches": self.batches,
+                "average_batch": round(self.encoded / self.batches, 2) if self.batches else 0,
+            }
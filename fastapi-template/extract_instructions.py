@@ -1,70 +1,84 @@
-import pdfplumber
 import fitz  # PyMuPDF
 import cv2
 import numpy as np
 from PIL import Image
 import io
 import os
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from gemini_client import get_vision_client, vision_retry
+
+# Append-only record of finished PDFs in the output directory; the last line
+# for a file wins, so an interrupted run resumes where it stopped
+MANIFEST_NAME = "manifest.jsonl"
+
+# Images narrower or shorter than this are decorations, not pattern photos
+MIN_IMAGE_SIDE = 50
+
+
+def pixmap_array(pix):
+    """View a pixmap's samples as an HxW (gray) or HxWxN array without copying"""
+    img_array = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    return img_array[:, :, 0] if pix.n == 1 else img_array
 
 class PDFProcessor:
     def __init__(self, use_vision=False):
         self.use_vision = use_vision
         if use_vision:
-            from google.cloud import vision
-            self.vision_client = vision.ImageAnnotatorClient()
+            self.vision_client = get_vision_client()
+            self.vision_retry = vision_retry()
     
     def extract_images_and_text(self, pdf_path):
-        """Extract images and text from PDF using pdfplumber and PyMuPDF"""
+        """Extract images and text from PDF in a single PyMuPDF page walk"""
         results = {'text': '', 'images': [], 'image_descriptions': []}
-        
-        # Extract text with pdfplumber
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                if page.extract_text():
-                    results['text'] += page.extract_text() + '\n'
-        
-        # Extract images with PyMuPDF
-        doc = fitz.open(pdf_path)
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            image_list = page.get_images()
-            
-            for img_index, img in enumerate(image_list):
-                try:
-                    xref = img[0]
-                    pix = fitz.Pixmap(doc, xref)
-                    
-                    if pix.n - pix.alpha < 4:  # GRAY or RGB
-                        img_data = pix.tobytes("png")
-                        img_pil = Image.open(io.BytesIO(img_data))
-                        img_array = np.array(img_pil)
-                        
-                        # Skip small images
-                        if img_array.shape[0] < 50 or img_array.shape[1] < 50:
-                            pix = None
-                            continue
-                        
-                        # Process with OpenCV
-                        processed_img = self._process_image(img_array)
-                        if processed_img is not None:
-                            results['images'].append(processed_img)
-                            
-                            # Get description
-                            if self.use_vision:
-                                description = self._get_image_description(processed_img)
-                                results['image_descriptions'].append(description)
-                            else:
-                                results['image_descriptions'].append(f"Image {len(results['images'])}: {processed_img.shape}")
-                    
-                    pix = None
-                    
-                except Exception as e:
-                    print(f"Error extracting image {img_index} from page {page_num}: {str(e)[:100]}")
-        
-        doc.close()
+        # Logos and borders repeat on every page; decode each xref once
+        processed_by_xref = {}
+
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                text = page.get_text()
+                if text.strip():
+                    results['text'] += text + '\n'
+
+                for img_index, img in enumerate(page.get_images(full=True)):
+                    xref, _, width, height = img[:4]
+                    # Skip small images from the xref metadata, before decoding
+                    if width < MIN_IMAGE_SIDE or height < MIN_IMAGE_SIDE:
+                        continue
+                    try:
+                        if xref not in processed_by_xref:
+                            processed_by_xref[xref] = self._decode_and_process(doc, xref)
+                        processed_img = processed_by_xref[xref]
+                    except Exception as e:
+                        print(f"Error extracting image {img_index} from page {page.number}: {str(e)[:100]}")
+                        continue
+                    if processed_img is None:
+                        continue
+
+                    results['images'].append(processed_img)
+                    # Get description
+                    if self.use_vision:
+                        description = self._get_image_description(processed_img)
+                        results['image_descriptions'].append(description)
+                    else:
+                        results['image_descriptions'].append(f"Image {len(results['images'])}: {processed_img.shape}")
+
         return results
-    
+
+    def _decode_and_process(self, doc, xref):
+        pix = fitz.Pixmap(doc, xref)
+        if pix.n - pix.alpha >= 4:  # CMYK and other non GRAY/RGB spaces
+            return None
+        img_array = pixmap_array(pix)
+        processed_img = self._process_image(img_array)
+        # The array views the pixmap's buffer, which is freed with the pixmap
+        if processed_img is not None and np.shares_memory(processed_img, img_array):
+            processed_img = processed_img.copy()
+        return processed_img
+
     def _process_image(self, img_array):
         """Process image using OpenCV"""
         try:
@@ -107,8 +121,8 @@ class PDFProcessor:
             image = vision.Image(content=img_bytes)
             
             # Detect text and objects
-            text_response = self.vision_client.text_detection(image=image)
-            label_response = self.vision_client.label_detection(image=image)
+            text_response = self.vision_client.text_detection(image=image, retry=self.vision_retry)
+            label_response = self.vision_client.label_detection(image=image, retry=self.vision_retry)
             
             description = ""
             if text_response.text_annotations:
@@ -123,36 +137,165 @@ class PDFProcessor:
             print(f"Error getting image description: {e}")
             return "No description available"
     
-    def process_pdf_batch(self, pdf_directory, output_directory, max_files=5):
-        """Process multiple PDFs in a directory"""
+    def process_pdf(self, pdf_file, output_dir):
+        """Extract one PDF and write its summary; returns a manifest record"""
+        pdf_file = Path(pdf_file)
+        record = file_record(pdf_file)
+        start = time.perf_counter()
+        try:
+            results = self.extract_images_and_text(pdf_file)
+            write_summary(Path(output_dir) / f"{pdf_file.stem}_processed.txt", pdf_file, results)
+            record.update(status='done', text_chars=len(results['text']), images=len(results['images']))
+        except Exception as e:
+            record.update(status='error', error=str(e)[:200])
+        record['seconds'] = round(time.perf_counter() - start, 3)
+        return record
+
+    def process_pdf_batch(self, pdf_directory, output_directory, max_files=5, workers=1):
+        """Process multiple PDFs in a directory.
+
+        With workers > 1 the files are spread over a process pool. PDFs whose
+        summary is up to date according to the manifest are skipped, so a
+        rerun only extracts new or changed files.
+        """
         pdf_dir = Path(pdf_directory)
         output_dir = Path(output_directory)
         output_dir.mkdir(exist_ok=True)
-        
-        pdf_files = list(pdf_dir.glob('*.pdf'))[:max_files]
-        
+
+        pdf_files = sorted(pdf_dir.glob('*.pdf'))[:max_files]
+        manifest_path = output_dir / MANIFEST_NAME
+        manifest = load_manifest(manifest_path)
+        pending = []
         for pdf_file in pdf_files:
-            print(f"Processing {pdf_file.name}...")
+            entry = manifest.get(pdf_file.name)
+            if is_up_to_date(pdf_file, entry, output_dir / f"{pdf_file.stem}_processed.txt"):
+                continue
+            pending.append(pdf_file)
+        skipped = len(pdf_files) - len(pending)
+        print(f"Processing {len(pending)} PDFs with {workers} workers ({skipped} already up to date)")
+
+        # Largest files first so one big PDF does not finish the run alone
+        pending.sort(key=lambda path: path.stat().st_size, reverse=True)
+        counts = {'processed': 0, 'failed': 0, 'skipped': skipped}
+        with open(manifest_path, 'a', encoding='utf-8') as manifest_file:
+            for pdf_file in pdf_files:
+                if pdf_file in pending:
+                    continue
+                entry = manifest.get(pdf_file.name)
+                if entry is None:
+                    # Summaries from before the manifest existed are adopted once
+                    manifest_file.write(json.dumps({**file_record(pdf_file), 'status': 'done'}) + '\n')
+                elif entry['mtime'] != pdf_file.stat().st_mtime:
+                    # Files matched by hash get their new mtime recorded so the next run skips the hash
+                    manifest_file.write(json.dumps({**entry, 'mtime': pdf_file.stat().st_mtime}) + '\n')
+            for record in self._run(pending, output_dir, workers):
+                manifest_file.write(json.dumps(record) + '\n')
+                manifest_file.flush()
+                if record['status'] == 'done':
+                    counts['processed'] += 1
+                    print(f"✅ Completed {record['file']} - Text: {record['text_chars']} chars, Images: {record['images']}")
+                else:
+                    counts['failed'] += 1
+                    print(f"❌ Error processing {record['file']}: {record['error']}")
+        return counts
+
+    def _run(self, pdf_files, output_dir, workers):
+        if workers <= 1 or len(pdf_files) <= 1:
+            for pdf_file in pdf_files:
+                print(f"Processing {pdf_file.name}...")
+                yield self.process_pdf(pdf_file, output_dir)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.use_vision,)) as executor:
+            futures = [executor.submit(_process_in_worker, str(pdf_file), str(output_dir)) for pdf_file in pdf_files]
+            for future in as_completed(futures):
+                yield future.result()
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path):
+    """Latest record per file; a line cut short by an interrupted run is ignored"""
+    manifest = {}
+    if not manifest_path.exists():
+        return manifest
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
             try:
-                results = self.extract_images_and_text(pdf_file)
-                
-                # Save results
-                output_file = output_dir / f"{pdf_file.stem}_processed.txt"
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write(f"PDF: {pdf_file.name}\n")
-                    f.write(f"Text length: {len(results['text'])} chars\n")
-                    f.write(f"Images found: {len(results['images'])}\n")
-                    f.write(f"Text Content:\n{results['text'][:1000]}...\n\n")
-                    f.write(f"Image Descriptions:\n")
-                    for i, desc in enumerate(results['image_descriptions']):
-                        f.write(f"Image {i+1}: {desc}\n")
-                
-                print(f"✅ Completed {pdf_file.name} - Text: {len(results['text'])} chars, Images: {len(results['images'])}")
-                
-            except Exception as e:
-                print(f"❌ Error processing {pdf_file.name}: {e}")
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            manifest[record['file']] = record
+    return manifest
+
+
+def file_record(pdf_file):
+    """Manifest fields identifying the PDF's current contents"""
+    stat = pdf_file.stat()
+    return {
+        'file': pdf_file.name,
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'sha256': file_sha256(pdf_file),
+    }
+
+
+def is_up_to_date(pdf_file, entry, output_file):
+    """True when the summary was written from the PDF's current contents.
+
+    Matching mtime and size is enough; a re-downloaded file with a new mtime
+    is compared by hash before being extracted again. Without a manifest
+    entry, a summary at least as new as the PDF counts as current.
+    """
+    if not output_file.exists():
+        return False
+    if entry is None:
+        return output_file.stat().st_mtime >= pdf_file.stat().st_mtime
+    if entry.get('status') != 'done':
+        return False
+    stat = pdf_file.stat()
+    if stat.st_size != entry['size']:
+        return False
+    return stat.st_mtime == entry['mtime'] or file_sha256(pdf_file) == entry['sha256']
+
+
+def write_summary(output_file, pdf_file, results):
+    # Written under a temporary name so an interrupted run leaves no partial summary
+    tmp_file = output_file.with_suffix('.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(f"PDF: {pdf_file.name}\n")
+        f.write(f"Text length: {len(results['text'])} chars\n")
+        f.write(f"Images found: {len(results['images'])}\n")
+        f.write(f"Text Content:\n{results['text'][:1000]}...\n\n")
+        f.write(f"Image Descriptions:\n")
+        for i, desc in enumerate(results['image_descriptions']):
+            f.write(f"Image {i+1}: {desc}\n")
+    os.replace(tmp_file, output_file)
+
+
+_worker_processor = None
+
+
+def _init_worker(use_vision):
+    global _worker_processor
+    # One process per core already; OpenCV's own threads would oversubscribe
+    cv2.setNumThreads(1)
+    _worker_processor = PDFProcessor(use_vision=use_vision)
+
+
+def _process_in_worker(pdf_file, output_dir):
+    return _worker_processor.process_pdf(pdf_file, output_dir)
 
 if __name__ == "__main__":
     processor = PDFProcessor(use_vision=False)
     print("Processing all PDFs from scraped_patterns...")
-    processor.process_pdf_batch("scraped_patterns", "processed_pdfs", max_files=3200)
\ No newline at end of file
+    workers = int(os.getenv('EXTRACT_WORKERS', os.cpu_count() or 1))
+    counts = processor.process_pdf_batch("scraped_patterns", "processed_pdfs", max_files=3200, workers=workers)
+    print(f"Done: {counts}")
\ No newline at end of file
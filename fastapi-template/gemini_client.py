@@ -0,0 +1,155 @@
+"""Process-wide Google API clients shared by the API and the data-prep scripts.
+
+genai.configure() throws away the SDK's cached gRPC clients, so configuring
+and building a GenerativeModel per request opened a fresh channel (and TLS
+handshake) every time. Here the SDK is configured once per process and models
+are cached by name, so every caller reuses one long-lived channel. Calls get a
+deadline (GEMINI_TIMEOUT) and are retried with jittered exponential backoff
+on 429 and 5xx responses.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+from google.generativeai.types import generation_types
+
+DEFAULT_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
+TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '60'))
+MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '3'))
+BACKOFF_BASE = float(os.getenv('GEMINI_BACKOFF_BASE', '1.0'))
+BACKOFF_MAX = float(os.getenv('GEMINI_BACKOFF_MAX', '20'))
+
+# Rate limited, server errors and gateway timeouts are worth another attempt
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_lock = threading.Lock()
+_configured_key = None
+_models = {}
+
+
+def is_retryable(error):
+    """True for google.api_core errors carrying a retryable HTTP status"""
+    return getattr(error, 'code', None) in RETRYABLE_STATUS
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    """Full-jitter exponential backoff so concurrent retries spread out"""
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+def configure(api_key=None):
+    """Configure the SDK once; repeated calls with the same key are no-ops"""
+    global _configured_key
+    api_key = api_key or os.getenv('GEMINI_API_KEY')
+    with _lock:
+        if api_key != _configured_key:
+            genai.configure(api_key=api_key)
+            _configured_key = api_key
+            # Models hold clients bound to the previous configuration
+            _models.clear()
+
+
+def get_model(model_name=DEFAULT_MODEL, api_key=None):
+    """Shared GeminiModel for model_name"""
+    configure(api_key)
+    with _lock:
+        if model_name not in _models:
+            _models[model_name] = GeminiModel(model_name)
+        return _models[model_name]
+
+
+class GeminiModel:
+    """genai.GenerativeModel with a per-call deadline and retries.
+
+    Exposes the same generate_content / generate_content_async methods, so it
+    drops in wherever a GenerativeModel was used.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, timeout=TIMEOUT, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE):
+        self.model = genai.GenerativeModel(model_name)
+        self.model_name = model_name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+    def _request(self, contents):
+        # GenerativeModel does not forward a timeout, so requests go straight
+        # to the SDK's shared gapic client
+        return self.model._prepare_request(contents=contents)
+
+    def generate_content(self, contents):
+        request = self._request(contents)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = genai_client.get_default_generative_client().generate_content(
+                    request, timeout=self.timeout, retry=None
+                )
+                return generation_types.GenerateContentResponse.from_response(response)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                time.sleep(backoff_delay(attempt, self.backoff_base))
+
+    async def generate_content_async(self, contents):
+        request = self._request(contents)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await genai_client.get_default_generative_async_client().generate_content(
+                    request, timeout=self.timeout, retry=None
+                )
+                return generation_types.AsyncGenerateContentResponse.from_response(response)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, self.backoff_base))
+
+    async def stream_content_async(self, contents):
+        """Yield response text chunks as the model produces them.
+
+        Only failures before the first chunk are retried; after that a retry
+        would repeat text the caller has already forwarded.
+        """
+        request = self._request(contents)
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                stream = await genai_client.get_default_generative_async_client().stream_generate_content(
+                    request, timeout=self.timeout, retry=None
+                )
+                async for chunk in stream:
+                    text = chunk_text(chunk)
+                    if text:
+                        started = True
+                        yield text
+                return
+            except Exception as e:
+                if started or attempt == self.max_retries or not is_retryable(e):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, self.backoff_base))
+
+
+def chunk_text(chunk):
+    """Text of the first candidate in a streamed response chunk"""
+    if not chunk.candidates:
+        return ''
+    return ''.join(part.text for part in chunk.candidates[0].content.parts)
+
+
+@lru_cache(maxsize=None)
+def get_vision_client():
+    """Shared Cloud Vision client used by extract_instructions.PDFProcessor"""
+    from google.cloud import vision
+    return vision.ImageAnnotatorClient()
+
+
+def vision_retry():
+    """google.api_core Retry with the same retryable statuses and backoff"""
+    from google.api_core import retry
+    return retry.Retry(predicate=is_retryable, initial=BACKOFF_BASE, maximum=BACKOFF_MAX,
+                       multiplier=2, deadline=TIMEOUT)
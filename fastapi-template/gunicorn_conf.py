@@ -0,0 +1,23 @@
+"""Gunicorn settings for running the API with several worker processes.
+
+    gunicorn -c gunicorn_conf.py main:app
+
+preload_app imports main in the master, and when_ready loads the MiniLM
+encoder, the FAISS index and the training corpus there before any worker is
+forked. Workers then share those pages copy-on-write, so N workers cost about
+one copy of the models instead of N. Set PRELOAD_MODELS=0 to load per worker.
+"""
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', '4'))
+worker_class = 'uvicorn.workers.UvicornWorker'
+timeout = int(os.getenv('WORKER_TIMEOUT', '120'))
+preload_app = os.getenv('PRELOAD_MODELS', '1') == '1'
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before workers fork
+    if preload_app:
+        import main
+        main.preload_shared_assets()
@@ -0,0 +1,389 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+@lru_cache(maxsize=None)
+def skimage_lbp():
+    """scikit-image's local_binary_pattern, imported on first use since it pulls in scipy"""
+    try:
+        from skimage.feature import local_binary_pattern
+        return local_binary_pattern
+    except ImportError:
+        return None
+
+
+# Longest side the OpenCV analysis runs at; 0 analyzes at full resolution
+ANALYSIS_MAX_SIDE = int(os.getenv('ANALYSIS_MAX_SIDE', '1024'))
+
+# Separate budget for the image sent to Gemini vision
+GEMINI_MAX_SIDE = int(os.getenv('GEMINI_MAX_SIDE', '1536'))
+GEMINI_JPEG_QUALITY = int(os.getenv('GEMINI_JPEG_QUALITY', '85'))
+
+# Bump whenever compute_image_features or describe_image_features change output
+FEATURES_VERSION = 2
+
+# EXIF orientations that rotate by 90 degrees; cv2.imdecode applies them
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+_EXIF_ORIENTATION = 0x0112
+
+# JPEG decoders can scale by these factors while decoding
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """Read (width, height) from the image header without decoding pixels.
+
+    The size is reported as displayed, matching cv2.imdecode, which applies
+    the EXIF orientation of rotated phone photos.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as header:
+            width, height = header.size
+            if header.getexif().get(_EXIF_ORIENTATION) in _TRANSPOSED_ORIENTATIONS:
+                return height, width
+            return width, height
+    except Exception:
+        return None
+
+
+def decode_image(data: bytes, min_side: int = 0) -> Optional[np.ndarray]:
+    """Decode uploaded bytes into a BGR array in a single pass.
+
+    When min_side is set, the decoder is asked for the smallest power-of-two
+    reduction whose longest side still covers it, which JPEG performs during
+    decoding and so never materializes the full-resolution array.
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    size = image_size(data) if min_side else None
+    if size:
+        for factor, flag in _REDUCED_FLAGS:
+            if max(size) // factor >= min_side:
+                return cv2.imdecode(buffer, flag)
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def resize_to_max_side(image: np.ndarray, max_side: Optional[int]) -> np.ndarray:
+    """Downscale once so the longest side fits max_side"""
+    height, width = image.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        return image
+    scale = max_side / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def encode_for_gemini(image: np.ndarray, max_side: int = GEMINI_MAX_SIDE, quality: int = GEMINI_JPEG_QUALITY) -> dict:
+    """Re-encode a decoded image as a budgeted JPEG blob for Gemini vision"""
+    resized = resize_to_max_side(image, max_side)
+    ok, encoded = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Unable to encode image for Gemini")
+    return {"mime_type": "image/jpeg", "data": encoded.tobytes()}
+
+
+def compute_image_features(image: np.ndarray, max_side: Optional[int] = ANALYSIS_MAX_SIDE,
+                           original_size: Optional[Tuple[int, int]] = None) -> dict:
+    """Compute shape, color, edge and texture features at the analysis resolution.
+
+    original_size is the (width, height) of the upload when the array was
+    already reduced during decoding. Pixel-count dependent statistics are
+    rescaled to their full-resolution equivalents so the thresholds in
+    describe_image_features hold regardless of the analysis resolution.
+    """
+    height, width = image.shape[:2]
+    if original_size:
+        width, height = original_size
+    analysis_image = resize_to_max_side(image, max_side)
+    analysis_pixels = analysis_image.shape[0] * analysis_image.shape[1]
+    pixel_scale = (width * height) / analysis_pixels
+
+    hsv = cv2.cvtColor(analysis_image, cv2.COLOR_BGR2HSV)
+    hue_hist = cv2.calcHist([hsv], [0], None, [180], [0, 180]).flatten()
+    dominant_hues = np.argsort(hue_hist)[-3:][::-1]
+
+    gray = cv2.cvtColor(analysis_image, cv2.COLOR_BGR2GRAY)
+    edges = cv2.Canny(gray, 30, 100)
+    # Edge pixels trace outlines, so their share shrinks with linear resolution
+    edge_density = np.count_nonzero(edges) / analysis_pixels / np.sqrt(pixel_scale)
+
+    local_binary_pattern = skimage_lbp()
+    if local_binary_pattern is not None:
+        lbp = local_binary_pattern(gray, 8, 1, method='uniform')
+        lbp_hist = np.histogram(lbp.ravel(), bins=10)[0]
+        # Histogram counts grow with pixel count, so variance grows with its square
+        texture_variance = float(np.var(lbp_hist)) * pixel_scale ** 2
+    else:
+        texture_variance = 0.0
+
+    circularity = None
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if contours:
+        largest_contour = max(contours, key=cv2.contourArea)
+        area = cv2.contourArea(largest_contour)
+        perimeter = cv2.arcLength(largest_contour, True)
+        if perimeter > 0:
+            circularity = 4 * np.pi * area / (perimeter * perimeter)
+
+    return {
+        "width": width,
+        "height": height,
+        "aspect_ratio": width / height,
+        "hue_histogram": hue_hist / analysis_pixels,
+        "dominant_hues": [int(hue) for hue in dominant_hues],
+        "edge_density": float(edge_density),
+        "texture_variance": texture_variance,
+        "circularity": circularity,
+    }
+
+
+def describe_image_features(features: dict) -> str:
+    """Turn computed features into the crochet-specific text analysis"""
+    width, height = features["width"], features["height"]
+    aspect_ratio = features["aspect_ratio"]
+    edge_density = features["edge_density"]
+    texture_variance = features["texture_variance"]
+
+    # 1. Shape and size analysis
+    if aspect_ratio > 2.0:
+        shape = "long rectangular item like a scarf or table runner"
+    elif aspect_ratio < 0.5:
+        shape = "tall narrow item like a bookmark or belt"
+    elif 0.8 <= aspect_ratio <= 1.2:
+        shape = "square item like a dishcloth, coaster, or granny square"
+    else:
+        shape = "rectangular item like a blanket, placemat, or panel"
+
+    # 2. Color analysis
+    dominant_colors = []
+    for hue in features["dominant_hues"]:
+        if hue < 15 or hue > 165: dominant_colors.append("red")
+        elif 15 <= hue < 45: dominant_colors.append("yellow/orange")
+        elif 45 <= hue < 75: dominant_colors.append("green")
+        elif 75 <= hue < 135: dominant_colors.append("blue")
+        elif 135 <= hue <= 165: dominant_colors.append("purple/pink")
+
+    color_desc = ", ".join(dominant_colors[:2]) if dominant_colors else "neutral tones"
+
+    # 3. Texture and stitch pattern analysis
+    if edge_density > 0.15 and texture_variance > 1000:
+        stitch_pattern = "intricate stitch pattern with cables, bobbles, or lace work"
+    elif edge_density > 0.08:
+        stitch_pattern = "textured stitches like shells, clusters, or ripples"
+    elif texture_variance > 500:
+        stitch_pattern = "varied stitch pattern with color changes or simple textures"
+    else:
+        stitch_pattern = "solid stitches like single or double crochet"
+
+    # 4. Object detection - roughly circular outlines suggest amigurumi
+    item_type = "crochet item"
+    circularity = features["circularity"]
+    is_amigurumi = circularity is not None and circularity > 0.6
+    if is_amigurumi:
+        item_type = "amigurumi toy or stuffed item"
+    else:
+        if "square" in shape and min(width, height) < max(width, height) * 1.2:
+            if max(width, height) < 800:
+                item_type = "small square like a coaster, granny square, or dishcloth"
+            else:
+                item_type = "large square like a pillow cover or afghan square"
+        elif "rectangular" in shape:
+            if aspect_ratio > 3:
+                item_type = "long narrow piece like a scarf, bookmark, or trim"
+            elif aspect_ratio > 1.5:
+                item_type = "rectangular piece like a placemat, panel, or small blanket"
+            else:
+                item_type = "blanket, throw, or large rectangular piece"
+
+    # 5. Skill level estimation
+    complexity_score = edge_density * 10 + (texture_variance / 1000)
+    if complexity_score > 2.5:
+        skill_level = "advanced"
+    elif complexity_score > 1.0:
+        skill_level = "intermediate"
+    else:
+        skill_level = "beginner"
+
+    return f"This appears to be a {skill_level}-level {item_type} featuring {stitch_pattern}. The piece shows {color_desc} colors and has a {shape} overall form."
+
+
+# Images per padded stack in analyze_images_batch; bounds peak memory
+BATCH_CHUNK_SIZE = int(os.getenv('ANALYSIS_BATCH_CHUNK', '8'))
+
+LBP_BINS = 10
+
+
+def uniform_lbp_batch(gray: np.ndarray) -> np.ndarray:
+    """Uniform LBP (P=8, R=1) for a stack of zero-padded grayscale images.
+
+    gray has shape (N, H + 2, W + 2) with a one pixel zero border around every
+    image, which reproduces skimage's constant-zero edge handling; the result
+    has shape (N, H, W) and matches local_binary_pattern(..., 'uniform').
+    Axis-aligned neighbours compare as integers; only the four diagonals need
+    skimage's bilinear interpolation, evaluated in the same order and precision.
+    """
+    n, height, width = gray.shape[0], gray.shape[1] - 2, gray.shape[2] - 2
+
+    def neighbour(stack, dr, dc):
+        return stack[:, 1 + dr:1 + dr + height, 1 + dc:1 + dc + width]
+
+    padded = gray.astype(np.float64)
+    center = neighbour(padded, 0, 0)
+    top, bottom, term = (np.empty((n, height, width)) for _ in range(3))
+    bits = np.empty((8, n, height, width), dtype=bool)
+
+    angles = 2 * np.pi * np.arange(8) / 8
+    for i, (rp, cp) in enumerate(zip(np.round(-np.sin(angles), 5), np.round(np.cos(angles), 5))):
+        r0, c0, r1, c1 = int(np.floor(rp)), int(np.floor(cp)), int(np.ceil(rp)), int(np.ceil(cp))
+        dr, dc = rp - r0, cp - c0
+        if dr == 0 and dc == 0:
+            np.greater_equal(neighbour(gray, r0, c0), neighbour(gray, 0, 0), out=bits[i])
+            continue
+        np.multiply(neighbour(padded, r0, c0), 1 - dc, out=top)
+        top += np.multiply(neighbour(padded, r0, c1), dc, out=term)
+        np.multiply(neighbour(padded, r1, c0), 1 - dc, out=bottom)
+        bottom += np.multiply(neighbour(padded, r1, c1), dc, out=term)
+        top *= 1 - dr
+        top += np.multiply(bottom, dr, out=term)
+        top -= center
+        np.greater_equal(top, 0, out=bits[i])
+
+    # skimage counts transitions between consecutive bits without wrapping
+    changes = np.zeros((n, height, width), dtype=np.uint8)
+    for i in range(7):
+        changes += bits[i] != bits[i + 1]
+    codes = bits.sum(axis=0, dtype=np.uint8)
+    codes[changes > 2] = 9
+    return codes
+
+
+def _prepare_for_batch(source, max_side: Optional[int]) -> Optional[dict]:
+    """Decode, resize and run the per-image OpenCV steps for one batch member"""
+    data = source
+    if isinstance(source, str):
+        try:
+            with open(source, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+    original_size = image_size(data)
+    image = decode_image(data, min_side=max_side or 0)
+    if image is None:
+        return None
+    if not original_size:
+        original_size = (image.shape[1], image.shape[0])
+    image = resize_to_max_side(image, max_side)
+
+    edges = cv2.Canny(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), 30, 100)
+    circularity = None
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if contours:
+        largest_contour = max(contours, key=cv2.contourArea)
+        perimeter = cv2.arcLength(largest_contour, True)
+        if perimeter > 0:
+            circularity = 4 * np.pi * cv2.contourArea(largest_contour) / (perimeter * perimeter)
+    return {"image": image, "edges": edges, "original_size": original_size, "circularity": circularity}
+
+
+def _batch_features(prepared: list) -> list:
+    """Histogram, edge and texture features for one chunk using stacked arrays"""
+    n = len(prepared)
+    height = max(item["image"].shape[0] for item in prepared)
+    width = max(item["image"].shape[1] for item in prepared)
+
+    # One zero-padded canvas per image; the mask marks real pixels
+    bgr = np.zeros((n, height + 2, width + 2, 3), dtype=np.uint8)
+    edges = np.zeros((n, height, width), dtype=bool)
+    mask = np.zeros((n, height, width), dtype=bool)
+    for i, item in enumerate(prepared):
+        h, w = item["image"].shape[:2]
+        bgr[i, 1:h + 1, 1:w + 1] = item["image"]
+        edges[i, :h, :w] = item["edges"] > 0
+        mask[i, :h, :w] = True
+
+    # Color conversions are per pixel, so the whole stack converts in one call
+    stacked = bgr.reshape(n * (height + 2), width + 2, 3)
+    hue = cv2.cvtColor(stacked, cv2.COLOR_BGR2HSV)[..., 0].reshape(n, height + 2, width + 2)[:, 1:-1, 1:-1]
+    gray = cv2.cvtColor(stacked, cv2.COLOR_BGR2GRAY).reshape(n, height + 2, width + 2)
+    lbp = uniform_lbp_batch(gray)
+
+    pixels = mask.sum(axis=(1, 2))
+    image_ids = np.broadcast_to(np.arange(n)[:, None, None], mask.shape)[mask]
+    hue_hist = np.bincount(image_ids * 180 + hue[mask], minlength=n * 180).reshape(n, 180)
+    lbp_hist = np.bincount(image_ids * LBP_BINS + lbp[mask], minlength=n * LBP_BINS).reshape(n, LBP_BINS)
+    edge_counts = np.count_nonzero(edges & mask, axis=(1, 2))
+
+    originals = np.array([item["original_size"] for item in prepared], dtype=np.float64)
+    pixel_scale = originals[:, 0] * originals[:, 1] / pixels
+    edge_density = edge_counts / pixels / np.sqrt(pixel_scale)
+    texture_variance = np.var(lbp_hist, axis=1) * pixel_scale ** 2
+    dominant_hues = np.argsort(hue_hist, axis=1)[:, -3:][:, ::-1]
+
+    features = []
+    for i, item in enumerate(prepared):
+        width_i, height_i = item["original_size"]
+        features.append({
+            "width": width_i,
+            "height": height_i,
+            "aspect_ratio": width_i / height_i,
+            "hue_histogram": hue_hist[i] / pixels[i],
+            "lbp_histogram": lbp_hist[i] / pixels[i],
+            "dominant_hues": [int(h) for h in dominant_hues[i]],
+            "edge_density": float(edge_density[i]),
+            "texture_variance": float(texture_variance[i]),
+            "circularity": item["circularity"],
+        })
+    return features
+
+
+def feature_vector(features: dict) -> np.ndarray:
+    """Flatten features into a fixed-length vector (180 hue + 10 LBP + 3 scalars)"""
+    return np.concatenate([
+        features["hue_histogram"],
+        features["lbp_histogram"],
+        [features["edge_density"], features["circularity"] or 0.0, features["aspect_ratio"]],
+    ])
+
+
+def analyze_images_batch(images: list, max_side: Optional[int] = ANALYSIS_MAX_SIDE,
+                         executor=None, chunk_size: int = BATCH_CHUNK_SIZE) -> list:
+    """Analyze many images (bytes or paths) at once.
+
+    Decoding and the per-image OpenCV steps run in parallel on the executor;
+    histograms, edge densities and LBP codes are computed on padded stacks of
+    up to chunk_size images. Returns one dict per input, in order, with the
+    feature vector and classification, or an error for undecodable inputs.
+    """
+    owns_executor = executor is None
+    if owns_executor:
+        executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+
+    results = []
+    try:
+        # Chunks bound how many decoded images are resident at once
+        for start in range(0, len(images), chunk_size):
+            prepared = list(executor.map(
+                lambda source: _prepare_for_batch(source, max_side), images[start:start + chunk_size]
+            ))
+            valid = [item for item in prepared if item is not None]
+            batch = iter(_batch_features(valid) if valid else [])
+            for item in prepared:
+                if item is None:
+                    results.append({"error": "Unable to decode image"})
+                    continue
+                features = next(batch)
+                results.append({
+                    "features": features,
+                    "feature_vector": feature_vector(features),
+                    "classification": describe_image_features(features),
+                })
+    finally:
+        if owns_executor:
+            executor.shutdown()
+    return results
@@ -1,31 +1,27 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Body, status
-from fastapi.responses import Response
+from fastapi import FastAPI, File, UploadFile, HTTPException, Body, Header, status
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field, validator
 from models import MsgPayload
 import logging
-import shutil
 from fastapi.middleware.cors import CORSMiddleware
 import time
+import asyncio
+import gc
 import cv2
 import numpy as np
-from test_model import load_model_and_tokenizer, generate_pattern
-import torch
 import os
-from functools import lru_cache
+import threading
+import importlib.util
 import hashlib
-from typing import List, Optional
+import re
+from typing import Dict, List, Optional, Union
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
 import filetype
 import base64
 from PIL import Image
 import io
 import json
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Paragraph
-    from reportlab.lib.styles import getSampleStyleSheet
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
 try:
     import emoji
     EMOJI_AVAILABLE = True
@@ -48,28 +44,30 @@ if EMOJI_AVAILABLE:
     import emoji
     logger.info(f"Emoji library version: {emoji.__version__}")
 
-# Optional dependencies for RAG pipeline
-try:
-    import faiss
-    import pickle
-    from sentence_transformers import SentenceTransformer
-    RAG_AVAILABLE = True
-except ImportError:
+# reportlab is only imported by the PDF render workers
+REPORTLAB_AVAILABLE = importlib.util.find_spec("reportlab") is not None
+
+# Optional dependencies for RAG pipeline; faiss and sentence-transformers are
+# only imported when the first RAG request arrives (see RAGPipeline.load)
+RAG_AVAILABLE = all(importlib.util.find_spec(name) for name in ("faiss", "sentence_transformers"))
+if not RAG_AVAILABLE:
     logger.warning("RAG dependencies not available (faiss, sentence-transformers)")
-    RAG_AVAILABLE = False
-import google.generativeai as genai
-from transformers import AutoModel, AutoTokenizer
 import sqlite3
-from pattern_generator import CrochetPatternGenerator
+from pattern_generator import CrochetPatternGenerator, MAX_CONCURRENCY, is_generation_error
+from pattern_cache import PatternCache, cache_key
+from pattern_pdf import PDFCache, content_hash, render_pdf
+from pattern_index import SKILL_LEVELS
+from analysis_cache import AnalysisCache
+from single_flight import SingleFlight
+from embedding_service import EmbeddingService
+from gemini_client import get_model
+from image_analysis import (
+    ANALYSIS_MAX_SIDE, FEATURES_VERSION, GEMINI_JPEG_QUALITY, GEMINI_MAX_SIDE, image_size, decode_image,
+    encode_for_gemini, compute_image_features, describe_image_features, analyze_images_batch, skimage_lbp
+)
 
 # Logging already configured above
 
-# Try importing optional dependencies
-try:
-    from skimage.feature import local_binary_pattern
-except ImportError:
-    logger.warning("scikit-image not available, using basic texture analysis")
-
 app = FastAPI(title="Yarn Master API", description="AI-Powered Crochet Pattern Generator")
 
 # Add CORS middleware
@@ -102,31 +100,56 @@ AVAILABLE_MODELS = {
 
 # Initialize RAG components
 class RAGPipeline:
+    """Retrieval over the pattern index; the encoder and index load on first use"""
+
     def __init__(self):
-        if not RAG_AVAILABLE:
-            self.text_encoder = None
-            self.vector_db = None
-            self.pattern_db = []
-            return
-            
-        self.text_encoder = SentenceTransformer('all-MiniLM-L6-v2')
+        self.text_encoder = None
+        self.embedder = None
         self.image_encoder = None
         self.vector_db = None
-        self.pattern_db = None
-        self.load_vector_db()
+        self.pattern_db = []
+        self.loaded = False
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """Import the RAG stack and load MiniLM plus the vector database once"""
+        if self.loaded or not RAG_AVAILABLE:
+            return
+        with self._load_lock:
+            if self.loaded:
+                return
+            load_start = time.perf_counter()
+            from sentence_transformers import SentenceTransformer
+            self.text_encoder = SentenceTransformer('all-MiniLM-L6-v2')
+            # Concurrent queries share one forward pass; repeated descriptions hit the LRU
+            self.embedder = EmbeddingService(
+                self.text_encoder,
+                max_batch=int(os.getenv('EMBEDDING_BATCH_SIZE', '32')),
+                max_wait=float(os.getenv('EMBEDDING_BATCH_WAIT_MS', '5')) / 1000,
+                cache_size=int(os.getenv('EMBEDDING_CACHE_SIZE', '1024'))
+            )
+            self.load_vector_db()
+            self.loaded = True
+            logger.info(f"RAG pipeline loaded in {time.perf_counter() - load_start:.2f} seconds")
     
     def load_vector_db(self):
         if not RAG_AVAILABLE:
             return
-            
+
+        import faiss
+        import pickle
+        from build_vector_db import configure_search, read_shared_index
         try:
             if os.path.exists('pattern_vectors.faiss'):
-                self.vector_db = faiss.read_index('pattern_vectors.faiss')
+                # IVF/HNSW indexes get their nprobe/efSearch from RAG_NPROBE/RAG_EF_SEARCH
+                self.vector_db = configure_search(read_shared_index('pattern_vectors.faiss'))
                 with open('pattern_metadata.pkl', 'rb') as f:
                     self.pattern_db = pickle.load(f)
+                if self.vector_db.ntotal != len(self.pattern_db):
+                    logger.warning(f"Vector database has {self.vector_db.ntotal} vectors for {len(self.pattern_db)} patterns")
                 logger.info("Vector database loaded successfully")
             else:
-                logger.warning("Vector database not found, creating empty one")
+                logger.warning("Vector database not found, creating empty one; run build_vector_db.py to populate it")
                 self.vector_db = faiss.IndexFlatIP(384)  # MiniLM embedding size
                 self.pattern_db = []
         except Exception as e:
@@ -135,15 +158,21 @@ class RAGPipeline:
             self.pattern_db = []
     
     def retrieve_similar_patterns(self, query_text: str, k: int = 3) -> List[dict]:
+        self.load()
         if not RAG_AVAILABLE or not self.pattern_db:
             return []
         
-        query_embedding = self.text_encoder.encode([query_text])
-        scores, indices = self.vector_db.search(query_embedding, min(k, len(self.pattern_db)))
+        import faiss
+        from build_vector_db import similarity_scores
+        # The index stores L2-normalized vectors (see build_vector_db.py)
+        query_embedding = self.embedder.encode(query_text)[None, :].copy()
+        faiss.normalize_L2(query_embedding)
+        distances, indices = self.vector_db.search(query_embedding, min(k, len(self.pattern_db)))
+        scores = similarity_scores(self.vector_db, distances)
         
         similar_patterns = []
         for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.pattern_db):
+            if 0 <= idx < len(self.pattern_db):
                 pattern = self.pattern_db[idx].copy()
                 pattern['similarity_score'] = float(score)
                 similar_patterns.append(pattern)
@@ -151,6 +180,10 @@ class RAGPipeline:
         return similar_patterns
 
 rag_pipeline = RAGPipeline()
+
+# WARMUP_MODELS=1 loads the lazily imported models at startup instead of on
+# the first request that needs them
+WARMUP_MODELS = os.getenv('WARMUP_MODELS', '0') == '1'
 # Initialize pattern generator
 try:
     api_key = os.getenv('GEMINI_API_KEY')
@@ -164,10 +197,113 @@ except Exception as e:
     logger.error(f"Failed to initialize pattern generator: {e}")
     pattern_generator = None
 
+# Bounds in-flight Gemini vision calls per worker
+gemini_semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+# OpenCV and scikit-image release the GIL, so CPU-bound analysis runs in threads
+analysis_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('ANALYSIS_WORKERS', os.cpu_count() or 4)),
+    thread_name_prefix="image-analysis"
+)
+
+# Image analysis results keyed by upload digest, optionally persisted to SQLite
+analysis_cache = AnalysisCache(
+    max_entries=int(os.getenv('ANALYSIS_CACHE_SIZE', '256')),
+    db_path=os.getenv('ANALYSIS_CACHE_DB') or None
+)
+# Settings each cached result depends on; changing any of them misses old entries
+OPENCV_CACHE_VARIANT = f"v{FEATURES_VERSION}-{ANALYSIS_MAX_SIDE}"
+GEMINI_CACHE_VARIANT = f"{GEMINI_MAX_SIDE}-q{GEMINI_JPEG_QUALITY}"
+
+def warm_up() -> None:
+    """Load everything that is otherwise imported on first use"""
+    warm_start = time.perf_counter()
+    rag_pipeline.load()
+    # Touch the scikit-image LBP path so its submodules are imported now
+    compute_image_features(np.zeros((8, 8, 3), dtype=np.uint8), ANALYSIS_MAX_SIDE)
+    logger.info(f"Warm-up finished in {time.perf_counter() - warm_start:.2f} seconds")
+
+@app.on_event("startup")
+async def warm_up_on_startup():
+    if WARMUP_MODELS:
+        await asyncio.get_running_loop().run_in_executor(analysis_executor, warm_up)
+
+def preload_shared_assets() -> None:
+    """Load read-only models in a pre-fork master (see gunicorn_conf.py).
+
+    Workers forked afterwards share these pages copy-on-write. Nothing here
+    runs inference, so torch and OpenCV thread pools are first created in
+    the workers rather than inherited across fork.
+    """
+    rag_pipeline.load()
+    skimage_lbp()
+    # Keep the collector from writing to the preloaded objects' headers,
+    # which would copy their pages into every worker
+    gc.freeze()
+    logger.info(f"Preloaded shared assets in process {os.getpid()}")
+
+# Generated patterns shared by every endpoint; a SQLite path shares them
+# across workers and restarts. PATTERN_CACHE_SIMILARITY enables hits on
+# near-identical descriptions when the RAG encoder is available.
+pattern_cache = PatternCache(
+    max_entries=int(os.getenv('PATTERN_CACHE_SIZE', '1000')),
+    ttl=float(os.getenv('PATTERN_CACHE_TTL', str(7 * 24 * 3600))),
+    db_path=os.getenv('PATTERN_CACHE_DB') or None,
+    similarity_threshold=float(os.getenv('PATTERN_CACHE_SIMILARITY', '0')) or None
+)
+
+# Concurrent identical requests share one upstream call: generation keyed
+# like the pattern cache, image analysis keyed by upload digest
+generation_flights = SingleFlight()
+analysis_flights = SingleFlight()
+
+# reportlab layout holds the GIL, so PDFs render in worker processes. The
+# pool is created on first use so a pre-fork master never owns one.
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', '2'))
+PDF_CHUNK_SIZE = 64 * 1024
+PDF_TITLE_MAX_LENGTH = 200
+# forkserver where the platform has it (not on Windows)
+PDF_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+_pdf_executor_lock = threading.Lock()
+
+# Rendered PDFs keyed by content hash; PDF_CACHE_DIR shares them across workers
+pdf_cache = PDFCache(
+    max_bytes=int(os.getenv('PDF_CACHE_BYTES', str(64 * 1024 * 1024))),
+    directory=os.getenv('PDF_CACHE_DIR') or None,
+    max_disk_bytes=int(os.getenv('PDF_CACHE_DIR_BYTES', str(512 * 1024 * 1024)))
+)
+pdf_flights = SingleFlight()
+
+def pdf_executor() -> ProcessPoolExecutor:
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            # The API worker already runs threads, so its children must not be
+            # forked from it; render_pdf imports reportlab itself
+            _pdf_executor = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context(PDF_START_METHOD)
+            )
+        return _pdf_executor
+
+@app.on_event("shutdown")
+def shutdown_pdf_executor():
+    if _pdf_executor is not None:
+        _pdf_executor.shutdown(wait=False, cancel_futures=True)
+
+async def run_timed(timings: Dict[str, float], stage: str, awaitable):
+    """Await a stage and record its wall time in seconds"""
+    stage_start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = round(time.perf_counter() - stage_start, 3)
+
 class PatternRequest(BaseModel):
     description: str = Field(..., min_length=10, max_length=1000)
     style: str = Field(default="standard")
     model_type: str = Field(default="yarn_master")
+    skill_level: Optional[str] = None
 
     @validator('style')
     def validate_style(cls, v):
@@ -182,6 +318,20 @@ class PatternRequest(BaseModel):
             return "yarn_master"
         return v
 
+    @validator('skill_level')
+    def validate_skill_level(cls, v):
+        if v is None or v.lower().strip() not in SKILL_LEVELS:
+            return None
+        return v.upper().strip()
+
+    def generator_skill_level(self) -> str:
+        """Explicit skill level, or one derived from the style as before"""
+        return self.skill_level or ("BEGINNER" if "beginner" in self.style else "INTERMEDIATE")
+
+class StreamPatternRequest(PatternRequest):
+    # Replaces /generate-simple-pattern in the frontend, which took short inputs like "hat"
+    description: str = Field(..., min_length=1, max_length=1000)
+
 class PatternResponse(BaseModel):
     success: bool
     pattern: str
@@ -191,43 +341,120 @@ class PatternResponse(BaseModel):
     materials: Optional[List[str]] = None
     difficulty: Optional[str] = None
     estimated_time: Optional[str] = None
+    image_analysis: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None
+    cached: Optional[bool] = None
+    error: Optional[str] = None
+
+class ImageAnalysisResult(BaseModel):
+    filename: str
+    success: bool
+    classification: Optional[str] = None
+    dominant_hues: Optional[List[int]] = None
+    edge_density: Optional[float] = None
+    texture_variance: Optional[float] = None
+    circularity: Optional[float] = None
+    feature_vector: Optional[List[float]] = None
     error: Optional[str] = None
 
-@lru_cache(maxsize=100)
+class BatchAnalysisResponse(BaseModel):
+    success: bool
+    results: List[ImageAnalysisResult]
+    analysis_time: str
+
+class PDFRequest(BaseModel):
+    pattern: str = Field(..., min_length=1, max_length=200000)
+    title: str = Field("Crochet Pattern")
+
+    @validator('title')
+    def truncate_title(cls, v):
+        # The frontend builds titles from the full description, so long ones are shortened, not rejected
+        title = " ".join(v.split())
+        if len(title) > PDF_TITLE_MAX_LENGTH:
+            title = title[:PDF_TITLE_MAX_LENGTH - 3].rstrip() + "..."
+        return title or "Crochet Pattern"
+
 def generate_cached_pattern(description: str, style: str) -> str:
-    """Use pattern generator instead of old T5 model"""
+    """Use pattern generator instead of old T5 model, through the shared pattern cache"""
     if pattern_generator:
         skill_level = "BEGINNER" if "beginner" in style else "INTERMEDIATE"
-        return pattern_generator.generate_pattern(description, skill_level)
+        cached = pattern_cache.get(description, skill_level, "yarn_master")
+        if cached is not None:
+            return cached
+        generation_start = time.perf_counter()
+        pattern_text = pattern_generator.generate_pattern(description, skill_level)
+        if not is_generation_error(pattern_text):
+            pattern_cache.put(description, skill_level, "yarn_master", pattern_text,
+                              time.perf_counter() - generation_start)
+        return pattern_text
     else:
         return "Pattern generator not available"
 
+async def cache_embedding(description: str) -> Optional[np.ndarray]:
+    """Description embedding for semantic cache lookups, when enabled"""
+    if not pattern_cache.semantic or not RAG_AVAILABLE:
+        return None
+    await asyncio.get_running_loop().run_in_executor(analysis_executor, rag_pipeline.load)
+    return await rag_pipeline.embedder.encode_async(description)
+
+async def generate_with_cache(description: str, skill_level: str, model_type: str) -> tuple:
+    """Return the pattern text and whether it was served from the pattern cache"""
+    embedding = await cache_embedding(description)
+    cached = pattern_cache.get(description, skill_level, model_type, embedding)
+    if cached is not None:
+        return cached, True
+
+    async def generate() -> str:
+        generation_start = time.perf_counter()
+        pattern_text = await pattern_generator.generate_pattern_async(description, skill_level)
+        # Failures come back as placeholder text and must not be served later
+        if not is_generation_error(pattern_text):
+            pattern_cache.put(description, skill_level, model_type, pattern_text,
+                              time.perf_counter() - generation_start, embedding)
+        return pattern_text
+
+    pattern_text = await generation_flights.do(cache_key(description, skill_level, model_type), generate)
+    return pattern_text, False
+
+# filetype only inspects the leading signature bytes
+IMAGE_HEADER_BYTES = 261
+
+def get_bytes_hash(data: bytes) -> str:
+    """Generate hash of in-memory contents for caching"""
+    return hashlib.md5(data).hexdigest()
+
 def get_file_hash(file_path: str) -> str:
     """Generate hash of file contents for caching"""
     with open(file_path, "rb") as f:
-        return hashlib.md5(f.read()).hexdigest()
+        return get_bytes_hash(f.read())
 
-def validate_image(file_path: str) -> bool:
-    """Validate if file is a supported image format"""
-    kind = filetype.guess(file_path)
+def validate_image(source: Union[str, bytes]) -> bool:
+    """Validate if a file path or header buffer is a supported image format"""
+    kind = filetype.guess(source)
     if kind is None:
         return False
     return kind.mime.startswith('image/')
 
-def analyze_image_with_gemini(image_path: str) -> dict:
-    """Enhanced Gemini Vision API for detailed crochet image analysis"""
-    try:
-        # Use the same API key as pattern generator
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            logger.error("GEMINI_API_KEY not set")
-            return {"item_type": "crochet item", "description": "API key not configured"}
-        genai.configure(api_key=api_key)
-        vision_model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        image = Image.open(image_path)
-        
-        prompt = """Analyze this crochet image in detail. Describe what you see:
+def decode_upload(data: bytes) -> tuple:
+    """Decode an upload once into the shared BGR array, its original size,
+    a budgeted Gemini JPEG blob and the content digest"""
+    original_size = image_size(data)
+    # Decode only as much resolution as the larger of the two budgets needs
+    min_side = max(ANALYSIS_MAX_SIDE, GEMINI_MAX_SIDE) if ANALYSIS_MAX_SIDE else 0
+    image = decode_image(data, min_side=min_side)
+    if image is None:
+        return None, None, None, None
+    return image, original_size, encode_for_gemini(image), get_bytes_hash(data)
+
+def load_image(source: Union[str, np.ndarray]) -> Optional[np.ndarray]:
+    """Accept either a path or an already decoded array"""
+    return cv2.imread(source) if isinstance(source, str) else source
+
+def load_vision_input(source: Union[str, Image.Image, dict]) -> Union[Image.Image, dict]:
+    """Accept a path, a PIL image or an encoded image blob for Gemini vision"""
+    return Image.open(source) if isinstance(source, str) else source
+
+GEMINI_VISION_PROMPT = """Analyze this crochet image in detail. Describe what you see:
         1. What type of crochet item is this? (scarf, blanket, amigurumi, hat, etc.)
         2. What colors do you see?
         3. What stitch patterns are visible?
@@ -236,20 +463,58 @@ def analyze_image_with_gemini(image_path: str) -> dict:
         6. What materials would be needed?
         
         Provide a detailed description for creating a crochet pattern."""
+
+def parse_gemini_analysis(text: str) -> dict:
+    """Extract item type from a Gemini vision response"""
+    result = text.strip()
+    item_type = "crochet item"
+    result_lower = result.lower()
+    for item in ["scarf", "blanket", "hat", "amigurumi", "sweater", "bag", "dishcloth", "coaster"]:
+        if item in result_lower:
+            item_type = item
+            break
+    
+    logger.info(f"Gemini analysis successful: {item_type}")
+    return {"item_type": item_type, "description": result}
+
+def analyze_image_with_gemini(image: Union[str, Image.Image, dict]) -> dict:
+    """Enhanced Gemini Vision API for detailed crochet image analysis"""
+    try:
+        # Use the same API key as pattern generator
+        api_key = os.getenv('GEMINI_API_KEY')
+        if not api_key:
+            logger.error("GEMINI_API_KEY not set")
+            return {"item_type": "crochet item", "description": "API key not configured"}
+        vision_model = get_model(api_key=api_key)
         
-        response = vision_model.generate_content([prompt, image])
-        result = response.text.strip()
+        image = load_vision_input(image)
+        response = vision_model.generate_content([GEMINI_VISION_PROMPT, image])
+        return parse_gemini_analysis(response.text)
         
-        # Extract item type from the response
-        item_type = "crochet item"
-        result_lower = result.lower()
-        for item in ["scarf", "blanket", "hat", "amigurumi", "sweater", "bag", "dishcloth", "coaster"]:
-            if item in result_lower:
-                item_type = item
-                break
+    except Exception as e:
+        logger.error(f"Gemini analysis failed: {str(e)}")
+        return {"item_type": "crochet item", "description": f"Unable to analyze image: {str(e)}"}
+
+async def analyze_image_with_gemini_async(image: Union[str, Image.Image, dict], digest: Optional[str] = None) -> dict:
+    """Gemini vision analysis that awaits the model instead of blocking the event loop"""
+    if digest:
+        cached = analysis_cache.get("gemini_vision", digest, GEMINI_CACHE_VARIANT)
+        if cached is not None:
+            return cached
+    try:
+        api_key = os.getenv('GEMINI_API_KEY')
+        if not api_key:
+            logger.error("GEMINI_API_KEY not set")
+            return {"item_type": "crochet item", "description": "API key not configured"}
+        vision_model = get_model(api_key=api_key)
         
-        logger.info(f"Gemini analysis successful: {item_type}")
-        return {"item_type": item_type, "description": result}
+        image = load_vision_input(image)
+        async with gemini_semaphore:
+            response = await vision_model.generate_content_async([GEMINI_VISION_PROMPT, image])
+        analysis = parse_gemini_analysis(response.text)
+        if digest:
+            analysis_cache.put("gemini_vision", digest, analysis, GEMINI_CACHE_VARIANT)
+        return analysis
         
     except Exception as e:
         logger.error(f"Gemini analysis failed: {str(e)}")
@@ -274,8 +539,7 @@ def generate_pattern_with_rag(description: str, style: str, model_type: str) ->
         try:
             api_key = os.getenv('GEMINI_API_KEY')
             if api_key:
-                genai.configure(api_key=api_key)
-                model = genai.GenerativeModel('gemini-1.5-flash')
+                model = get_model(api_key=api_key)
                 
                 prompt = f"""Create a detailed crochet pattern for: {description}
                 Style: {style}
@@ -299,10 +563,10 @@ def generate_pattern_with_rag(description: str, style: str, model_type: str) ->
     # Fallback to existing model
     return generate_cached_pattern(description, style)
 
-def analyze_image_content_enhanced(image_path: str) -> str:
+def analyze_image_content_enhanced(image: Union[str, np.ndarray]) -> str:
     """Enhanced OpenCV analysis focused on crochet items"""
     try:
-        image = cv2.imread(image_path)
+        image = load_image(image)
         if image is None:
             return "Unable to analyze image"
         
@@ -341,114 +605,23 @@ def analyze_image_content_enhanced(image_path: str) -> str:
         logger.error(f"Error analyzing image: {str(e)}")
         return "crochet item"
 
-def analyze_image_content(image_path: str) -> str:
-    """Enhanced crochet-specific image analysis"""
+def analyze_image_content(image: Union[str, np.ndarray], digest: Optional[str] = None,
+                          original_size: Optional[tuple] = None) -> str:
+    """Enhanced crochet-specific image analysis at the configured analysis resolution"""
+    if digest:
+        cached = analysis_cache.get("opencv", digest, OPENCV_CACHE_VARIANT)
+        if cached is not None:
+            return cached
     try:
-        image = cv2.imread(image_path)
+        image = load_image(image)
         if image is None:
             return "Unable to analyze image"
         
-        height, width = image.shape[:2]
-        analysis_parts = []
-        
-        # 1. Shape and size analysis
-        aspect_ratio = width / height
-        if aspect_ratio > 2.0:
-            shape = "long rectangular item like a scarf or table runner"
-        elif aspect_ratio < 0.5:
-            shape = "tall narrow item like a bookmark or belt"
-        elif 0.8 <= aspect_ratio <= 1.2:
-            shape = "square item like a dishcloth, coaster, or granny square"
-        else:
-            shape = "rectangular item like a blanket, placemat, or panel"
-        
-        # 2. Enhanced color analysis
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        dominant_colors = []
-        
-        # Analyze hue distribution
-        hue_hist = cv2.calcHist([hsv], [0], None, [180], [0, 180])
-        dominant_hues = np.argsort(hue_hist.flatten())[-3:][::-1]
-        
-        for hue in dominant_hues:
-            if hue < 15 or hue > 165: dominant_colors.append("red")
-            elif 15 <= hue < 45: dominant_colors.append("yellow/orange")
-            elif 45 <= hue < 75: dominant_colors.append("green")
-            elif 75 <= hue < 135: dominant_colors.append("blue")
-            elif 135 <= hue <= 165: dominant_colors.append("purple/pink")
-        
-        color_desc = ", ".join(dominant_colors[:2]) if dominant_colors else "neutral tones"
-        
-        # 3. Texture and stitch pattern analysis
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Edge detection for stitch definition
-        edges = cv2.Canny(gray, 30, 100)
-        edge_density = np.sum(edges > 0) / (height * width)
-        
-        # Texture analysis using Local Binary Patterns
-        from skimage.feature import local_binary_pattern
-        lbp = local_binary_pattern(gray, 8, 1, method='uniform')
-        lbp_hist = np.histogram(lbp.ravel(), bins=10)[0]
-        texture_variance = np.var(lbp_hist)
-        
-        # Pattern recognition
-        if edge_density > 0.15 and texture_variance > 1000:
-            stitch_pattern = "intricate stitch pattern with cables, bobbles, or lace work"
-        elif edge_density > 0.08:
-            stitch_pattern = "textured stitches like shells, clusters, or ripples"
-        elif texture_variance > 500:
-            stitch_pattern = "varied stitch pattern with color changes or simple textures"
-        else:
-            stitch_pattern = "solid stitches like single or double crochet"
-        
-        # 4. Enhanced object detection
-        # Look for circular/round shapes (could be amigurumi)
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        item_type = "crochet item"
-        is_amigurumi = False
-        
-        if contours:
-            # Find largest contour
-            largest_contour = max(contours, key=cv2.contourArea)
-            
-            # Check if it's roughly circular (amigurumi)
-            area = cv2.contourArea(largest_contour)
-            perimeter = cv2.arcLength(largest_contour, True)
-            if perimeter > 0:
-                circularity = 4 * np.pi * area / (perimeter * perimeter)
-                if circularity > 0.6:  # Fairly circular
-                    is_amigurumi = True
-                    item_type = "amigurumi toy or stuffed item"
-        
-        # If not amigurumi, use shape analysis
-        if not is_amigurumi:
-            if "square" in shape and min(width, height) < max(width, height) * 1.2:
-                if max(width, height) < 800:
-                    item_type = "small square like a coaster, granny square, or dishcloth"
-                else:
-                    item_type = "large square like a pillow cover or afghan square"
-            elif "rectangular" in shape:
-                if aspect_ratio > 3:
-                    item_type = "long narrow piece like a scarf, bookmark, or trim"
-                elif aspect_ratio > 1.5:
-                    item_type = "rectangular piece like a placemat, panel, or small blanket"
-                else:
-                    item_type = "blanket, throw, or large rectangular piece"
-        
-        # 5. Skill level estimation
-        complexity_score = edge_density * 10 + (texture_variance / 1000)
-        if complexity_score > 2.5:
-            skill_level = "advanced"
-        elif complexity_score > 1.0:
-            skill_level = "intermediate"
-        else:
-            skill_level = "beginner"
-        
-        # Combine analysis
-        analysis = f"This appears to be a {skill_level}-level {item_type} featuring {stitch_pattern}. The piece shows {color_desc} colors and has a {shape} overall form."
+        features = compute_image_features(image, ANALYSIS_MAX_SIDE, original_size)
+        analysis = describe_image_features(features)
         
+        if digest:
+            analysis_cache.put("opencv", digest, analysis, OPENCV_CACHE_VARIANT)
         return analysis
         
     except Exception as e:
@@ -492,12 +665,43 @@ def estimate_difficulty_and_time(pattern_text: str) -> tuple:
     
     return difficulty, time_estimate
 
+async def analyze_upload(data: bytes, include_image_analysis: bool, timings: Dict[str, float]) -> tuple:
+    """Decode an upload, then run Gemini vision and the optional OpenCV analysis"""
+    loop = asyncio.get_running_loop()
+    image, original_size, gemini_image, digest = await run_timed(
+        timings, "decode", loop.run_in_executor(analysis_executor, decode_upload, data)
+    )
+    if image is None:
+        raise ValueError("Unable to process image")
+
+    # OpenCV analysis only feeds the response, so run it on request and
+    # overlap it with the network-bound Gemini call
+    vision_task = run_timed(timings, "gemini_vision", analysis_flights.do(
+        f"gemini_vision:{digest}", lambda: analyze_image_with_gemini_async(gemini_image, digest)
+    ))
+    if include_image_analysis:
+        analysis_task = run_timed(timings, "image_analysis", analysis_flights.do(
+            f"opencv:{digest}",
+            lambda: loop.run_in_executor(analysis_executor, analyze_image_content, image, digest, original_size)
+        ))
+        return await asyncio.gather(vision_task, analysis_task)
+    return await vision_task, None
+
+def image_generation_prompt(gemini_analysis: dict, user_prompt: str) -> str:
+    """Generation prompt from the vision description and the user's own words"""
+    item_type = gemini_analysis.get('item_type', 'crochet item')
+    detailed_description = gemini_analysis.get('description', '')
+    if user_prompt:
+        return f"Create a crochet pattern for: {user_prompt}. Additional context: {detailed_description}"
+    return f"Create a crochet {item_type} pattern. Description: {detailed_description}"
+
 @app.post("/generate-pattern", response_model=PatternResponse, status_code=status.HTTP_200_OK)
 async def generate_crochet_pattern(
     file: UploadFile = File(...),
     style: str = Body("standard"),
     model_type: str = Body("yarn_master"),
-    user_prompt: str = Body("")
+    user_prompt: str = Body(""),
+    include_image_analysis: bool = Body(False)
 ):
     try:
         logger.info(f"Processing uploaded file: {file.filename}")
@@ -511,22 +715,9 @@ async def generate_crochet_pattern(
             normalized_style = "standard"
             logger.warning(f"Invalid style '{style}' normalized to 'standard'")
 
-        # Create upload directory if needed
-        os.makedirs("uploaded_files", exist_ok=True)
-
-        # Save and validate file
-        temp_path = f"uploaded_files/{file.filename}"
-        try:
-            with open(temp_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error saving file: {str(e)}"
-            )
-
-        if not validate_image(temp_path):
-            os.remove(temp_path)
+        # Read the upload once; every analyzer shares the decoded result
+        data = await file.read()
+        if not validate_image(data[:IMAGE_HEADER_BYTES]):
             raise HTTPException(
                 status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
                 detail="Invalid or corrupted image file"
@@ -534,27 +725,18 @@ async def generate_crochet_pattern(
 
         # Process image with enhanced analysis
         try:
-            image = cv2.imread(temp_path)
-            if image is None:
-                raise ValueError("Unable to process image")
-
-            # Enhanced image analysis
-            image_analysis = analyze_image_content(temp_path)
-            
-            # Get detailed analysis from Gemini
-            gemini_analysis = analyze_image_with_gemini(temp_path)
-            item_type = gemini_analysis.get('item_type', 'crochet item')
-            detailed_description = gemini_analysis.get('description', '')
-            
-            if user_prompt:
-                clean_prompt = f"Create a crochet pattern for: {user_prompt}. Additional context: {detailed_description}"
-            else:
-                clean_prompt = f"Create a crochet {item_type} pattern. Description: {detailed_description}"
+            timings = {}
+            gemini_analysis, image_analysis = await analyze_upload(data, include_image_analysis, timings)
+            clean_prompt = image_generation_prompt(gemini_analysis, user_prompt)
             
             # Use pattern generator for all requests
             skill_level = "BEGINNER" if "beginner" in normalized_style else "INTERMEDIATE"
+            cached = False
             if pattern_generator:
-                pattern_text = pattern_generator.generate_pattern(clean_prompt, skill_level)
+                pattern_text, cached = await run_timed(
+                    timings, "generation",
+                    generate_with_cache(clean_prompt, skill_level, model_type)
+                )
             else:
                 pattern_text = "Pattern generator not available"
             
@@ -563,7 +745,8 @@ async def generate_crochet_pattern(
             difficulty, time_estimate = estimate_difficulty_and_time(pattern_text)
             
             generation_time = time.time() - start_time
-            logger.info(f"Pattern generated in {generation_time:.2f} seconds using {model_type}")
+            timings["total"] = round(generation_time, 3)
+            logger.info(f"Pattern generated in {generation_time:.2f} seconds using {model_type}: {timings}")
 
             return PatternResponse(
                 success=True,
@@ -573,7 +756,10 @@ async def generate_crochet_pattern(
                 model_used=AVAILABLE_MODELS[model_type],
                 materials=materials,
                 difficulty=difficulty,
-                estimated_time=time_estimate
+                estimated_time=time_estimate,
+                image_analysis=image_analysis,
+                timings=timings,
+                cached=cached
             )
 
         except Exception as e:
@@ -582,12 +768,6 @@ async def generate_crochet_pattern(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error processing image: {str(e)}"
             )
-        finally:
-            # Cleanup temporary files
-            try:
-                os.remove(temp_path)
-            except:
-                pass
 
     except HTTPException:
         raise
@@ -598,6 +778,42 @@ async def generate_crochet_pattern(
             detail=f"An unexpected error occurred: {str(e)}"
         )
 
+@app.post("/analyze-images", response_model=BatchAnalysisResponse)
+async def analyze_images(files: List[UploadFile] = File(...)):
+    """Classify a gallery of images in one batched pass"""
+    start_time = time.time()
+    uploads = [(file.filename, await file.read()) for file in files]
+    valid = [i for i, (_, data) in enumerate(uploads) if validate_image(data[:IMAGE_HEADER_BYTES])]
+    logger.info(f"Batch analyzing {len(valid)} of {len(uploads)} uploaded images")
+
+    loop = asyncio.get_running_loop()
+    batch = await loop.run_in_executor(
+        None, analyze_images_batch, [uploads[i][1] for i in valid], ANALYSIS_MAX_SIDE, analysis_executor
+    )
+    analyzed = dict(zip(valid, batch))
+
+    results = []
+    for i, (name, _) in enumerate(uploads):
+        result = analyzed.get(i, {"error": "Invalid or corrupted image file"})
+        if "error" in result:
+            results.append(ImageAnalysisResult(filename=name, success=False, error=result["error"]))
+            continue
+        features = result["features"]
+        results.append(ImageAnalysisResult(
+            filename=name,
+            success=True,
+            classification=result["classification"],
+            dominant_hues=features["dominant_hues"],
+            edge_density=features["edge_density"],
+            texture_variance=features["texture_variance"],
+            circularity=features["circularity"],
+            feature_vector=result["feature_vector"].tolist()
+        ))
+
+    analysis_time = time.time() - start_time
+    logger.info(f"Batch analysis finished in {analysis_time:.2f} seconds")
+    return BatchAnalysisResponse(success=True, results=results, analysis_time=f"{analysis_time:.2f}s")
+
 @app.post("/generate-pattern-from-text", response_model=PatternResponse)
 async def generate_pattern_from_text(request: PatternRequest):
     try:
@@ -615,8 +831,8 @@ async def generate_pattern_from_text(request: PatternRequest):
             )
 
         # Use the improved pattern generator
-        skill_level = "BEGINNER" if "beginner" in request.style else "INTERMEDIATE"
-        pattern_text = pattern_generator.generate_pattern(request.description, skill_level)
+        skill_level = request.generator_skill_level()
+        pattern_text, cached = await generate_with_cache(request.description, skill_level, request.model_type)
         
         # Extract additional information
         materials = extract_materials_from_pattern(pattern_text)
@@ -633,7 +849,8 @@ async def generate_pattern_from_text(request: PatternRequest):
             model_used="Improved Pattern Generator with Training Data",
             materials=materials,
             difficulty=difficulty,
-            estimated_time=time_estimate
+            estimated_time=time_estimate,
+            cached=cached
         )
     except Exception as e:
         logger.error(f"Error generating pattern: {str(e)}")
@@ -646,6 +863,189 @@ async def generate_pattern_from_text(request: PatternRequest):
             model_used=AVAILABLE_MODELS.get(request.model_type, "Unknown")
         )
 
+# Proxies such as nginx buffer responses unless told not to
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+async def _single_chunk(text: str):
+    yield text
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event; JSON keeps newlines in pattern text intact"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_pattern_events(prompt: str, skill_level: str, model_type: str, metadata: dict,
+                                timings: Dict[str, float], start_time: float):
+    """Relay generated text as `chunk` events, then the extracted metadata.
+
+    Event order: chunk* then metadata then done, or error if generation fails.
+    A pattern cache hit is sent as a single chunk.
+    """
+    embedding = await cache_embedding(prompt)
+    cached = pattern_cache.get(prompt, skill_level, model_type, embedding)
+    chunks = []
+    generation_start = time.perf_counter()
+    try:
+        if cached is None:
+            source = pattern_generator.generate_pattern_stream(prompt, skill_level)
+        else:
+            source = _single_chunk(cached)
+        async for text in source:
+            if not chunks:
+                timings["first_chunk"] = round(time.time() - start_time, 3)
+            chunks.append(text)
+            yield sse_event("chunk", {"text": text})
+    except Exception as e:
+        logger.error(f"Error streaming pattern: {str(e)}")
+        yield sse_event("error", {"error": str(e)})
+        return
+    timings["generation"] = round(time.perf_counter() - generation_start, 3)
+
+    pattern_text = "".join(chunks)
+    if cached is None and not is_generation_error(pattern_text):
+        pattern_cache.put(prompt, skill_level, model_type, pattern_text, timings["generation"], embedding)
+    materials = extract_materials_from_pattern(pattern_text)
+    difficulty, time_estimate = estimate_difficulty_and_time(pattern_text)
+    generation_time = time.time() - start_time
+    timings["total"] = round(generation_time, 3)
+    logger.info(f"Pattern streamed in {generation_time:.2f} seconds: {timings}")
+
+    yield sse_event("metadata", {
+        **metadata,
+        "materials": materials,
+        "difficulty": difficulty,
+        "estimated_time": time_estimate,
+        "generation_time": f"{generation_time:.2f}s",
+        "timings": timings,
+        "cached": cached is not None
+    })
+    yield sse_event("done", {"success": True})
+
+@app.post("/generate-pattern-from-text/stream")
+async def generate_pattern_from_text_stream(request: StreamPatternRequest):
+    """Stream a pattern from a text description as Server-Sent Events"""
+    if not pattern_generator:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Pattern generator not initialized"
+        )
+    logger.info(f"Streaming pattern from text: {request.description}")
+    skill_level = request.generator_skill_level()
+    metadata = {
+        "style_used": request.style,
+        "skill_level": skill_level,
+        "model_used": "Improved Pattern Generator with Training Data",
+        "training_examples_used": len(pattern_generator.training_data)
+    }
+    return StreamingResponse(
+        stream_pattern_events(request.description, skill_level, request.model_type, metadata, {}, time.time()),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@app.post("/generate-pattern/stream")
+async def generate_crochet_pattern_stream(
+    file: UploadFile = File(...),
+    style: str = Body("standard"),
+    model_type: str = Body("yarn_master"),
+    user_prompt: str = Body(""),
+    include_image_analysis: bool = Body(False)
+):
+    """Stream a pattern for an uploaded image as Server-Sent Events.
+
+    An `analysis` event with the vision result precedes the pattern chunks.
+    """
+    start_time = time.time()
+    normalized_style = style.lower().strip()
+    if normalized_style not in VALID_STYLES:
+        normalized_style = "standard"
+
+    data = await file.read()
+    if not validate_image(data[:IMAGE_HEADER_BYTES]):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Invalid or corrupted image file"
+        )
+    if not pattern_generator:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Pattern generator not initialized"
+        )
+    logger.info(f"Streaming pattern for uploaded file: {file.filename}")
+
+    async def events():
+        timings = {}
+        try:
+            gemini_analysis, image_analysis = await analyze_upload(data, include_image_analysis, timings)
+        except Exception as e:
+            logger.error(f"Error processing image: {str(e)}")
+            yield sse_event("error", {"error": f"Error processing image: {str(e)}"})
+            return
+        yield sse_event("analysis", {
+            "item_type": gemini_analysis.get('item_type', 'crochet item'),
+            "image_analysis": image_analysis
+        })
+
+        skill_level = "BEGINNER" if "beginner" in normalized_style else "INTERMEDIATE"
+        metadata = {
+            "style_used": normalized_style,
+            "skill_level": skill_level,
+            "model_used": AVAILABLE_MODELS.get(model_type, AVAILABLE_MODELS["yarn_master"]),
+            "image_analysis": image_analysis
+        }
+        prompt = image_generation_prompt(gemini_analysis, user_prompt)
+        async for event in stream_pattern_events(prompt, skill_level, model_type, metadata, timings, start_time):
+            yield event
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def rendered_pdf(pattern: str, title: str, key: str) -> bytes:
+    """Cached PDF bytes, rendering in the process pool on a miss"""
+    data = pdf_cache.get(key)
+    if data is not None:
+        return data
+
+    async def render() -> bytes:
+        render_start = time.perf_counter()
+        data = await asyncio.get_running_loop().run_in_executor(pdf_executor(), render_pdf, pattern, title)
+        pdf_cache.put(key, data)
+        logger.info(f"Rendered {len(data)} byte PDF in {time.perf_counter() - render_start:.2f} seconds")
+        return data
+
+    return await pdf_flights.do(key, render)
+
+def pdf_filename(title: str) -> str:
+    stem = re.sub(r'[^A-Za-z0-9]+', '_', title).strip('_').lower()
+    return f"{stem[:80] or 'crochet_pattern'}.pdf"
+
+@app.post("/generate-pdf")
+async def generate_pdf(request: PDFRequest, if_none_match: Optional[str] = Header(None)):
+    """Render a generated pattern as a PDF download"""
+    if not REPORTLAB_AVAILABLE:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="PDF generation not available")
+
+    key = content_hash(request.pattern, request.title)
+    etag = f'"{key}"'
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    try:
+        data = await rendered_pdf(request.pattern, request.title, key)
+    except Exception as e:
+        logger.error(f"Error rendering PDF: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error rendering PDF: {str(e)}")
+
+    async def chunks():
+        view = memoryview(data)
+        for offset in range(0, len(view), PDF_CHUNK_SIZE):
+            yield bytes(view[offset:offset + PDF_CHUNK_SIZE])
+
+    return StreamingResponse(chunks(), media_type="application/pdf", headers={
+        "Content-Length": str(len(data)),
+        "Content-Disposition": f'attachment; filename="{pdf_filename(request.title)}"',
+        "ETag": etag,
+        "Cache-Control": "private, max-age=86400",
+    })
+
 @app.get("/models")
 async def get_available_models():
     """Get list of available models"""
@@ -663,6 +1063,12 @@ async def health_check():
         "status": "healthy",
         "pattern_generator_loaded": pattern_generator is not None,
         "training_examples": len(pattern_generator.training_data) if pattern_generator else 0,
+        "analysis_cache": analysis_cache.stats(),
+        "pattern_cache": pattern_cache.stats(),
+        "pdf_cache": pdf_cache.stats(),
+        "single_flight": {"generation": generation_flights.stats(), "analysis": analysis_flights.stats()},
+        "rag_loaded": rag_pipeline.loaded,
+        "embedding_cache": rag_pipeline.embedder.stats() if rag_pipeline.embedder else None,
         "timestamp": time.time()
     }
 
@@ -710,7 +1116,7 @@ async def generate_simple_pattern(request: dict = Body(...)):
         logger.info(f"Generating pattern for: {description} (skill: {skill_level})")
         logger.info(f"Training data loaded: {len(pattern_generator.training_data)} examples")
         
-        pattern = pattern_generator.generate_pattern(description, skill_level)
+        pattern, cached = await generate_with_cache(description, skill_level, "yarn_master")
         
         logger.info(f"Generated pattern length: {len(pattern)} characters")
         
@@ -719,7 +1125,8 @@ async def generate_simple_pattern(request: dict = Body(...)):
             "pattern": pattern,
             "description": description,
             "skill_level": skill_level,
-            "training_examples_used": len(pattern_generator.training_data)
+            "training_examples_used": len(pattern_generator.training_data),
+            "cached": cached
         }
     except Exception as e:
         logger.error(f"Error in generate_simple_pattern: {str(e)}")
@@ -738,7 +1145,10 @@ async def root():
         "endpoints": {
             "/generate-pattern": "Generate pattern from image",
             "/generate-pattern-from-text": "Generate pattern from text description",
+            "/generate-pattern/stream": "Stream a pattern from an image as Server-Sent Events",
+            "/generate-pattern-from-text/stream": "Stream a pattern from text as Server-Sent Events",
             "/generate-simple-pattern": "Generate pattern using training data",
+            "/analyze-images": "Batch analyze and classify images",
             "/generate-pdf": "Generate PDF from pattern",
             "/models": "Get available models and styles",
             "/health": "Health check"
@@ -3,6 +3,8 @@ import time
 import os
 from pathlib import Path
 
+from training_index import TrainingIndex
+
 def monitor_progress():
     training_file = Path("training_data/training_data.jsonl")
     
@@ -10,32 +12,29 @@ def monitor_progress():
         print("Training data file not found. Start train_model.py first.")
         return
     
-    last_size = 0
-    last_count = 0
+    # Start from the sidecar index and only read bytes appended after it
+    index = TrainingIndex(training_file, readonly=True)
+    last_count = None
     
     print("🔍 Monitoring training progress... (Press Ctrl+C to stop)")
     print("=" * 50)
     
     while True:
         try:
-            # Check file size and line count
-            current_size = training_file.stat().st_size
-            
-            with open(training_file, 'r') as f:
-                current_count = sum(1 for _ in f)
+            index.catch_up()
+            current_count = index.count
             
             # Show progress if changed
             if current_count != last_count:
-                size_mb = current_size / (1024 * 1024)
+                size_mb = index.end / (1024 * 1024)
                 progress = (current_count / 3111) * 100
                 
                 print(f"[{time.strftime('%H:%M:%S')}] Examples: {current_count:,}/3,111 ({progress:.1f}%) | Size: {size_mb:.1f}MB")
                 
-                if current_count > last_count:
+                if last_count is not None and current_count > last_count:
                     new_examples = current_count - last_count
                     print(f"  ➕ Added {new_examples} new examples")
             
-            last_size = current_size
             last_count = current_count
             
             time.sleep(10)  # Check every 10 seconds
@@ -48,4 +47,4 @@ def monitor_progress():
             time.sleep(5)
 
 if __name__ == "__main__":
-    monitor_progress()
\ No newline at end of file
+    monitor_progress()
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from embedding_service import normalize_text
+
+# Hits only note their access time in memory; it is written at most this often
+TOUCH_FLUSH_INTERVAL = float(os.getenv('PATTERN_CACHE_TOUCH_FLUSH', '30'))
+
+
+def cache_key(description: str, skill_level: str, model_type: str) -> str:
+    """Key shared by requests that differ only in case and whitespace"""
+    raw = f"{normalize_text(description)}\x1f{skill_level.upper()}\x1f{model_type}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class PatternCache:
+    """Generated patterns keyed by normalized description, skill level and model.
+
+    Backed by SQLite so a file path shares entries across workers and
+    restarts; without one it uses an in-memory database. Entries expire after
+    ttl seconds and the least recently used are evicted beyond max_entries.
+    When a query embedding is supplied and similarity_threshold is set, an
+    exact miss can still hit a stored pattern whose description embedding has
+    cosine similarity at or above the threshold.
+
+    A hit does not write to SQLite: recency is buffered and flushed with the
+    next put() or after TOUCH_FLUSH_INTERVAL, so lookups on the event loop
+    stay read-only. Buffered recency lost in a crash only blurs LRU order.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 7 * 24 * 3600, db_path: Optional[str] = None,
+                 similarity_threshold: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path or ':memory:'
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._touched = {}
+        self._flushed_at = time.time()
+        self._connect()
+        if db_path and hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _connect(self) -> None:
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS pattern_cache (
+                key TEXT PRIMARY KEY,
+                skill_level TEXT NOT NULL,
+                model_type TEXT NOT NULL,
+                pattern TEXT NOT NULL,
+                embedding BLOB,
+                generation_seconds REAL NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._db.commit()
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._connect()
+
+    def _write_touched(self, now: float) -> None:
+        """Write buffered access times; the caller commits"""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE pattern_cache SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._touched.items()]
+            )
+            self._touched.clear()
+        self._flushed_at = now
+
+    @property
+    def semantic(self) -> bool:
+        return bool(self.similarity_threshold)
+
+    def get(self, description: str, skill_level: str, model_type: str,
+            embedding: Optional[np.ndarray] = None) -> Optional[str]:
+        key = cache_key(description, skill_level, model_type)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT key, pattern, generation_seconds FROM pattern_cache WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is None and embedding is not None and self.semantic:
+                row = self._nearest(embedding, skill_level.upper(), model_type, now)
+                if row is not None:
+                    self.semantic_hits += 1
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.saved_seconds += row[2]
+            self._touched[row[0]] = now
+            if now - self._flushed_at >= TOUCH_FLUSH_INTERVAL:
+                self._write_touched(now)
+                self._db.commit()
+            return row[1]
+
+    def _nearest(self, embedding, skill_level, model_type, now):
+        rows = self._db.execute(
+            """SELECT key, pattern, generation_seconds, embedding FROM pattern_cache
+               WHERE skill_level = ? AND model_type = ? AND created_at > ? AND embedding IS NOT NULL""",
+            (skill_level, model_type, now - self.ttl)
+        ).fetchall()
+        if not rows:
+            return None
+        matrix = np.frombuffer(b''.join(row[3] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+        scores = matrix @ unit_vector(embedding)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return rows[best][:3]
+
+    def put(self, description: str, skill_level: str, model_type: str, pattern: str,
+            generation_seconds: float, embedding: Optional[np.ndarray] = None) -> None:
+        key = cache_key(description, skill_level, model_type)
+        blob = unit_vector(embedding).tobytes() if embedding is not None else None
+        now = time.time()
+        with self._lock:
+            # Eviction below needs current recency
+            self._write_touched(now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO pattern_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, skill_level.upper(), model_type, pattern, blob, generation_seconds, now, now)
+            )
+            self._db.execute("DELETE FROM pattern_cache WHERE created_at <= ?", (now - self.ttl,))
+            self._db.execute(
+                """DELETE FROM pattern_cache WHERE rowid IN (
+                    SELECT rowid FROM pattern_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,)
+            )
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            entries = self._db.execute("SELECT COUNT(*) FROM pattern_cache").fetchone()[0]
+            return {
+                "entries": entries,
+                "persistent": self.db_path != ':memory:',
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
+
+
+def unit_vector(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
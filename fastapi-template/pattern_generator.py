@@ -1,58 +1,53 @@
-import google.generativeai as genai
-import json
-import random
+import asyncio
+import os
 from pathlib import Path
+from pattern_index import PatternIndex, DEFAULT_KEYWORDS
+import training_store
+import gemini_client
+
+TRAINING_FILE = Path("training_data/training_data.jsonl")
+STORE_FILE = Path("training_data/training_store.bin")
+MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '16'))
+NO_TRAINING_DATA = "No training data available"
+ERROR_PREFIX = "Error generating pattern:"
+
+def is_generation_error(text):
+    """True for the placeholder strings returned instead of a pattern"""
+    return text == NO_TRAINING_DATA or text.startswith(ERROR_PREFIX)
 
 class CrochetPatternGenerator:
-    def __init__(self, api_key):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+    def __init__(self, api_key, keywords=DEFAULT_KEYWORDS, model=None, max_concurrency=MAX_CONCURRENCY):
+        if model is None:
+            model = gemini_client.get_model(api_key=api_key)
+        self.model = model
+        # Bounds in-flight async generations per worker
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.keywords = tuple(keywords)
         self.training_data = self.load_training_data()
+        self.index = PatternIndex(self.training_data, text_getter=lambda record: record.terms)
     
     def load_training_data(self):
-        """Load training examples for context"""
-        training_file = Path("training_data/training_data.jsonl")
-        examples = []
-        
-        if training_file.exists():
-            print(f"Loading training data from {training_file}...")
-            with open(training_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        examples.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        continue
-            print(f"Loaded {len(examples)} training examples")
-        else:
-            print(f"Training data file not found at {training_file}")
-        
+        """Load the compiled training store, compiling it from JSONL if stale"""
+        if training_store.is_stale(TRAINING_FILE, STORE_FILE):
+            if not TRAINING_FILE.exists():
+                print(f"Training data file not found at {TRAINING_FILE}")
+                return []
+            print(f"Compiling training data from {TRAINING_FILE}...")
+            training_store.compile_training_data(TRAINING_FILE, STORE_FILE)
+
+        examples = training_store.TrainingStore(STORE_FILE)
+        print(f"Loaded {len(examples)} training examples")
         return examples
     
-    def generate_pattern(self, description, skill_level="INTERMEDIATE"):
-        """Generate a crochet pattern based on description"""
-        if not self.training_data:
-            return "No training data available"
-        
+    def build_prompt(self, description, skill_level="INTERMEDIATE"):
+        """Build the generation prompt with context from relevant examples"""
         # Get relevant examples based on description keywords
         relevant_examples = self.find_relevant_examples(description, skill_level)
         
         # Build context from best examples
         context = "Based on these similar crochet patterns:\n\n"
         for i, example in enumerate(relevant_examples[:2], 1):
-            # Extract clean pattern info from training data
-            output = example['output']
-            if '```json' in output:
-                try:
-                    json_str = output.replace('```json', '').replace('```', '').strip()
-                    pattern_data = json.loads(json_str)
-                    title = pattern_data.get('title', 'Pattern')
-                    materials = pattern_data.get('materials', [])
-                    instructions = pattern_data.get('instructions', {})
-                    context += f"Example {i} - {title}:\nMaterials: {str(materials)[:200]}...\nInstructions: {str(instructions)[:300]}...\n\n"
-                except:
-                    context += f"Example {i}: {output[:400]}...\n\n"
-            else:
-                context += f"Example {i}: {output[:400]}...\n\n"
+            context += training_store.format_context(example, i)
         
         prompt = f"""You are an expert crochet pattern designer. Create a complete, professional crochet pattern for: {description}
 
@@ -101,34 +96,65 @@ Create a detailed pattern with these sections:
 ═══════════════════════════════════════════════════════════════
 
 Make it professional, detailed, and beautifully formatted."""
+        return prompt
+
+    def generate_pattern(self, description, skill_level="INTERMEDIATE"):
+        """Generate a crochet pattern based on description"""
+        if not self.training_data:
+            return NO_TRAINING_DATA
 
+        prompt = self.build_prompt(description, skill_level)
         try:
             response = self.model.generate_content(prompt)
             return response.text
         except Exception as e:
-            return f"Error generating pattern: {e}"
+            return f"{ERROR_PREFIX} {e}"
+
+    async def generate_pattern_async(self, description, skill_level="INTERMEDIATE"):
+        """Generate a pattern without blocking the event loop"""
+        if not self.training_data:
+            return NO_TRAINING_DATA
+
+        prompt = self.build_prompt(description, skill_level)
+        try:
+            async with self.semaphore:
+                response = await self.model.generate_content_async(prompt)
+            return response.text
+        except Exception as e:
+            return f"{ERROR_PREFIX} {e}"
+    
+    async def generate_pattern_stream(self, description, skill_level="INTERMEDIATE"):
+        """Yield the pattern text in chunks as the model streams it"""
+        if not self.training_data:
+            yield NO_TRAINING_DATA
+            return
+
+        prompt = self.build_prompt(description, skill_level)
+        # The model is drained into a queue so the semaphore is released as
+        # soon as generation finishes, not when a slow client has read it all
+        queue = asyncio.Queue()
+
+        async def produce():
+            try:
+                async with self.semaphore:
+                    async for text in self.model.stream_content_async(prompt):
+                        queue.put_nowait(text)
+            except Exception as e:
+                queue.put_nowait(e)
+            queue.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while (item := await queue.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            producer.cancel()
     
     def find_relevant_examples(self, description, skill_level="INTERMEDIATE"):
         """Find training examples most relevant to the description"""
-        description_lower = description.lower()
-        scored_examples = []
-        
-        for example in self.training_data:
-            score = 0
-            example_text = example.get('output', '').lower()
-            
-            # Score based on keyword matches
-            keywords = ['scarf', 'hat', 'blanket', 'sweater', 'amigurumi', 'toy', 'bag', 'dishcloth', 'coaster']
-            for keyword in keywords:
-                if keyword in description_lower and keyword in example_text:
-                    score += 10
-            
-            # Score based on skill level
-            if skill_level.lower() in example_text:
-                score += 5
-            
-            scored_examples.append((score, example))
-        
-        # Sort by score and return top examples
-        scored_examples.sort(key=lambda x: x[0], reverse=True)
-        return [ex[1] for ex in scored_examples[:5]] if scored_examples else random.sample(self.training_data, min(3, len(self.training_data)))
\ No newline at end of file
+        if not self.training_data:
+            return []
+        doc_ids = self.index.search(description, skill_level, k=5, keywords=self.keywords)
+        return [self.training_data[doc_id] for doc_id in doc_ids]
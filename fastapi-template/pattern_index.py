@@ -0,0 +1,91 @@
+import heapq
+import re
+from collections import defaultdict
+
+# Item keywords scored by find_relevant_examples
+DEFAULT_KEYWORDS = ('scarf', 'hat', 'blanket', 'sweater', 'amigurumi', 'toy', 'bag', 'dishcloth', 'coaster')
+
+# Skill levels precomputed per example at build time
+SKILL_LEVELS = ('beginner', 'easy', 'intermediate', 'advanced', 'experienced')
+
+KEYWORD_SCORE = 10
+SKILL_SCORE = 5
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_term(token):
+    """Fold simple plurals so 'hats' and 'hat' share a posting list"""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Lowercase text and split it into normalized terms"""
+    return {normalize_term(token) for token in _TOKEN_RE.findall(text.lower())}
+
+
+class PatternIndex:
+    """Inverted term index over training examples, built once at load time"""
+
+    def __init__(self, examples, text_getter=None):
+        text_getter = text_getter or (lambda example: example.get('output', ''))
+        self.size = 0
+        self.postings = defaultdict(list)
+        self.skill_postings = defaultdict(list)
+
+        for doc_id, example in enumerate(examples):
+            terms = tokenize(text_getter(example))
+            for term in terms:
+                self.postings[term].append(doc_id)
+            for level in SKILL_LEVELS:
+                if level in terms:
+                    self.skill_postings[level].append(doc_id)
+            self.size += 1
+
+        self.postings = dict(self.postings)
+        self.skill_postings = dict(self.skill_postings)
+
+    def _skill_docs(self, skill_level):
+        terms = tokenize(skill_level)
+        if len(terms) == 1:
+            term = next(iter(terms))
+            if term in SKILL_LEVELS:
+                return self.skill_postings.get(term, [])
+            return self.postings.get(term, [])
+        # Multi-word levels must match every term
+        matches = None
+        for term in terms:
+            docs = set(self.postings.get(term, []))
+            matches = docs if matches is None else matches & docs
+        return sorted(matches or [])
+
+    def score(self, description, skill_level="INTERMEDIATE", keywords=DEFAULT_KEYWORDS):
+        """Return {doc_id: score} for every example matching a keyword or the skill level"""
+        description_terms = tokenize(description)
+        scores = defaultdict(int)
+
+        for keyword in {normalize_term(k.lower()) for k in keywords}:
+            if keyword in description_terms:
+                for doc_id in self.postings.get(keyword, []):
+                    scores[doc_id] += KEYWORD_SCORE
+
+        for doc_id in self._skill_docs(skill_level):
+            scores[doc_id] += SKILL_SCORE
+
+        return scores
+
+    def search(self, description, skill_level="INTERMEDIATE", k=5, keywords=DEFAULT_KEYWORDS):
+        """Return the ids of the top k examples, ties broken by corpus order"""
+        scores = self.score(description, skill_level, keywords)
+        top = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+        result = [doc_id for doc_id, _ in top]
+
+        # Pad with unmatched examples in corpus order, as the full sort did
+        doc_id = 0
+        while len(result) < min(k, self.size):
+            if doc_id not in scores:
+                result.append(doc_id)
+            doc_id += 1
+        return result
@@ -0,0 +1,224 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# Lines made of box-drawing or ASCII rule characters frame the pattern title
+RULE_LINE = re.compile(r'^\s*[═━─=\-_*~]{3,}\s*$')
+# "🧵 MATERIALS:", "**GAUGE:** 4 in" or "SKILL LEVEL: BEGINNER"
+SECTION_LINE = re.compile(r'^\s*(?:[^\w\s*#]+\s*)?[*#\s]*([A-Z][A-Z0-9 /&\'()-]*[A-Z)]):[*\s]*(.*)$')
+# "Foundation:", "Main Pattern:" inside the instructions
+SUBHEADING_LINE = re.compile(r'^\s*[*#\s]*([A-Z][\w ,/&\'()-]{0,40}):[*\s]*$')
+BULLET_LINE = re.compile(r'^\s*[•*\-]\s+(.*)$')
+
+Section = Tuple[str, List[str]]
+
+
+def printable(text: str) -> str:
+    """Drop characters the standard PDF fonts have no glyph for, such as emoji"""
+    kept = []
+    for char in text:
+        try:
+            char.encode('cp1252')
+            kept.append(char)
+        except UnicodeEncodeError:
+            continue
+    return re.sub(r'[ \t]{2,}', ' ', ''.join(kept)).strip()
+
+
+def parse_pattern(pattern: str) -> Tuple[Optional[str], List[Section]]:
+    """Split generator output into its title and (heading, lines) sections.
+
+    The title is the first line between the opening rules. A heading's inline
+    value ("GAUGE: 4 in") becomes the first line of its section; text before
+    the first heading and inside the closing frame is kept under an empty
+    heading.
+    """
+    title = None
+    sections: List[Section] = [("", [])]
+    rules_seen = 0
+    for raw in pattern.splitlines():
+        if RULE_LINE.match(raw):
+            rules_seen += 1
+            if rules_seen == 3:
+                # The closing frame ("Happy Crocheting!") is not part of the last section
+                sections.append(("", []))
+            continue
+        line = raw.rstrip()
+        if not printable(line):
+            if sections[-1][1] and sections[-1][1][-1]:
+                sections[-1][1].append("")
+            continue
+        if rules_seen == 1 and title is None:
+            title = printable(line.strip('*# '))
+            continue
+        match = SECTION_LINE.match(line)
+        if match:
+            heading, value = match.groups()
+            sections.append((heading.title(), [value] if printable(value) else []))
+            continue
+        sections[-1][1].append(line)
+    for _, lines in sections:
+        while lines and not lines[-1]:
+            lines.pop()
+    return title, [(heading, lines) for heading, lines in sections if heading or lines]
+
+
+def render_pdf(pattern: str, title: str) -> bytes:
+    """Lay out a parsed pattern with reportlab and return the PDF bytes"""
+    import io
+    from xml.sax.saxutils import escape
+
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    pattern_title, sections = parse_pattern(pattern)
+    styles = getSampleStyleSheet()
+    story = [Paragraph(escape(printable(pattern_title or title)), styles['Title'])]
+    if pattern_title and printable(title) and printable(title) != printable(pattern_title):
+        story.append(Paragraph(escape(printable(title)), styles['Italic']))
+
+    for heading, lines in sections:
+        if heading:
+            story.append(Paragraph(escape(heading), styles['Heading2']))
+        for line in lines:
+            if not line:
+                story.append(Spacer(1, 0.08 * inch))
+                continue
+            bullet = BULLET_LINE.match(line)
+            if bullet:
+                story.append(Paragraph(escape(printable(bullet.group(1))), styles['BodyText'], bulletText='•'))
+            elif SUBHEADING_LINE.match(line):
+                story.append(Paragraph(escape(printable(line.strip('*# '))), styles['Heading4']))
+            else:
+                story.append(Paragraph(escape(printable(line)), styles['BodyText']))
+
+    buffer = io.BytesIO()
+    document = SimpleDocTemplate(buffer, pagesize=letter, title=printable(pattern_title or title),
+                                 leftMargin=0.9 * inch, rightMargin=0.9 * inch)
+    document.build(story)
+    return buffer.getvalue()
+
+
+def content_hash(pattern: str, title: str) -> str:
+    return hashlib.sha256(f"{title}\x1f{pattern}".encode('utf-8')).hexdigest()
+
+
+class PDFCache:
+    """Rendered PDFs keyed by content hash.
+
+    An in-memory LRU bounded by total bytes; when a directory is given,
+    renders are also written there so other workers and restarts reuse them.
+    The directory is bounded by max_disk_bytes: files are touched when read
+    and the least recently used are deleted once it grows past the limit.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, directory: Optional[str] = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_size = sum(entry.stat().st_size for entry in self._disk_entries())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.directory and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+                # Recency for eviction
+                os.utime(self._path(key))
+            except FileNotFoundError:
+                # Evicted by another worker in between
+                with self._lock:
+                    self.misses += 1
+                return None
+            self._remember(key, data)
+            with self._lock:
+                self.hits += 1
+            return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> None:
+        self._remember(key, data)
+        if self.directory:
+            # Write then rename so a concurrent reader never sees a partial file
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            with self._lock:
+                # Other workers write here too, so this total is only a trigger;
+                # pruning rescans the directory
+                self._disk_size += len(data)
+                over = self._disk_size > self.max_disk_bytes
+            if over:
+                self._prune_directory()
+
+    def _disk_entries(self) -> list:
+        return [entry for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith('.pdf')]
+
+    def _prune_directory(self) -> None:
+        """Delete the least recently used files until the directory fits"""
+        entries = []
+        for entry in self._disk_entries():
+            try:
+                entries.append((entry.stat().st_mtime, entry.stat().st_size, entry.path))
+            except FileNotFoundError:
+                continue
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._disk_size = total
+
+    def _remember(self, key: str, data: bytes) -> None:
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "persistent": bool(self.directory),
+                "disk_bytes": self._disk_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
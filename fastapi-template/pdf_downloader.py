@@ -0,0 +1,239 @@
+"""Concurrent pattern PDF downloads for simple_scraper.
+
+The page walk only discovers hrefs; this module fetches them. Workers share
+one pooled httpx.AsyncClient, so connections and TLS sessions are reused.
+Each host is capped at a few requests in flight.
+
+Each file streams into `<name>.part` in 64KB chunks and is renamed when
+complete. An interrupted download is resumed with a Range request guarded
+by If-Range. The ETag and Last-Modified of every file are appended to
+`.downloads.jsonl` (the last line per file wins), so a later run sends a
+conditional request and skips files the server reports as unchanged (304).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from gemini_client import backoff_delay
+
+CHUNK_SIZE = 64 * 1024
+METADATA_NAME = ".downloads.jsonl"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def filename_for(url: str) -> str:
+    return url.split("/")[-1].split("?")[0]
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class DownloadResult:
+    url: str
+    filename: str
+    status: str  # saved, resumed, not_modified, exists or failed
+    bytes: int = 0
+    error: Optional[str] = None
+    sha256: Optional[str] = None
+    size: Optional[int] = None
+
+
+class PDFDownloader:
+    def __init__(self, dest_dir="scraped_patterns", concurrency: int = 16, per_host: int = 4,
+                 chunk_size: int = CHUNK_SIZE, retries: int = 3, timeout: float = 30.0,
+                 backoff_base: float = 1.0, on_result: Optional[Callable[[DownloadResult], None]] = None):
+        self.dest_dir = Path(dest_dir)
+        self.dest_dir.mkdir(parents=True, exist_ok=True)
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        # Called from the download loop as each URL finishes
+        self.on_result = on_result
+        self.metadata_path = self.dest_dir / METADATA_NAME
+        self.metadata: Dict[str, dict] = self._load_metadata()
+        self._host_limits = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        self._queue = None
+        self._loop = None
+        self._thread = None
+        self._results: List[DownloadResult] = []
+        self._submitted = set()
+
+    def _load_metadata(self) -> Dict[str, dict]:
+        metadata = {}
+        if not self.metadata_path.exists():
+            return metadata
+        with open(self.metadata_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                metadata[record['filename']] = record
+        return metadata
+
+    def _record(self, filename: str, **fields) -> None:
+        record = {**self.metadata.get(filename, {}), **fields, 'filename': filename}
+        self.metadata[filename] = record
+        with open(self.metadata_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def _client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        return httpx.AsyncClient(limits=limits, timeout=self.timeout, follow_redirects=True)
+
+    async def download(self, client: httpx.AsyncClient, url: str) -> DownloadResult:
+        """Fetch one URL with retries; never raises"""
+        filename = filename_for(url)
+        attempts = max(1, self.retries)
+        for attempt in range(attempts):
+            try:
+                async with self._host_limits[urlparse(url).netloc]:
+                    result = await self._fetch(client, url, filename)
+                break
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code in RETRYABLE_STATUS
+                print(f"⚠️ Attempt {attempt + 1} failed for {filename}: {e}")
+                result = DownloadResult(url, filename, 'failed', error=str(e))
+                if not retryable:
+                    break
+                if attempt < attempts - 1:
+                    await asyncio.sleep(backoff_delay(attempt, self.backoff_base))
+            except Exception as e:
+                # Disk errors writing the .part file, undecodable bodies and the
+                # like; retrying will not help and one URL must not stop the workers
+                print(f"⚠️ Attempt {attempt + 1} failed for {filename}: {e!r}")
+                result = DownloadResult(url, filename, 'failed', error=repr(e))
+                break
+        if result.status == 'failed':
+            print(f"❌ Skipping {filename} after {attempt + 1} attempts.")
+        return result
+
+    async def _fetch(self, client, url, filename) -> DownloadResult:
+        save_path = self.dest_dir / filename
+        part_path = self.dest_dir / f"{filename}.part"
+        known = self.metadata.get(filename, {})
+        validator = known.get('etag') or known.get('last_modified')
+
+        headers = {}
+        if save_path.exists():
+            if not validator:
+                return DownloadResult(url, filename, 'exists', sha256=await asyncio.to_thread(file_sha256, save_path),
+                                      size=save_path.stat().st_size)
+            if known.get('etag'):
+                headers['If-None-Match'] = known['etag']
+            if known.get('last_modified'):
+                headers['If-Modified-Since'] = known['last_modified']
+        resume_from = part_path.stat().st_size if part_path.exists() else 0
+        if resume_from and known.get('partial') and validator:
+            headers['Range'] = f"bytes={resume_from}-"
+            headers['If-Range'] = validator
+        else:
+            resume_from = 0
+
+        async with client.stream('GET', url, headers=headers) as response:
+            if response.status_code == 304:
+                return DownloadResult(url, filename, 'not_modified')
+            response.raise_for_status()
+            resumed = response.status_code == 206 and resume_from > 0
+            # Recorded before the body so a killed run can resume this file
+            self._record(filename, url=url, etag=response.headers.get('etag'),
+                         last_modified=response.headers.get('last-modified'), partial=True)
+            written = 0
+            with open(part_path, 'ab' if resumed else 'wb') as f:
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    f.write(chunk)
+                    written += len(chunk)
+
+        os.replace(part_path, save_path)
+        size = save_path.stat().st_size
+        self._record(filename, partial=False, size=size)
+        print(f"✅ Saved {filename}")
+        return DownloadResult(url, filename, 'resumed' if resumed else 'saved', written,
+                              sha256=await asyncio.to_thread(file_sha256, save_path), size=size)
+
+    async def download_all(self, urls: Iterable[str]) -> List[DownloadResult]:
+        """Download every URL with `concurrency` workers sharing one client"""
+        queue = asyncio.Queue()
+        for url in dict.fromkeys(urls):
+            queue.put_nowait(url)
+        results = []
+        # Semaphores belong to the loop they were created on
+        self._host_limits.clear()
+        async with self._client() as client:
+            await asyncio.gather(*(self._worker(client, queue, results) for _ in range(self.concurrency)))
+        return results
+
+    async def _worker(self, client, queue, results, wait=False):
+        while True:
+            if wait:
+                url = await queue.get()
+            else:
+                try:
+                    url = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+            if url is None:
+                return
+            try:
+                result = await self.download(client, url)
+                results.append(result)
+                if self.on_result is not None:
+                    try:
+                        self.on_result(result)
+                    except Exception as e:
+                        print(f"⚠️ Could not record result for {result.filename}: {e!r}")
+            finally:
+                queue.task_done()
+
+    # Background mode: the synchronous page walk submits hrefs as it finds
+    # them while downloads run on their own event loop thread
+
+    def start(self) -> None:
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(started,), name="pdf-downloads", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def _run_loop(self, started) -> None:
+        async def main():
+            self._loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue()
+            self._host_limits.clear()
+            started.set()
+            async with self._client() as client:
+                await asyncio.gather(*(
+                    self._worker(client, self._queue, self._results, wait=True) for _ in range(self.concurrency)
+                ))
+        asyncio.run(main())
+
+    def submit(self, url: str) -> None:
+        if url in self._submitted:
+            return
+        self._submitted.add(url)
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, url)
+
+    def join(self) -> List[DownloadResult]:
+        """Wait for every submitted URL, stop the workers and return the results"""
+        if self._thread.is_alive():
+            for _ in range(self.concurrency):
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+        self._thread.join()
+        return self._results
@@ -1,8 +1,206 @@
+from playwright.async_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError, async_playwright
 from playwright.sync_api import sync_playwright
-import os, requests
+import asyncio
+import os
+
+from crawl_state import CrawlState
+from gemini_client import backoff_delay
+from pdf_downloader import PDFDownloader
+
+BASE_URL = "https://www.yarnspirations.com/collections/patterns"
+DOWNLOAD_SELECTOR = "a.download-pattern-btn"
+# Shown past the last listing page instead of the pattern grid
+NO_RESULTS_SELECTOR = ".collection--empty, .no-results, main :text-matches('no (products|patterns|results) found', 'i')"
+PAGE_ATTEMPTS = int(os.getenv('CRAWL_PAGE_ATTEMPTS', '3'))
+PAGE_RETRY_BACKOFF = 2.0
+# Only the HTML and scripts that render the pattern grid are needed
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+
+def start_downloader(state):
+    # PDFs download concurrently in the background while the pages are walked,
+    # each result recorded as it lands so an interrupted run loses nothing
+    downloader = PDFDownloader("scraped_patterns",
+                               concurrency=int(os.getenv('DOWNLOAD_CONCURRENCY', '16')),
+                               per_host=int(os.getenv('DOWNLOAD_PER_HOST', '8')),
+                               on_result=state.record_result)
+    downloader.start()
+    # Earlier failures whose backoff has elapsed and links an interrupted run
+    # never fetched go first; an incremental crawl may not revisit their pages
+    retries = state.due_retries()
+    pending = state.pending()
+    for url in retries + pending:
+        downloader.submit(url)
+    if retries or pending:
+        print(f"🔁 Retrying {len(retries)} failed and {len(pending)} unfinished downloads")
+    return downloader
+
+def finish_downloads(downloader, state):
+    results = downloader.join()
+    failed = sum(result.status == 'failed' for result in results)
+    saved = sum(result.status in ('saved', 'resumed') for result in results)
+    print(f"🎉 All downloads complete! {saved} saved, {len(results) - saved - failed} unchanged, "
+          f"{failed} failed and queued for retry")
+    print(f"📊 Crawl state: {state.stats()}")
+
+def queue_page(downloader, state, page_number, url, hrefs):
+    """Submit a listing page's undownloaded links; returns how many were new"""
+    new, pending = state.record_page(page_number, url, hrefs)
+    for href in new + pending:
+        downloader.submit(href)
+    print(f"📄 Page {page_number}: {len(hrefs)} patterns, {len(new)} new, queued {len(new) + len(pending)} PDFs")
+    return len(new)
+
+def listing_url(page_number):
+    return BASE_URL if page_number == 1 else f"{BASE_URL}?page={page_number}"
+
+async def block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+class PageCursor:
+    """Hands listing page numbers to crawl workers until the last page is known.
+
+    Pages in `revisit` are handed out once the walk has stopped, skipping
+    any the walk itself already covered.
+    """
+
+    def __init__(self, max_pages=None, revisit=()):
+        self.next_page = 1
+        self.last_page = max_pages
+        self.revisit = [page for page in sorted(revisit) if max_pages is None or page <= max_pages]
+
+    def take(self):
+        if self.last_page is None or self.next_page <= self.last_page:
+            page_number = self.next_page
+            self.next_page += 1
+            return page_number
+        while self.revisit:
+            page_number = self.revisit.pop(0)
+            if page_number >= self.next_page:
+                return page_number
+        return None
+
+    def stop_after(self, page_number):
+        """Lower the last page to hand out; True if this moved it"""
+        if self.last_page is None or page_number < self.last_page:
+            self.last_page = page_number
+            return True
+        return False
+
+class PageLoadError(Exception):
+    """A listing page that did not load or render; not the end of the catalogue"""
+
+async def collect_hrefs(page, url, timeout=15_000):
+    """PDF links on one listing page, waiting for the grid instead of sleeping.
+
+    Returns [] only when the page loaded and shows no patterns (404 or the
+    "no results" marker); anything else that yields no grid raises.
+    """
+    response = await page.goto(url, wait_until="domcontentloaded", timeout=90_000)
+    if response is not None and response.status == 404:
+        return []
+    if response is not None and response.status >= 400:
+        raise PageLoadError(f"HTTP {response.status}")
+    try:
+        await page.wait_for_selector(DOWNLOAD_SELECTOR, state="attached", timeout=timeout)
+    except PlaywrightTimeoutError:
+        # The grid may only render once scrolled into view
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        try:
+            await page.wait_for_selector(DOWNLOAD_SELECTOR, state="attached", timeout=timeout // 3)
+        except PlaywrightTimeoutError:
+            if await page.locator(NO_RESULTS_SELECTOR).count():
+                return []
+            raise PageLoadError("pattern grid did not render")
+    hrefs = await page.locator(DOWNLOAD_SELECTOR).evaluate_all("els => els.map(el => el.getAttribute('href'))")
+    return [href for href in hrefs if href]
+
+async def load_listing(page, url, attempts=PAGE_ATTEMPTS):
+    """collect_hrefs with retries; None if the page keeps failing"""
+    for attempt in range(attempts):
+        try:
+            return await collect_hrefs(page, url)
+        except (PlaywrightError, PageLoadError) as e:
+            print(f"⚠️ Attempt {attempt + 1} failed for {url}: {e}")
+            if attempt < attempts - 1:
+                await asyncio.sleep(backoff_delay(attempt, PAGE_RETRY_BACKOFF))
+    return None
+
+async def crawl_worker(context, cursor, downloader, state, incremental=False):
+    page = await context.new_page()
+    while (page_number := cursor.take()) is not None:
+        url = listing_url(page_number)
+        hrefs = await load_listing(page, url)
+        if hrefs is None:
+            # The next crawl revisits it, incremental or not
+            print(f"❌ Skipping page {page_number} after {PAGE_ATTEMPTS} attempts.")
+            state.record_page_failure(page_number, url)
+            continue
+        if not hrefs:
+            print(f"🏁 Page {page_number} has no patterns—crawl complete.")
+            # Workers overshoot the end concurrently; the first empty page is the end
+            if cursor.stop_after(page_number - 1):
+                state.record_end(page_number)
+            continue
+        new = queue_page(downloader, state, page_number, url, hrefs)
+        # Newest patterns are listed first, so older pages hold nothing new either
+        if incremental and not new:
+            print(f"⏹️ Page {page_number} has only known patterns—incremental crawl complete.")
+            cursor.stop_after(page_number)
+    await page.close()
+
+def plan_crawl(state, max_pages=None, incremental=True):
+    """Cursor for the next walk, and whether it may stop at known patterns.
+
+    Stopping early is only safe once a full pass has reached the end with
+    no gaps; before that, a walk cut short would leave later pages
+    undiscovered. An incremental walk also revisits skipped pages.
+    """
+    if incremental and not state.full_pass_complete():
+        print("🧭 No complete pass over the catalogue yet—walking every page.")
+        return PageCursor(max_pages), False
+    revisit = state.pages_to_revisit() if incremental else ()
+    if revisit:
+        print(f"🔁 Revisiting {len(revisit)} skipped pages")
+    return PageCursor(max_pages, revisit), incremental
+
+async def crawl_yarnspirations(max_pages=None, contexts=4, incremental=True):
+    """Headless crawl of the listing pages, `contexts` pages at a time.
+
+    Each worker has its own browser context, so cookies and popup state are
+    not shared. Links are read from the DOM without clicking, so promo
+    overlays never need dismissing. An incremental crawl stops at the first
+    page whose patterns are all in the crawl state (see plan_crawl).
+    """
+    os.makedirs("scraped_patterns", exist_ok=True)
+    state = CrawlState()
+    downloader = start_downloader(state)
+    cursor, incremental = plan_crawl(state, max_pages, incremental)
+
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            browser_contexts = []
+            for _ in range(contexts):
+                context = await browser.new_context()
+                await context.route("**/*", block_heavy_resources)
+                browser_contexts.append(context)
+            await asyncio.gather(*(
+                crawl_worker(context, cursor, downloader, state, incremental) for context in browser_contexts
+            ))
+            await browser.close()
+    finally:
+        # Even a crashed crawl lets queued downloads finish and records them
+        finish_downloads(downloader, state)
+        state.close()
 
 def scrape_yarnspirations(max_pages=None):
+    """Interactive, headed walk with popup handling, for debugging the site"""
     os.makedirs("scraped_patterns", exist_ok=True)
+    state = CrawlState()
+    downloader = start_downloader(state)
 
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=False)    # you can set headless=True later
@@ -85,34 +283,10 @@ def scrape_yarnspirations(max_pages=None):
                 btns = page.locator("a.download-pattern-btn")  # will be zero
 
             # ────────────────────────────────────────────────────────────────────────────
-            # DOWNLOAD EACH PDF VIA HTTP GET
+            # QUEUE EACH PDF FOR THE BACKGROUND DOWNLOADER
             # ────────────────────────────────────────────────────────────────────────────
-            for idx in range(btns.count()):
-                href = btns.nth(idx).get_attribute("href")
-                if not href:
-                    continue
-                filename = href.split("/")[-1].split("?")[0]
-                save_path = os.path.join("scraped_patterns", filename)
-                if os.path.exists(save_path):
-                    print(f"🔁 {filename} already exists, skipping")
-                    continue
-
-                retries = 3
-                for attempt in range(retries):
-                    try:
-                        resp = requests.get(href, stream=True, timeout=30)  # Increased timeout to 30 seconds
-                        resp.raise_for_status()
-                        with open(save_path, "wb") as f:
-                            for chunk in resp.iter_content(1024):
-                                f.write(chunk)
-                        print(f"✅ Saved {filename}")
-                        break  # Exit retry loop on success
-                    except requests.exceptions.RequestException as e:
-                        print(f"⚠️ Attempt {attempt + 1} failed for {filename}: {e}")
-                        if attempt == retries - 1:
-                            print(f"❌ Skipping {filename} after {retries} attempts.")
-                            with open("failed_downloads.log", "a") as log_file:
-                                log_file.write(f"{href}\n")
+            hrefs = [href for href in btns.evaluate_all("els => els.map(el => el.getAttribute('href'))") if href]
+            queue_page(downloader, state, page_index, url, hrefs)
 
             # ────────────────────────────────────────────────────────────────────────────
             # HANDLE PAGINATION (NEXT PAGE)
@@ -134,10 +308,16 @@ def scrape_yarnspirations(max_pages=None):
             url = next_href
             page_index += 1
 
-        print("🎉 All downloads complete!")
-
         browser.close()
 
+    finish_downloads(downloader, state)
+    state.close()
+
 if __name__ == "__main__":
-    scrape_yarnspirations(max_pages=200)  # or None to go until the very last page
-    print("🎉 Done!")
\ No newline at end of file
+    if os.getenv('SCRAPER_MODE') == 'interactive':
+        scrape_yarnspirations(max_pages=200)  # or None to go until the very last page
+    else:
+        # CRAWL_FULL=1 walks every page, e.g. to refresh last_seen for the whole catalogue
+        asyncio.run(crawl_yarnspirations(max_pages=200, contexts=int(os.getenv('CRAWL_CONTEXTS', '4')),
+                                         incremental=os.getenv('CRAWL_FULL') != '1'))
+    print("🎉 Done!")
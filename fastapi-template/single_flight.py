@@ -0,0 +1,32 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one upstream call.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it runs await the same task and receive the same result or
+    exception. Each caller awaits through asyncio.shield, so a disconnecting
+    client does not cancel the work the others are waiting on. Coalescing is
+    per process; the pattern cache covers repeats across workers.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable]):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._in_flight), "calls": self.calls, "coalesced": self.coalesced}
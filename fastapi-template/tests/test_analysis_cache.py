@@ -0,0 +1,87 @@
+from analysis_cache import AnalysisCache
+
+
+def test_lru_eviction_and_counters():
+    cache = AnalysisCache(max_entries=2)
+    cache.put("opencv", "a", "first")
+    cache.put("opencv", "b", "second")
+    assert cache.get("opencv", "a") == "first"
+    cache.put("opencv", "c", "third")
+
+    assert cache.get("opencv", "b") is None
+    assert cache.get("opencv", "c") == "third"
+    assert cache.get("gemini_vision", "a") is None
+    assert cache.stats() == {
+        "entries": 2,
+        "persistent": False,
+        "gemini_vision": {"hits": 0, "misses": 1},
+        "opencv": {"hits": 2, "misses": 1},
+    }
+
+
+def test_sqlite_backing_survives_restart(tmp_path):
+    db_path = str(tmp_path / "analysis.db")
+    cache = AnalysisCache(db_path=db_path)
+    cache.put("gemini_vision", "abc", {"item_type": "scarf", "description": "A scarf"})
+
+    restarted = AnalysisCache(db_path=db_path)
+    assert restarted.get("gemini_vision", "abc") == {"item_type": "scarf", "description": "A scarf"}
+    assert restarted.stats()["gemini_vision"] == {"hits": 1, "misses": 0}
+
+
+def test_disk_entries_are_bounded(tmp_path):
+    cache = AnalysisCache(max_entries=1, db_path=str(tmp_path / "analysis.db"), max_disk_entries=2)
+    for digest in "abc":
+        cache.put("opencv", digest, digest.upper())
+
+    assert cache.get("opencv", "a") is None
+    assert cache.get("opencv", "b") == "B"
+
+
+def test_disk_hits_do_not_write(tmp_path):
+    db_path = str(tmp_path / "analysis.db")
+    writer = AnalysisCache(db_path=db_path)
+    writer.put("opencv", "a", "A")
+    writer.put("opencv", "b", "B")
+
+    cache = AnalysisCache(max_entries=0, db_path=db_path, max_disk_entries=2)
+    statements = []
+    cache._db.set_trace_callback(statements.append)
+    for _ in range(10):
+        assert cache.get("opencv", "a") == "A"
+    assert not [sql for sql in statements if not sql.lstrip().upper().startswith("SELECT")]
+
+    # The buffered hits still count when the next put evicts
+    cache.put("opencv", "c", "C")
+    assert cache.get("opencv", "b") is None
+    assert cache.get("opencv", "a") == "A"
+
+
+def test_forked_worker_reopens_sqlite(tmp_path):
+    import os
+    import pytest
+
+    if not hasattr(os, "fork"):
+        pytest.skip("needs fork")
+    cache = AnalysisCache(db_path=str(tmp_path / "analysis.db"))
+    cache.put("opencv", "parent", "P")
+
+    pid = os.fork()
+    if pid == 0:
+        ok = cache._db is not None and cache.get("opencv", "parent") == "P"
+        cache.put("opencv", "child", "C")
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert AnalysisCache(db_path=str(tmp_path / "analysis.db")).get("opencv", "child") == "C"
+
+
+def test_variant_separates_persisted_settings(tmp_path):
+    db_path = str(tmp_path / "analysis.db")
+    AnalysisCache(db_path=db_path).put("opencv", "abc", "at 1024", variant="v1-1024")
+
+    restarted = AnalysisCache(db_path=db_path)
+    assert restarted.get("opencv", "abc", variant="v1-512") is None
+    assert restarted.get("opencv", "abc", variant="v2-1024") is None
+    assert restarted.get("opencv", "abc", variant="v1-1024") == "at 1024"
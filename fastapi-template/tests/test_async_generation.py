@@ -0,0 +1,110 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+import main
+import pattern_generator
+from pattern_generator import CrochetPatternGenerator
+
+MODEL_LATENCY = 0.05
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Local stand-in for the Gemini client with a fixed round-trip latency"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+
+    def generate_content(self, prompt):
+        time.sleep(MODEL_LATENCY)
+        return StubResponse("MATERIALS:\n   • Yarn\nGAUGE: 4 in\nA simple beginner scarf")
+
+    async def generate_content_async(self, prompt):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(MODEL_LATENCY)
+        self.in_flight -= 1
+        return StubResponse("MATERIALS:\n   • Yarn\nGAUGE: 4 in\nA simple beginner scarf")
+
+
+@pytest.fixture
+def generator(tmp_path, monkeypatch):
+    source = tmp_path / "training_data.jsonl"
+    source.write_text(json.dumps({"output": "A winter scarf", "source_file": "a.txt"}) + "\n")
+    monkeypatch.setattr(pattern_generator, "TRAINING_FILE", source)
+    monkeypatch.setattr(pattern_generator, "STORE_FILE", tmp_path / "training_store.bin")
+    return CrochetPatternGenerator(None, model=StubModel(), max_concurrency=8)
+
+
+async def run_load(requests, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+    # Distinct descriptions so the pattern cache does not absorb the load
+    run = time.perf_counter_ns()
+
+    async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+        async def one(i):
+            payload = {"description": f"a simple winter scarf {run} {i}", "style": "standard"}
+            async with limit:
+                response = await client.post("/generate-pattern-from-text", json=payload)
+                assert response.json()["success"]
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return requests / (time.perf_counter() - start)
+
+
+def test_throughput_scales_with_concurrency(generator, monkeypatch):
+    monkeypatch.setattr(main, "pattern_generator", generator)
+
+    serial = asyncio.run(run_load(16, concurrency=1))
+    concurrent = asyncio.run(run_load(16, concurrency=16))
+
+    assert concurrent > serial * 4
+    # The generator's semaphore caps in-flight model calls
+    assert generator.model.peak == 8
+
+
+def test_image_analysis_overlaps_gemini_vision(generator, monkeypatch):
+    import cv2
+    import numpy as np
+
+    async def slow_vision(image, digest=None):
+        await asyncio.sleep(0.2)
+        return {"item_type": "scarf", "description": "A striped scarf"}
+
+    def slow_analysis(image, digest=None, original_size=None):
+        time.sleep(0.2)
+        return "This appears to be a beginner-level scarf"
+
+    monkeypatch.setattr(main, "pattern_generator", generator)
+    monkeypatch.setattr(main, "analyze_image_with_gemini_async", slow_vision)
+    monkeypatch.setattr(main, "analyze_image_content", slow_analysis)
+    png = cv2.imencode(".png", np.zeros((64, 64, 3), dtype=np.uint8))[1].tobytes()
+
+    async def post(include):
+        async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+            response = await client.post(
+                "/generate-pattern",
+                files={"file": ("scarf.png", png, "image/png")},
+                data={"include_image_analysis": str(include).lower()},
+            )
+            return response.json()
+
+    body = asyncio.run(post(True))
+    timings = body["timings"]
+    assert body["image_analysis"].startswith("This appears")
+    assert set(timings) == {"decode", "gemini_vision", "image_analysis", "generation", "total"}
+    assert timings["total"] < timings["gemini_vision"] + timings["image_analysis"]
+
+    body = asyncio.run(post(False))
+    assert body["image_analysis"] is None
+    assert "image_analysis" not in body["timings"]
@@ -0,0 +1,124 @@
+import json
+import pickle
+import zlib
+
+import faiss
+import numpy as np
+
+from build_vector_db import (
+    EMBEDDING_DIM, benchmark_indexes, build_vector_db, configure_search, create_index, print_benchmark, similarity_scores
+)
+
+
+class FakeEncoder:
+    """Deterministic bag-of-words embeddings standing in for MiniLM"""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        self.encoded.extend(texts)
+        vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % EMBEDDING_DIM] += 1
+        return vectors * 3
+
+
+def example(name, text):
+    pattern = {"title": name, "skill_level": "EASY", "materials": ["yarn"], "instructions": {"Row 1": text}}
+    return {"input": f"Generate a crochet pattern for: {name}", "output": f"```json\n{json.dumps(pattern)}\n```",
+            "source_file": f"{name}_processed.txt"}
+
+
+def write_lines(path, examples, mode='w'):
+    with open(path, mode, encoding='utf-8') as f:
+        for item in examples:
+            f.write(json.dumps(item) + '\n')
+
+
+def test_build_then_append_only_new_sources(tmp_path):
+    training = tmp_path / "training_data.jsonl"
+    index_path, metadata_path = tmp_path / "vectors.faiss", tmp_path / "metadata.pkl"
+    write_lines(training, [example("scarf", "striped winter scarf"), example("hat", "ribbed beanie hat")])
+
+    encoder = FakeEncoder()
+    assert build_vector_db(training, index_path, metadata_path, encoder=encoder, batch_size=1) == 2
+
+    write_lines(training, [example("blanket", "granny square blanket"), example("scarf", "duplicate")], mode='a')
+    encoder = FakeEncoder()
+    assert build_vector_db(training, index_path, metadata_path, encoder=encoder) == 1
+    assert len(encoder.encoded) == 1
+
+    index = faiss.read_index(str(index_path))
+    with open(metadata_path, 'rb') as f:
+        metadata = pickle.load(f)
+    assert index.ntotal == 3
+    assert [entry['title'] for entry in metadata] == ["scarf", "hat", "blanket"]
+
+    query = encoder.encode(["granny square blanket"])
+    faiss.normalize_L2(query)
+    scores, ids = index.search(query, 1)
+    assert ids[0][0] == 2
+    assert scores[0][0] <= 1.0 + 1e-5
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_small_corpus_falls_back_to_flat(tmp_path):
+    training = tmp_path / "training_data.jsonl"
+    index_path, metadata_path = tmp_path / "vectors.faiss", tmp_path / "metadata.pkl"
+
+    write_lines(training, [])
+    assert build_vector_db(training, index_path, metadata_path, encoder=FakeEncoder(), rebuild=True,
+                           index_type='ivf') == 0
+    index = faiss.read_index(str(index_path))
+    assert index.is_trained and index.ntotal == 0
+
+    write_lines(training, [example(f"item{i}", f"pattern number {i}") for i in range(10)])
+    for index_type, pq in [('ivf', False), ('hnsw', True)]:
+        assert build_vector_db(training, index_path, metadata_path, encoder=FakeEncoder(), rebuild=True,
+                               index_type=index_type, pq=pq) == 10
+        index = faiss.read_index(str(index_path))
+        assert isinstance(index, faiss.IndexFlat)
+        assert index.is_trained and index.ntotal == 10
+
+
+def clustered_vectors(n, clusters=50, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, EMBEDDING_DIM)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, EMBEDDING_DIM)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def test_ann_recall_latency_benchmark():
+    vectors = clustered_vectors(4000)
+    queries = clustered_vectors(100, seed=1)
+    rows = benchmark_indexes(vectors, queries, [
+        {'index_type': 'flat', 'pq': False},
+        {'index_type': 'ivf', 'pq': False, 'nprobe': 1},
+        {'index_type': 'ivf', 'pq': False, 'nprobe': 64},
+        {'index_type': 'ivf', 'pq': True, 'pq_m': 16, 'pq_bits': 4, 'nprobe': 64},
+        {'index_type': 'hnsw', 'pq': False, 'ef_search': 8},
+        {'index_type': 'hnsw', 'pq': False, 'ef_search': 128},
+    ], k=10)
+    print()
+    print_benchmark(rows)
+
+    flat, ivf_1, ivf_64, ivf_pq, hnsw_8, hnsw_128 = rows
+    assert flat['recall'] == 1.0
+    assert ivf_1['recall'] < ivf_64['recall'] and ivf_64['recall'] > 0.95
+    assert hnsw_8['recall'] <= hnsw_128['recall'] and hnsw_128['recall'] > 0.9
+    assert ivf_pq['index'] == "IVF102,PQ16x4"
+    assert ivf_pq['bytes'] < flat['bytes'] / 8
+
+
+def test_search_knobs_and_l2_scores():
+    index = configure_search(create_index('ivf', 4000), nprobe=7)
+    assert faiss.extract_index_ivf(index).nprobe == 7
+    index = configure_search(create_index('hnsw', 4000), ef_search=99)
+    assert index.hnsw.efSearch == 99
+
+    pq_index = create_index('hnsw', 4000, pq=True, pq_m=16, pq_bits=4)
+    assert pq_index.metric_type == faiss.METRIC_L2
+    np.testing.assert_allclose(similarity_scores(pq_index, np.array([0.0, 2.0])), [1.0, 0.0])
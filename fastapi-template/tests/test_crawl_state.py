@@ -0,0 +1,70 @@
+import time
+
+from crawl_state import RETRY_BASE, CrawlState
+from pdf_downloader import DownloadResult
+
+
+def test_pages_and_patterns_are_tracked(tmp_path):
+    db_path = str(tmp_path / "crawl_state.db")
+    state = CrawlState(db_path)
+    new, pending = state.record_page(1, "https://shop/patterns", ["https://cdn/a.pdf", "https://cdn/b.pdf"])
+    assert (new, pending) == (["https://cdn/a.pdf", "https://cdn/b.pdf"], [])
+    state.record_result(DownloadResult("https://cdn/a.pdf", "a.pdf", "saved", 10, sha256="abc", size=10))
+    state.record_result(DownloadResult("https://cdn/b.pdf", "b.pdf", "not_modified"))
+    state.close()
+
+    restarted = CrawlState(db_path)
+    new, pending = restarted.record_page(1, "https://shop/patterns",
+                                         ["https://cdn/c.pdf", "https://cdn/a.pdf", "https://cdn/b.pdf"])
+    assert (new, pending) == (["https://cdn/c.pdf"], [])
+    stats = restarted.stats()
+    assert stats["patterns"] == {"downloaded": 2, "pending": 1}
+    assert stats["pages"] == 1
+    row = restarted._db.execute("SELECT content_hash, size FROM patterns WHERE url = 'https://cdn/a.pdf'").fetchone()
+    assert row == ("abc", 10)
+
+
+def test_failures_back_off_then_give_up():
+    state = CrawlState(":memory:", max_failures=3)
+    state.record_page(1, "https://shop/patterns", ["https://cdn/a.pdf"])
+    now = time.time()
+
+    state.record_failure("https://cdn/a.pdf", "503 Service Unavailable")
+    assert state.due_retries(now) == []
+    assert state.due_retries(now + RETRY_BASE + 1) == ["https://cdn/a.pdf"]
+    # Failed links wait for their retry instead of being queued by every page visit
+    assert state.record_page(1, "https://shop/patterns", ["https://cdn/a.pdf"]) == ([], [])
+
+    state.record_failure("https://cdn/a.pdf")
+    assert state.due_retries(now + RETRY_BASE + 1) == []
+    assert state.due_retries(now + 2 * RETRY_BASE + 1) == ["https://cdn/a.pdf"]
+
+    state.record_failure("https://cdn/a.pdf")
+    assert state.due_retries(now + 365 * 24 * 3600) == []
+    assert state.stats()["patterns"] == {"abandoned": 1}
+
+    state.record_download("https://cdn/a.pdf", "abc", 10)
+    assert state.stats()["patterns"] == {"downloaded": 1}
+
+
+def test_full_pass_needs_every_page_up_to_the_end():
+    state = CrawlState(":memory:")
+    for page in (1, 2, 4):
+        state.record_page(page, f"https://shop/patterns?page={page}", [f"https://cdn/{page}.pdf"])
+    assert not state.full_pass_complete()
+
+    state.record_page_failure(6, "https://shop/patterns?page=6", "Timeout")
+    state.record_end(7)
+    assert state.pages_to_revisit() == [3, 5, 6]
+    assert not state.full_pass_complete()
+
+    for page in (3, 5, 6):
+        state.record_page(page, f"https://shop/patterns?page={page}", [f"https://cdn/{page}.pdf"])
+    assert state.pages_to_revisit() == []
+    assert state.full_pass_complete()
+
+    # Later skips are revisited without undoing the completed pass
+    state.record_page_failure(2, "https://shop/patterns?page=2")
+    assert state.pages_to_revisit() == [2]
+    assert state.full_pass_complete()
+    assert state.stats()["last_page"] == 6
@@ -0,0 +1,88 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from embedding_service import EmbeddingService, normalize_text
+
+
+class FakeEncoder:
+    """Forward pass with a fixed overhead, like a transformer on small batches"""
+
+    def __init__(self, overhead=0.02):
+        self.overhead = overhead
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def encode(self, texts, **kwargs):
+        with self.lock:
+            self.batches.append(list(texts))
+        time.sleep(self.overhead)
+        return np.array([[len(t), sum(map(ord, t)) % 97, 1.0] for t in texts], dtype=np.float32)
+
+
+def test_normalized_text_shares_cache_entry():
+    encoder = FakeEncoder(overhead=0)
+    service = EmbeddingService(encoder)
+
+    first = service.encode("Simple  Winter Scarf")
+    second = service.encode(" simple winter scarf\n")
+
+    assert normalize_text("Simple  Winter Scarf") == "simple winter scarf"
+    np.testing.assert_array_equal(first, second)
+    assert encoder.batches == [["simple winter scarf"]]
+    assert service.stats()["hits"] == 1
+
+
+def test_lru_is_bounded():
+    service = EmbeddingService(FakeEncoder(overhead=0), cache_size=2)
+    for text in ("hat", "scarf", "blanket"):
+        service.encode(text)
+    service.encode("hat")
+
+    assert service.stats()["cached"] == 2
+    assert service.stats()["misses"] == 4
+
+
+def test_encoder_errors_reach_every_caller():
+    class BrokenEncoder:
+        def encode(self, texts, **kwargs):
+            raise RuntimeError("model unavailable")
+
+    service = EmbeddingService(BrokenEncoder())
+    future = service.submit("amigurumi")
+    try:
+        future.result(timeout=1)
+    except RuntimeError as e:
+        assert "model unavailable" in str(e)
+    else:
+        raise AssertionError("expected the encoder error")
+
+
+def concurrent_throughput(max_batch, requests=64):
+    encoder = FakeEncoder()
+    service = EmbeddingService(encoder, max_batch=max_batch, max_wait=0.005)
+    texts = [f"pattern request {i}" for i in range(requests)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=requests) as pool:
+        vectors = list(pool.map(service.encode, texts))
+    elapsed = time.perf_counter() - start
+
+    # Every caller gets the vector for its own text, not a neighbour's in the batch
+    for text, vector in zip(texts, vectors):
+        assert vector[0] == len(normalize_text(text))
+        assert vector[1] == sum(map(ord, normalize_text(text))) % 97
+    return requests / elapsed, len(encoder.batches)
+
+
+def test_throughput_scales_with_batch_size():
+    unbatched, unbatched_passes = concurrent_throughput(max_batch=1)
+    batched, batched_passes = concurrent_throughput(max_batch=32)
+
+    print(f"\nmax_batch=1: {unbatched:.0f} req/s over {unbatched_passes} passes; "
+          f"max_batch=32: {batched:.0f} req/s over {batched_passes} passes")
+    assert unbatched_passes == 64
+    assert batched_passes <= 8
+    assert batched > 4 * unbatched
@@ -0,0 +1,160 @@
+import json
+import time
+import os
+
+import fitz
+import numpy as np
+
+from extract_instructions import MANIFEST_NAME, PDFProcessor
+
+
+def make_pdf(path, text):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), text)
+    samples = np.random.default_rng(0).integers(0, 255, (80, 120, 3), dtype=np.uint8)
+    pixmap = fitz.Pixmap(fitz.csRGB, 120, 80, samples.tobytes(), False)
+    page.insert_image(fitz.Rect(72, 100, 312, 260), pixmap=pixmap)
+    doc.save(str(path))
+    doc.close()
+
+
+def read_manifest(output_dir):
+    with open(output_dir / MANIFEST_NAME) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_parallel_batch_resumes_and_skips_unchanged(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    for i in range(4):
+        make_pdf(pdf_dir / f"pattern_{i}.pdf", f"Round {i}: 6 sc in ring")
+    output_dir = tmp_path / "processed"
+    processor = PDFProcessor(use_vision=False)
+
+    counts = processor.process_pdf_batch(pdf_dir, output_dir, max_files=10, workers=2)
+    assert counts == {'processed': 4, 'failed': 0, 'skipped': 0}
+    summary = (output_dir / "pattern_2_processed.txt").read_text()
+    assert "Round 2: 6 sc in ring" in summary
+    assert "Images found: 1" in summary
+
+    # Unchanged files are skipped; a touched but identical file matches by hash
+    os.utime(pdf_dir / "pattern_0.pdf", (1, 1))
+    assert processor.process_pdf_batch(pdf_dir, output_dir, max_files=10, workers=2) == \
+        {'processed': 0, 'failed': 0, 'skipped': 4}
+
+    make_pdf(pdf_dir / "pattern_1.pdf", "Round 1: 8 sc in ring")
+    (pdf_dir / "broken.pdf").write_bytes(b"not a pdf")
+    counts = processor.process_pdf_batch(pdf_dir, output_dir, max_files=10, workers=2)
+    assert counts == {'processed': 1, 'failed': 1, 'skipped': 3}
+    assert "8 sc" in (output_dir / "pattern_1_processed.txt").read_text()
+
+    records = read_manifest(output_dir)
+    assert [r['file'] for r in records if r['status'] == 'error'] == ["broken.pdf"]
+    assert not list(output_dir.glob("*.tmp"))
+
+
+def test_summaries_without_manifest_are_adopted(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    output_dir = tmp_path / "processed"
+    output_dir.mkdir()
+    for name in ["scarf", "hat", "bag"]:
+        make_pdf(pdf_dir / f"{name}.pdf", f"{name}: 6 sc in ring")
+        (output_dir / f"{name}_processed.txt").write_text(f"PDF: {name}.pdf\nolder run\n")
+    # The bag PDF was re-downloaded after its summary was written
+    summary_time = (output_dir / "bag_processed.txt").stat().st_mtime
+    os.utime(pdf_dir / "bag.pdf", (summary_time + 60, summary_time + 60))
+
+    processor = PDFProcessor(use_vision=False)
+    assert processor.process_pdf_batch(pdf_dir, output_dir, max_files=10) == \
+        {'processed': 1, 'failed': 0, 'skipped': 2}
+    assert (output_dir / "scarf_processed.txt").read_text().endswith("older run\n")
+    assert "bag: 6 sc" in (output_dir / "bag_processed.txt").read_text()
+    assert sorted(r['file'] for r in read_manifest(output_dir)) == ["bag.pdf", "hat.pdf", "scarf.pdf"]
+
+    # Adopted entries carry a hash, so a touched but unchanged PDF is still skipped
+    os.utime(pdf_dir / "hat.pdf", (summary_time + 120, summary_time + 120))
+    assert processor.process_pdf_batch(pdf_dir, output_dir, max_files=10) == \
+        {'processed': 0, 'failed': 0, 'skipped': 3}
+
+
+def test_interrupted_manifest_line_is_ignored(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    make_pdf(pdf_dir / "hat.pdf", "Round 1: 6 sc")
+    output_dir = tmp_path / "processed"
+    processor = PDFProcessor(use_vision=False)
+    processor.process_pdf_batch(pdf_dir, output_dir, workers=1)
+
+    with open(output_dir / MANIFEST_NAME, 'a') as f:
+        f.write('{"file": "hat.pdf", "sta')
+    assert processor.process_pdf_batch(pdf_dir, output_dir, workers=1)['skipped'] == 1
+
+
+def legacy_extract(processor, pdf_path):
+    """The two-pass path this replaced: pdfplumber text, then PNG round-trips"""
+    import io
+
+    import pdfplumber
+    from PIL import Image
+
+    results = {'text': '', 'images': []}
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            if page.extract_text():
+                results['text'] += page.extract_text() + '\n'
+    doc = fitz.open(pdf_path)
+    for page_num in range(len(doc)):
+        for img in doc.load_page(page_num).get_images():
+            pix = fitz.Pixmap(doc, img[0])
+            if pix.n - pix.alpha < 4:
+                img_array = np.array(Image.open(io.BytesIO(pix.tobytes("png"))))
+                if img_array.shape[0] < 50 or img_array.shape[1] < 50:
+                    continue
+                results['images'].append(processor._process_image(img_array))
+    doc.close()
+    return results
+
+
+def make_catalogue(path, pages, side):
+    """Pattern booklet: text, one photo per page, a repeated logo and a tiny icon"""
+    rng = np.random.default_rng(1)
+    doc = fitz.open()
+    logo = fitz.Pixmap(fitz.csRGB, 200, 60, rng.integers(0, 255, (60, 200, 3), dtype=np.uint8).tobytes(), False)
+    icon = fitz.Pixmap(fitz.csGRAY, 16, 16, rng.integers(0, 255, (16, 16), dtype=np.uint8).tobytes(), False)
+    for i in range(pages):
+        page = doc.new_page()
+        for line in range(20):
+            page.insert_text((72, 72 + line * 14), f"Round {line + 1}: sc in next {i} sts, 2 sc in next st")
+        photo = rng.integers(0, 255, (side, side, 3), dtype=np.uint8)
+        page.insert_image(fitz.Rect(72, 380, 372, 680), pixmap=fitz.Pixmap(fitz.csRGB, side, side, photo.tobytes(), False))
+        page.insert_image(fitz.Rect(400, 20, 560, 68), pixmap=logo)
+        page.insert_image(fitz.Rect(20, 20, 36, 36), pixmap=icon)
+    doc.save(str(path))
+    doc.close()
+
+
+def test_single_pass_matches_legacy_and_benchmark(tmp_path):
+    processor = PDFProcessor(use_vision=False)
+    rows = []
+    for pages, side in [(2, 400), (8, 800), (16, 1200)]:
+        path = tmp_path / f"catalogue_{pages}.pdf"
+        make_catalogue(path, pages, side)
+
+        start = time.perf_counter()
+        legacy = legacy_extract(processor, path)
+        legacy_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        single = processor.extract_images_and_text(path)
+        single_seconds = time.perf_counter() - start
+        rows.append((pages, side, legacy_seconds, single_seconds))
+
+        assert len(single['images']) == len(legacy['images']) == 2 * pages
+        assert all(np.array_equal(a, b) for a, b in zip(single['images'], legacy['images']))
+        assert "Round 20: sc in next" in single['text']
+
+    print("\npages  photo  legacy   single-pass")
+    for pages, side, legacy_seconds, single_seconds in rows:
+        print(f"{pages:5}  {side:5}  {legacy_seconds * 1000:6.0f}ms  {single_seconds * 1000:6.0f}ms")
+    assert rows[-1][3] < rows[-1][2] / 2
@@ -0,0 +1,121 @@
+import asyncio
+
+import google.ai.generativelanguage as glm
+import pytest
+from google.api_core import exceptions
+
+import gemini_client
+from gemini_client import GeminiModel
+
+
+def text_response(text):
+    return glm.GenerateContentResponse(
+        candidates=[glm.Candidate(content=glm.Content(parts=[glm.Part(text=text)]))]
+    )
+
+
+class FlakyClient:
+    """Gapic client stand-in that fails with the given errors before answering"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    def generate_content(self, request, timeout=None, retry=None):
+        self.calls.append(timeout)
+        if self.errors:
+            raise self.errors.pop(0)
+        return text_response("pattern")
+
+
+class AsyncFlakyClient(FlakyClient):
+    async def generate_content(self, request, timeout=None, retry=None):
+        return super().generate_content(request, timeout, retry)
+
+
+@pytest.fixture
+def fresh_clients(monkeypatch):
+    configured = []
+    monkeypatch.setattr(gemini_client, "_models", {})
+    monkeypatch.setattr(gemini_client, "_configured_key", None)
+    monkeypatch.setattr(gemini_client.genai, "configure", lambda api_key: configured.append(api_key))
+    return configured
+
+
+def test_model_and_configuration_are_shared(fresh_clients):
+    first = gemini_client.get_model(api_key="key")
+    second = gemini_client.get_model(api_key="key")
+
+    assert first is second
+    assert fresh_clients == ["key"]
+    assert gemini_client.get_model(api_key="other") is not first
+    assert fresh_clients == ["key", "other"]
+
+
+def test_retries_rate_limits_and_server_errors(monkeypatch):
+    client = FlakyClient([exceptions.ResourceExhausted("quota"), exceptions.ServiceUnavailable("busy")])
+    monkeypatch.setattr(gemini_client.genai_client, "get_default_generative_client", lambda: client)
+
+    model = GeminiModel(timeout=5, max_retries=3, backoff_base=0)
+    assert model.generate_content("Make a hat").text == "pattern"
+    # Every attempt carries the deadline
+    assert client.calls == [5, 5, 5]
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    client = FlakyClient([exceptions.InvalidArgument("bad prompt")])
+    monkeypatch.setattr(gemini_client.genai_client, "get_default_generative_client", lambda: client)
+
+    with pytest.raises(exceptions.InvalidArgument):
+        GeminiModel(max_retries=3, backoff_base=0).generate_content("Make a hat")
+    assert len(client.calls) == 1
+
+
+def test_async_gives_up_after_max_retries(monkeypatch):
+    client = AsyncFlakyClient([exceptions.InternalServerError("boom")] * 3)
+    monkeypatch.setattr(gemini_client.genai_client, "get_default_generative_async_client", lambda: client)
+
+    with pytest.raises(exceptions.InternalServerError):
+        asyncio.run(GeminiModel(max_retries=2, backoff_base=0).generate_content_async("Make a hat"))
+    assert len(client.calls) == 3
+
+    client = AsyncFlakyClient([exceptions.GatewayTimeout("slow")])
+    monkeypatch.setattr(gemini_client.genai_client, "get_default_generative_async_client", lambda: client)
+    response = asyncio.run(GeminiModel(max_retries=2, backoff_base=0).generate_content_async("Make a hat"))
+    assert response.text == "pattern"
+
+
+class AsyncStreamingClient:
+    def __init__(self, connect_errors=(), fail_mid_stream=False):
+        self.connect_errors = list(connect_errors)
+        self.fail_mid_stream = fail_mid_stream
+        self.calls = 0
+
+    async def stream_generate_content(self, request, timeout=None, retry=None):
+        self.calls += 1
+        if self.connect_errors:
+            raise self.connect_errors.pop(0)
+
+        async def chunks():
+            yield text_response("Row 1: ch 20")
+            if self.fail_mid_stream:
+                raise exceptions.ServiceUnavailable("dropped")
+            yield text_response("\nRow 2: sc across")
+        return chunks()
+
+
+def test_stream_retries_only_before_first_chunk(monkeypatch):
+    async def collect(model):
+        return [text async for text in model.stream_content_async("Make a hat")]
+
+    client = AsyncStreamingClient(connect_errors=[exceptions.TooManyRequests("slow down")])
+    monkeypatch.setattr(gemini_client.genai_client, "get_default_generative_async_client", lambda: client)
+    assert asyncio.run(collect(GeminiModel(backoff_base=0))) == ["Row 1: ch 20", "\nRow 2: sc across"]
+    assert client.calls == 2
+
+    # Retrying after text went out would repeat it, so mid-stream errors surface
+    client = AsyncStreamingClient(fail_mid_stream=True)
+    monkeypatch.setattr(gemini_client.genai_client, "get_default_generative_async_client", lambda: client)
+    with pytest.raises(exceptions.ServiceUnavailable):
+        asyncio.run(collect(GeminiModel(backoff_base=0)))
+    assert client.calls == 1
@@ -0,0 +1,123 @@
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+import pytest
+
+from skimage.feature import local_binary_pattern
+
+from image_analysis import (
+    analyze_images_batch, compute_image_features, decode_image, describe_image_features,
+    encode_for_gemini, image_size, uniform_lbp_batch
+)
+
+
+def stitch_photo(width, height):
+    """JPEG of a 40-stitch-wide grid of rings, drawn at the target resolution"""
+    image = np.full((height, width, 3), (40, 60, 200), np.uint8)
+    step = width // 40
+    for y in range(step // 2, height, step):
+        for x in range(step // 2, width, step):
+            cv2.circle(image, (x, y), step // 3, (200, 180, 50), max(1, step // 10), cv2.LINE_AA)
+    return cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def analyze(data, max_side):
+    image = decode_image(data, min_side=max_side and 1536)
+    return compute_image_features(image, max_side, image_size(data))
+
+
+def test_downscaled_features_match_full_resolution():
+    data = stitch_photo(2000, 1500)
+    full = analyze(data, 0)
+    budget = analyze(data, 1024)
+
+    assert budget["width"] == 2000 and budget["height"] == 1500
+    assert budget["dominant_hues"][0] == full["dominant_hues"][0]
+    assert budget["edge_density"] == pytest.approx(full["edge_density"], rel=0.1)
+    assert budget["texture_variance"] == pytest.approx(full["texture_variance"], rel=0.15)
+    assert budget["circularity"] == pytest.approx(full["circularity"], abs=0.05)
+    assert describe_image_features(budget) == describe_image_features(full)
+
+
+def test_exif_rotated_photo_keeps_its_displayed_shape():
+    import io
+    from PIL import Image
+
+    # A landscape sensor image the camera marked as rotated 90 degrees (Orientation=6)
+    stored = Image.open(io.BytesIO(stitch_photo(3000, 1000)))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    stored.save(buffer, format="JPEG", exif=exif)
+    data = buffer.getvalue()
+
+    assert image_size(data) == (1000, 3000)
+    reduced = decode_image(data, min_side=1024)
+    assert reduced.shape[0] > reduced.shape[1]
+    features = compute_image_features(reduced, 1024, image_size(data))
+    assert features["aspect_ratio"] == pytest.approx(1 / 3)
+    assert "tall narrow" in describe_image_features(features)
+
+
+def test_gemini_image_is_budgeted_jpeg():
+    image = decode_image(stitch_photo(4000, 3000))
+    blob = encode_for_gemini(image, max_side=1536, quality=85)
+
+    assert blob["mime_type"] == "image/jpeg"
+    assert max(image_size(blob["data"])) == 1536
+
+
+def test_benchmark_analysis_resolution():
+    rows = []
+    for width, height in [(1024, 768), (2000, 1500), (4000, 3000)]:
+        data = stitch_photo(width, height)
+        for max_side in (0, 1024):
+            tracemalloc.start()
+            start = time.perf_counter()
+            analyze(data, max_side)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            rows.append((width, height, max_side, elapsed, peak))
+
+    print("\nsize         max_side  latency   peak memory")
+    for width, height, max_side, elapsed, peak in rows:
+        print(f"{width}x{height:<7} {max_side or 'full':>8}  {elapsed * 1000:6.0f}ms  {peak / 2**20:8.1f}MB")
+
+    full_12mp, budget_12mp = rows[-2], rows[-1]
+    assert budget_12mp[3] < full_12mp[3] / 2
+    assert budget_12mp[4] < full_12mp[4] / 4
+
+
+def test_batched_lbp_matches_skimage():
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (40, 60), dtype=np.uint8), rng.integers(0, 256, (25, 30), dtype=np.uint8)]
+    stack = np.zeros((2, 42, 62), dtype=np.uint8)
+    for i, image in enumerate(images):
+        stack[i, 1:image.shape[0] + 1, 1:image.shape[1] + 1] = image
+
+    lbp = uniform_lbp_batch(stack)
+    for i, image in enumerate(images):
+        expected = local_binary_pattern(image, 8, 1, method='uniform')
+        np.testing.assert_array_equal(lbp[i, :image.shape[0], :image.shape[1]], expected)
+
+
+def test_batch_matches_single_image_analysis(tmp_path):
+    photos = [stitch_photo(1600, 1200), stitch_photo(1200, 1600), stitch_photo(640, 640)]
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(photos[0])
+
+    results = analyze_images_batch(photos + [b"not an image", str(path)], max_side=512, chunk_size=2)
+
+    assert len(results) == 5
+    assert results[3] == {"error": "Unable to decode image"}
+    for data, result in zip(photos + [photos[0]], results[:3] + results[4:]):
+        single = compute_image_features(decode_image(data, min_side=512), 512, image_size(data))
+        batched = result["features"]
+        assert batched["dominant_hues"] == single["dominant_hues"]
+        assert batched["edge_density"] == pytest.approx(single["edge_density"])
+        assert batched["texture_variance"] == pytest.approx(single["texture_variance"])
+        assert result["classification"] == describe_image_features(single)
+        assert result["feature_vector"].shape == (193,)
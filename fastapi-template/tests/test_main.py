@@ -19,3 +19,19 @@ def test_about_route(client):
     response = client.get("/about")
     assert response.status_code == 200
     assert response.json() == {"message": "This is the about page."}
+
+
+def test_analyze_images_route(client):
+    import cv2
+    import numpy as np
+
+    png = cv2.imencode(".png", np.full((64, 96, 3), (40, 60, 200), dtype=np.uint8))[1].tobytes()
+    response = client.post(
+        "/analyze-images",
+        files=[("files", ("a.png", png, "image/png")), ("files", ("b.txt", b"hello", "text/plain"))],
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["success"] for result in results] == [True, False]
+    assert results[0]["classification"].startswith("This appears to be")
+    assert len(results[0]["feature_vector"]) == 193
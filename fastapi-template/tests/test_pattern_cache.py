@@ -0,0 +1,125 @@
+import asyncio
+import json
+import time
+
+import httpx
+import numpy as np
+
+import main
+import pattern_generator
+from pattern_cache import PatternCache
+from pattern_generator import CrochetPatternGenerator
+
+
+def test_normalized_key_and_stats():
+    cache = PatternCache()
+    cache.put("A Simple  Winter Scarf", "beginner", "yarn_master", "PATTERN", generation_seconds=12.5)
+
+    assert cache.get("a simple winter scarf ", "BEGINNER", "yarn_master") == "PATTERN"
+    assert cache.get("a simple winter scarf", "ADVANCED", "yarn_master") is None
+    assert cache.get("a simple winter scarf", "BEGINNER", "gemini_rag") is None
+    assert cache.stats() == {
+        "entries": 1,
+        "persistent": False,
+        "hits": 1,
+        "semantic_hits": 0,
+        "misses": 2,
+        "hit_ratio": 0.333,
+        "saved_seconds": 12.5,
+    }
+
+
+def test_ttl_and_size_bound():
+    cache = PatternCache(max_entries=2, ttl=0.2)
+    cache.put("hat", "BEGINNER", "yarn_master", "HAT", 1)
+    cache.put("scarf", "BEGINNER", "yarn_master", "SCARF", 1)
+    assert cache.get("hat", "BEGINNER", "yarn_master") == "HAT"
+    cache.put("blanket", "BEGINNER", "yarn_master", "BLANKET", 1)
+
+    # scarf was least recently used
+    assert cache.get("scarf", "BEGINNER", "yarn_master") is None
+    assert cache.stats()["entries"] == 2
+
+    time.sleep(0.25)
+    assert cache.get("hat", "BEGINNER", "yarn_master") is None
+
+
+def test_hits_do_not_write(tmp_path):
+    cache = PatternCache(max_entries=2, db_path=str(tmp_path / "patterns.db"))
+    cache.put("hat", "BEGINNER", "yarn_master", "HAT", 1)
+    cache.put("scarf", "BEGINNER", "yarn_master", "SCARF", 1)
+
+    statements = []
+    cache._db.set_trace_callback(statements.append)
+    for _ in range(20):
+        assert cache.get("hat", "BEGINNER", "yarn_master") == "HAT"
+    assert not [sql for sql in statements if not sql.lstrip().upper().startswith("SELECT")]
+
+    # The buffered hits still count when the next put evicts
+    cache.put("blanket", "BEGINNER", "yarn_master", "BLANKET", 1)
+    assert cache.get("scarf", "BEGINNER", "yarn_master") is None
+    assert cache.get("hat", "BEGINNER", "yarn_master") == "HAT"
+
+
+def test_sqlite_backend_is_shared(tmp_path):
+    db_path = str(tmp_path / "patterns.db")
+    PatternCache(db_path=db_path).put("granny square", "EASY", "yarn_master", "SQUARE", 3)
+
+    other_worker = PatternCache(db_path=db_path)
+    assert other_worker.get("Granny Square", "easy", "yarn_master") == "SQUARE"
+    assert other_worker.stats()["persistent"]
+
+
+def test_semantic_hit_above_threshold():
+    cache = PatternCache(similarity_threshold=0.95)
+    cache.put("simple winter scarf", "BEGINNER", "yarn_master", "SCARF", 8, embedding=np.array([1.0, 0.0, 0.0]))
+
+    close = np.array([0.99, 0.1, 0.0])
+    far = np.array([0.6, 0.8, 0.0])
+    assert cache.get("easy scarf for winter", "BEGINNER", "yarn_master", embedding=close) == "SCARF"
+    assert cache.get("summer tote bag", "BEGINNER", "yarn_master", embedding=far) is None
+    assert cache.get("easy scarf for winter", "ADVANCED", "yarn_master", embedding=close) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+class CountingModel:
+    def __init__(self, text="MATERIALS:\n   • Yarn\nA beginner hat"):
+        self.text = text
+        self.calls = 0
+
+    async def generate_content_async(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+
+        class Response:
+            text = self.text
+        return Response()
+
+
+def test_endpoints_share_the_cache(tmp_path, monkeypatch):
+    source = tmp_path / "training_data.jsonl"
+    source.write_text(json.dumps({"output": "A winter hat", "source_file": "a.txt"}) + "\n")
+    monkeypatch.setattr(pattern_generator, "TRAINING_FILE", source)
+    monkeypatch.setattr(pattern_generator, "STORE_FILE", tmp_path / "training_store.bin")
+    model = CountingModel()
+    monkeypatch.setattr(main, "pattern_generator", CrochetPatternGenerator(None, model=model))
+    monkeypatch.setattr(main, "pattern_cache", PatternCache())
+
+    async def run():
+        async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+            first = await client.post("/generate-pattern-from-text", json={"description": "a beginner winter hat"})
+            second = await client.post("/generate-simple-pattern",
+                                       json={"description": "A beginner  winter hat", "skill_level": "INTERMEDIATE"})
+            return first.json(), second.json()
+
+    first, second = asyncio.run(run())
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["pattern"] == first["pattern"]
+    assert model.calls == 1
+
+    # Errors come back as placeholder text and are never cached
+    model.text = "unused"
+    main.pattern_generator.model = None
+    asyncio.run(main.generate_with_cache("a striped summer bag", "INTERMEDIATE", "yarn_master"))
+    assert main.pattern_cache.stats()["entries"] == 1
@@ -0,0 +1,33 @@
+from pattern_index import PatternIndex, DEFAULT_KEYWORDS
+
+
+EXAMPLES = [
+    {"output": "Cozy Blanket - skill level: Beginner"},
+    {"output": "Winter Scarf and matching Hat, INTERMEDIATE"},
+    {"output": "Amigurumi bear toy, intermediate"},
+    {"output": "Striped scarf for beginners"},
+    {"output": "Market bag"},
+    {"output": "Cotton dishcloths, advanced texture"},
+]
+
+
+def test_keyword_and_skill_scores_match_linear_scan():
+    index = PatternIndex(EXAMPLES)
+    scores = index.score("a warm winter scarf with a hat", "INTERMEDIATE")
+    assert scores == {1: 25, 2: 5, 3: 10}
+
+
+def test_search_orders_by_score_then_corpus_order():
+    index = PatternIndex(EXAMPLES)
+    assert index.search("a warm winter scarf with a hat", "INTERMEDIATE", k=5) == [1, 3, 2, 0, 4]
+
+
+def test_plural_terms_share_postings():
+    index = PatternIndex(EXAMPLES)
+    assert index.search("two dishcloths", "ADVANCED", k=1) == [5]
+
+
+def test_extra_keywords_are_supported():
+    index = PatternIndex(EXAMPLES)
+    assert index.score("a bear", "EXPERT", keywords=DEFAULT_KEYWORDS) == {}
+    assert index.score("a bear", "EXPERT", keywords=DEFAULT_KEYWORDS + ("bear",)) == {2: 10}
@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from pattern_pdf import PDFCache, parse_pattern
+from single_flight import SingleFlight
+
+PATTERN = """═══════════════════════════════════════════════════════════════
+                    Cozy Ribbed Beanie
+═══════════════════════════════════════════════════════════════
+
+🧶 SKILL LEVEL: BEGINNER
+
+🧵 MATERIALS:
+   • Yarn: Worsted weight, 200 yds
+   • Hook: 5mm (H-8)
+
+📐 GAUGE: 14 sc x 16 rows = 4 in
+
+📋 INSTRUCTIONS:
+
+   Foundation:
+   Ch 4, join with sl st <to> form a ring & continue.
+
+   Main Pattern:
+   Round 1: 6 sc in ring. (6)
+
+═══════════════════════════════════════════════════════════════
+                        Happy Crocheting! 🧶
+═══════════════════════════════════════════════════════════════
+"""
+
+
+def test_parse_pattern_sections():
+    title, sections = parse_pattern(PATTERN)
+    assert title == "Cozy Ribbed Beanie"
+    assert [heading for heading, _ in sections] == ["Skill Level", "Materials", "Gauge", "Instructions", ""]
+    assert sections[0][1] == ["BEGINNER"]
+    assert sections[1][1] == ["   • Yarn: Worsted weight, 200 yds", "   • Hook: 5mm (H-8)"]
+    assert sections[3][1][0] == "   Foundation:"
+    assert sections[-1][1] == ["                        Happy Crocheting! 🧶"]
+
+
+@pytest.fixture
+def fresh_pdf_cache(monkeypatch):
+    cache = PDFCache()
+    monkeypatch.setattr(main, "pdf_cache", cache)
+    monkeypatch.setattr(main, "pdf_flights", SingleFlight())
+    return cache
+
+
+async def post_pdf(**headers):
+    async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+        return await client.post("/generate-pdf", json={"pattern": PATTERN, "title": "Winter Beanie"}, headers=headers)
+
+
+def test_generate_pdf_is_cached_by_content(fresh_pdf_cache):
+    first = asyncio.run(post_pdf())
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "application/pdf"
+    assert first.headers["content-disposition"] == 'attachment; filename="winter_beanie.pdf"'
+    assert first.content.startswith(b"%PDF")
+    assert int(first.headers["content-length"]) == len(first.content)
+
+    second = asyncio.run(post_pdf())
+    assert second.content == first.content
+    assert fresh_pdf_cache.stats()["hits"] == 1
+
+    not_modified = asyncio.run(post_pdf(**{"If-None-Match": first.headers["etag"]}))
+    assert not_modified.status_code == 304
+
+
+def test_pdf_workers_are_not_forked_from_the_api_worker():
+    # A fork of a process with running threads can inherit a held lock
+    assert main.pdf_executor()._mp_context.get_start_method() in ("forkserver", "spawn")
+
+
+def test_pdf_cache_directory_is_shared(tmp_path):
+    PDFCache(directory=str(tmp_path)).put("abc", b"%PDF-1.4 data")
+
+    other_worker = PDFCache(directory=str(tmp_path))
+    assert other_worker.get("abc") == b"%PDF-1.4 data"
+    assert other_worker.get("missing") is None
+    assert list(tmp_path.iterdir()) == [tmp_path / "abc.pdf"]
+
+
+def test_long_titles_are_truncated(fresh_pdf_cache):
+    title = "a chunky oversized cardigan with raglan sleeves " * 5 + "- Crochet Pattern"
+
+    async def post():
+        async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+            return await client.post("/generate-pdf", json={"pattern": PATTERN, "title": title})
+
+    response = asyncio.run(post())
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+    assert main.PDFRequest(pattern=PATTERN, title=title).title.endswith("...")
+    assert len(main.PDFRequest(pattern=PATTERN, title=title).title) == main.PDF_TITLE_MAX_LENGTH
+
+
+def test_pdf_cache_directory_evicts_least_recently_used(tmp_path):
+    import os
+
+    cache = PDFCache(max_bytes=0, directory=str(tmp_path), max_disk_bytes=2500)
+    for age, key in enumerate(["old", "used", "new"]):
+        cache.put(key, bytes(1000))
+        os.utime(tmp_path / f"{key}.pdf", (1000 + age, 1000 + age))
+    # Put evicted "old" once the third file pushed the directory past 2500 bytes
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["new.pdf", "used.pdf"]
+
+    assert cache.get("used") is not None
+    cache.put("newest", bytes(1000))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["newest.pdf", "used.pdf"]
+    assert cache.stats()["disk_bytes"] == 2000
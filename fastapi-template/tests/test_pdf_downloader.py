@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pdf_downloader import PDFDownloader
+
+LATENCY = 0.1
+FILES = {f"pattern_{i}.pdf": bytes([i]) * (200_000 + i) for i in range(12)}
+LAST_MODIFIED = "Wed, 01 May 2024 00:00:00 GMT"
+
+
+class PatternHandler(BaseHTTPRequestHandler):
+    """Serves FILES with a fixed latency, ETags, conditional GETs and byte ranges"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.requests.append((self.path, dict(self.headers)))
+        try:
+            time.sleep(LATENCY)
+            name = self.path.lstrip('/').split('?')[0]
+            body = FILES.get(name)
+            if body is None:
+                self.send_error(404)
+                return
+            etag = f'"{name}-v1"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            range_header = self.headers.get('Range')
+            if range_header and self.headers.get('If-Range') in (etag, LAST_MODIFIED):
+                start = int(range_header.split('=')[1].rstrip('-'))
+                self.send_response(206)
+                self.send_header('Content-Range', f"bytes {start}-{len(body) - 1}/{len(body)}")
+                body = body[start:]
+            else:
+                self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', LAST_MODIFIED)
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class PatternServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops simultaneous connects into a 1s SYN retry
+    request_queue_size = 64
+
+
+@pytest.fixture
+def pattern_server():
+    server = PatternServer(('127.0.0.1', 0), PatternHandler)
+    server.lock = threading.Lock()
+    server.in_flight = server.max_in_flight = 0
+    server.requests = []
+    server.base_url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def sequential_download(urls, dest_dir):
+    """The previous approach: one request at a time, 1KB chunks"""
+    for url in urls:
+        with urllib.request.urlopen(url, timeout=30) as response, \
+                open(dest_dir / url.rsplit('/', 1)[-1], 'wb') as f:
+            while chunk := response.read(1024):
+                f.write(chunk)
+
+
+def test_concurrent_downloads_beat_sequential(tmp_path, pattern_server):
+    urls = [f"{pattern_server.base_url}/{name}" for name in FILES]
+
+    start = time.perf_counter()
+    sequential_download(urls, tmp_path)
+    sequential = time.perf_counter() - start
+
+    downloader = PDFDownloader(tmp_path / "patterns", concurrency=8, per_host=8)
+    start = time.perf_counter()
+    results = asyncio.run(downloader.download_all(urls))
+    concurrent = time.perf_counter() - start
+
+    print(f"\nsequential {sequential:.2f}s  concurrent {concurrent:.2f}s")
+    assert concurrent < sequential / 3
+    assert sorted(result.status for result in results) == ['saved'] * len(FILES)
+    for name, body in FILES.items():
+        assert (tmp_path / "patterns" / name).read_bytes() == body
+
+    # Unchanged files are skipped with a conditional request
+    rerun = PDFDownloader(tmp_path / "patterns", concurrency=8)
+    assert {result.status for result in asyncio.run(rerun.download_all(urls))} == {'not_modified'}
+    assert all(headers.get('If-None-Match') for _, headers in pattern_server.requests[-len(FILES):])
+
+
+def test_per_host_limit(tmp_path, pattern_server):
+    urls = [f"{pattern_server.base_url}/{name}" for name in FILES]
+    downloader = PDFDownloader(tmp_path, concurrency=12, per_host=3)
+    asyncio.run(downloader.download_all(urls))
+    assert pattern_server.max_in_flight == 3
+
+
+def test_partial_download_resumes_with_range(tmp_path, pattern_server):
+    name = "pattern_5.pdf"
+    url = f"{pattern_server.base_url}/{name}"
+    # A killed run left the first 50,000 bytes and its metadata behind
+    (tmp_path / f"{name}.part").write_bytes(FILES[name][:50_000])
+    downloader = PDFDownloader(tmp_path)
+    downloader._record(name, url=url, etag=f'"{name}-v1"', last_modified=LAST_MODIFIED, partial=True)
+
+    [result] = asyncio.run(PDFDownloader(tmp_path).download_all([url]))
+    assert result.status == 'resumed'
+    assert result.bytes == len(FILES[name]) - 50_000
+    assert (tmp_path / name).read_bytes() == FILES[name]
+    assert pattern_server.requests[-1][1]['Range'] == "bytes=50000-"
+
+
+def test_background_mode_and_failures(tmp_path, pattern_server):
+    recorded = []
+    downloader = PDFDownloader(tmp_path, concurrency=4, retries=2, backoff_base=0, on_result=recorded.append)
+    downloader.start()
+    downloader.submit(f"{pattern_server.base_url}/pattern_1.pdf")
+    downloader.submit(f"{pattern_server.base_url}/pattern_1.pdf")
+    downloader.submit(f"{pattern_server.base_url}/missing.pdf")
+    results = {result.filename: result for result in downloader.join()}
+    assert sorted(result.filename for result in recorded) == ["missing.pdf", "pattern_1.pdf"]
+
+    assert results["pattern_1.pdf"].status == 'saved'
+    # 404 is not retried
+    assert results["missing.pdf"].status == 'failed'
+    assert sum(path.endswith("missing.pdf") for path, _ in pattern_server.requests) == 1
+    assert not (tmp_path / "missing.pdf").exists()
+
+
+def test_unexpected_errors_become_failed_results(tmp_path, pattern_server, monkeypatch):
+    downloader = PDFDownloader(tmp_path, concurrency=2, retries=0)
+    fetch = downloader._fetch
+
+    async def disk_full(client, url, filename):
+        if filename == "pattern_2.pdf":
+            raise OSError(28, "No space left on device")
+        return await fetch(client, url, filename)
+
+    monkeypatch.setattr(downloader, "_fetch", disk_full)
+    downloader.start()
+    for name in ["pattern_2.pdf", "pattern_3.pdf", "pattern_4.pdf"]:
+        downloader.submit(f"{pattern_server.base_url}/{name}")
+    results = {result.filename: result for result in downloader.join()}
+
+    assert results["pattern_2.pdf"].status == 'failed'
+    assert "No space left" in results["pattern_2.pdf"].error
+    assert results["pattern_3.pdf"].status == results["pattern_4.pdf"].status == 'saved'
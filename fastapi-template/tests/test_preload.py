@@ -0,0 +1,73 @@
+import os
+import sys
+
+import faiss
+import numpy as np
+import pytest
+
+from build_vector_db import read_shared_index
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux") or not hasattr(os, "fork"),
+    reason="measures /proc memory accounting of forked workers"
+)
+
+
+def memory_kb(field, source="/proc/self/status"):
+    with open(source) as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+@pytest.fixture
+def index_file(tmp_path):
+    vectors = np.random.default_rng(0).random((20000, 384), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    index = faiss.IndexFlatIP(384)
+    index.add(vectors)
+    path = tmp_path / "pattern_vectors.faiss"
+    faiss.write_index(index, str(path))
+    return path, vectors[:8]
+
+
+def test_shared_index_stays_in_page_cache(index_file):
+    path, queries = index_file
+    index_kb = path.stat().st_size // 1024
+
+    anon_before = memory_kb("RssAnon")
+    shared = read_shared_index(path)
+    _, found = shared.search(queries, 5)
+    anon_growth = memory_kb("RssAnon") - anon_before
+
+    _, expected = faiss.read_index(str(path)).search(queries, 5)
+    np.testing.assert_array_equal(found, expected)
+    print(f"\nindex {index_kb} KB, private heap growth {anon_growth} KB")
+    assert anon_growth < index_kb / 4
+
+
+def test_forked_workers_do_not_copy_preloaded_index(index_file):
+    path, queries = index_file
+    index_kb = path.stat().st_size // 1024
+    index = read_shared_index(path)
+
+    reports = []
+    for _ in range(2):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            # Copy-on-write copies and new heap are anonymous; page-cache pages are not
+            before = memory_kb("Anonymous", "/proc/self/smaps_rollup")
+            index.search(queries, 5)
+            growth = memory_kb("Anonymous", "/proc/self/smaps_rollup") - before
+            os.write(write_fd, str(growth).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as reader:
+            reports.append(int(reader.read()))
+        os.waitpid(pid, 0)
+
+    print(f"\nindex {index_kb} KB, per-worker private growth {reports} KB")
+    assert all(growth < index_kb / 4 for growth in reports)
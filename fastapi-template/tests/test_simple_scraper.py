@@ -0,0 +1,256 @@
+import asyncio
+import time
+
+import pytest
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+import simple_scraper
+from crawl_state import CrawlState
+from simple_scraper import block_heavy_resources, crawl_worker, listing_url, plan_crawl
+
+LOAD_TIME = 0.05
+LAST_PAGE = 9
+
+
+class FakeLocator:
+    def __init__(self, hrefs):
+        self.hrefs = hrefs
+
+    async def evaluate_all(self, script):
+        return self.hrefs
+
+    async def count(self):
+        return len(self.hrefs)
+
+
+class FakeResponse:
+    status = 200
+
+
+class FakePage:
+    """Listing page that renders three PDF links after LOAD_TIME, and a "no results" page past LAST_PAGE.
+
+    Pages in `failures` fail to navigate that many times first; pages in
+    `blank` load but never render their grid. Loading page `crash` kills
+    the browser.
+    """
+
+    def __init__(self, log, fresh, failures=None, blank=(), crash=None):
+        self.log = log
+        self.fresh = fresh
+        self.failures = failures if failures is not None else {}
+        self.blank = blank
+        self.crash = crash
+        self.url = None
+
+    async def goto(self, url, wait_until=None, timeout=None):
+        self.url = url
+        self.log.append(url)
+        await asyncio.sleep(LOAD_TIME)
+        n = self.page_number()
+        if n == self.crash:
+            raise RuntimeError("Browser closed")
+        if self.failures.get(n):
+            self.failures[n] -= 1
+            raise PlaywrightTimeoutError("Timeout 90000ms exceeded")
+        return FakeResponse()
+
+    def page_number(self):
+        return int(self.url.split("page=")[1]) if "page=" in self.url else 1
+
+    async def wait_for_selector(self, selector, state=None, timeout=None):
+        if self.page_number() > LAST_PAGE or self.page_number() in self.blank:
+            raise PlaywrightTimeoutError("no grid")
+
+    async def evaluate(self, script):
+        pass
+
+    def locator(self, selector):
+        n = self.page_number()
+        if selector == simple_scraper.NO_RESULTS_SELECTOR:
+            return FakeLocator(["No products found"] if n > LAST_PAGE else [])
+        fresh = [f"https://cdn.example/new_p{n}.pdf"] if n in self.fresh else []
+        return FakeLocator(fresh + [f"https://cdn.example/p{n}_{i}.pdf" for i in range(3)] + [None])
+
+    async def close(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, log, fresh, failures=None, blank=(), crash=None):
+        self.log = log
+        self.fresh = fresh
+        self.failures = failures
+        self.blank = blank
+        self.crash = crash
+
+    async def new_page(self):
+        return FakePage(self.log, self.fresh, self.failures, self.blank, self.crash)
+
+
+class FakeDownloader:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, url):
+        self.submitted.append(url)
+
+
+def crawl(contexts, max_pages=None, state=None, incremental=False, fresh=(), failures=None, blank=(), crash=None):
+    log = []
+    downloader = FakeDownloader()
+    state = state or CrawlState(":memory:")
+    cursor, incremental = plan_crawl(state, max_pages, incremental)
+
+    async def run():
+        await asyncio.gather(*(
+            crawl_worker(FakeContext(log, set(fresh), failures, set(blank), crash), cursor, downloader, state,
+                         incremental)
+            for _ in range(contexts)
+        ))
+
+    start = time.perf_counter()
+    try:
+        asyncio.run(run())
+    except RuntimeError:
+        if crash is None:
+            raise
+    return time.perf_counter() - start, log, downloader.submitted
+
+
+def test_contexts_crawl_pages_concurrently_until_the_end():
+    sequential, log, submitted = crawl(contexts=1)
+    assert log == [listing_url(n) for n in range(1, LAST_PAGE + 2)]
+    assert len(submitted) == 3 * LAST_PAGE
+
+    concurrent, log, concurrent_submitted = crawl(contexts=4)
+    assert sorted(concurrent_submitted) == sorted(submitted)
+    # Workers stop taking pages once one comes back empty
+    assert len(log) <= LAST_PAGE + 4
+    assert concurrent < sequential / 2
+
+
+def test_max_pages_bounds_the_crawl():
+    _, log, submitted = crawl(contexts=3, max_pages=4)
+    assert sorted(log) == sorted(listing_url(n) for n in range(1, 5))
+    assert len(submitted) == 12
+
+
+def test_incremental_crawl_stops_at_known_patterns():
+    state = CrawlState(":memory:")
+    _, log, first_run = crawl(contexts=2, state=state, incremental=True)
+    assert len(first_run) == 3 * LAST_PAGE
+
+    # Nightly refresh: nothing new, so only the first page is loaded
+    _, log, submitted = crawl(contexts=1, state=state, incremental=True)
+    assert log == [listing_url(1)]
+    # Seen but never downloaded links are queued again
+    assert len(submitted) == 3
+
+    for url in first_run:
+        state.record_download(url)
+    _, log, submitted = crawl(contexts=1, state=state, incremental=True, fresh={1, 2})
+    assert log == [listing_url(n) for n in (1, 2, 3)]
+    assert submitted == ["https://cdn.example/new_p1.pdf", "https://cdn.example/new_p2.pdf"]
+
+
+@pytest.fixture
+def no_retry_wait(monkeypatch):
+    monkeypatch.setattr(simple_scraper, "PAGE_RETRY_BACKOFF", 0)
+
+
+def test_navigation_errors_are_retried(no_retry_wait):
+    _, log, submitted = crawl(contexts=2, failures={3: 2})
+    assert log.count(listing_url(3)) == 3
+    assert len(submitted) == 3 * LAST_PAGE
+
+
+def test_unrendered_page_is_skipped_not_the_end(no_retry_wait):
+    _, log, submitted = crawl(contexts=1, failures={4: simple_scraper.PAGE_ATTEMPTS}, blank={6})
+    assert log.count(listing_url(4)) == log.count(listing_url(6)) == simple_scraper.PAGE_ATTEMPTS
+    # Pages after the failures are still crawled up to the real end
+    assert log[-1] == listing_url(LAST_PAGE + 1)
+    assert len(submitted) == 3 * (LAST_PAGE - 2)
+
+
+def test_walk_cut_short_is_finished_before_incremental_stops():
+    state = CrawlState(":memory:")
+    # The browser died on page 5 of the first walk
+    _, log, submitted = crawl(contexts=1, state=state, incremental=True, crash=5)
+    assert len(submitted) == 3 * 4
+    assert not state.full_pass_complete()
+
+    # Every link on page 1 is known, but pages 5+ were never seen, so keep walking
+    _, log, submitted = crawl(contexts=2, state=state, incremental=True)
+    assert listing_url(LAST_PAGE) in log
+    assert "https://cdn.example/p9_2.pdf" in submitted
+    assert state.full_pass_complete()
+    assert state.last_page() == LAST_PAGE
+
+    _, log, _ = crawl(contexts=1, state=state, incremental=True)
+    assert log == [listing_url(1)]
+
+
+def test_skipped_pages_are_revisited(no_retry_wait):
+    state = CrawlState(":memory:")
+    # Page 6 failed during the first walk, so that walk does not count as a full pass
+    crawl(contexts=1, state=state, incremental=True, failures={6: simple_scraper.PAGE_ATTEMPTS})
+    assert state.pages_to_revisit() == [6]
+    assert not state.full_pass_complete()
+
+    _, log, _ = crawl(contexts=1, state=state, incremental=True)
+    assert log[-1] == listing_url(LAST_PAGE + 1)
+    assert state.full_pass_complete()
+
+    # Once there has been a full pass, an incremental crawl stops early but still visits skipped pages
+    crawl(contexts=1, state=state, failures={4: simple_scraper.PAGE_ATTEMPTS})
+    assert state.full_pass_complete()
+    _, log, submitted = crawl(contexts=1, state=state, incremental=True, fresh={4})
+    assert sorted(log) == sorted([listing_url(1), listing_url(4)])
+    assert "https://cdn.example/new_p4.pdf" in submitted
+    assert state.pages_to_revisit() == []
+
+
+def test_interrupted_crawl_resumes_unfinished_downloads(monkeypatch):
+    from pdf_downloader import DownloadResult
+
+    class BackgroundDownloader(FakeDownloader):
+        def __init__(self, *args, on_result=None, **kwargs):
+            super().__init__()
+            self.on_result = on_result
+
+        def start(self):
+            pass
+
+    monkeypatch.setattr(simple_scraper, "PDFDownloader", BackgroundDownloader)
+    state = CrawlState(":memory:")
+    # A full crawl found every page, then died after two downloads landed
+    crawl(contexts=2, state=state)
+    downloader = simple_scraper.start_downloader(state)
+    downloader.on_result(DownloadResult("https://cdn.example/p1_0.pdf", "p1_0.pdf", "saved", 10))
+    downloader.on_result(DownloadResult("https://cdn.example/p5_0.pdf", "p5_0.pdf", "failed", error="reset"))
+
+    # The next run queues the rest up front, though an incremental crawl only revisits page 1
+    downloader = simple_scraper.start_downloader(state)
+    assert len(downloader.submitted) == 3 * LAST_PAGE - 2
+    assert "https://cdn.example/p9_2.pdf" in downloader.submitted
+    assert state.stats()["patterns"] == {"downloaded": 1, "failed": 1, "pending": 3 * LAST_PAGE - 2}
+
+
+def test_heavy_resources_are_blocked():
+    class Route:
+        def __init__(self, resource_type):
+            self.request = type("Request", (), {"resource_type": resource_type})()
+            self.outcome = None
+
+        async def abort(self):
+            self.outcome = "aborted"
+
+        async def continue_(self):
+            self.outcome = "continued"
+
+    routes = {kind: Route(kind) for kind in ["document", "script", "xhr", "image", "font", "media"]}
+    for route in routes.values():
+        asyncio.run(block_heavy_resources(route))
+    assert {kind for kind, route in routes.items() if route.outcome == "aborted"} == \
+        simple_scraper.BLOCKED_RESOURCE_TYPES
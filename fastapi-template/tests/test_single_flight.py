@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+import pattern_generator
+from pattern_cache import PatternCache
+from pattern_generator import CrochetPatternGenerator
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "PATTERN"
+
+    async def run():
+        return await asyncio.gather(*(flights.do("scarf", work) for _ in range(20)))
+
+    assert asyncio.run(run()) == ["PATTERN"] * 20
+    assert len(calls) == 1
+    assert flights.stats() == {"in_flight": 0, "calls": 1, "coalesced": 19}
+
+    # Once finished, the next caller starts fresh work
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("quota exceeded")
+
+    async def run():
+        return await asyncio.gather(*(flights.do("hat", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "BLANKET"
+
+    async def run():
+        first = asyncio.ensure_future(flights.do("blanket", work))
+        second = asyncio.ensure_future(flights.do("blanket", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "BLANKET"
+
+
+class SlowCountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content_async(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(0.1)
+
+        class Response:
+            text = "MATERIALS:\n   • Yarn\nA beginner hat"
+        return Response()
+
+
+@pytest.fixture
+def counting_model(tmp_path, monkeypatch):
+    source = tmp_path / "training_data.jsonl"
+    source.write_text(json.dumps({"output": "A winter hat", "source_file": "a.txt"}) + "\n")
+    monkeypatch.setattr(pattern_generator, "TRAINING_FILE", source)
+    monkeypatch.setattr(pattern_generator, "STORE_FILE", tmp_path / "training_store.bin")
+    model = SlowCountingModel()
+    monkeypatch.setattr(main, "pattern_generator", CrochetPatternGenerator(None, model=model))
+    monkeypatch.setattr(main, "pattern_cache", PatternCache())
+    monkeypatch.setattr(main, "generation_flights", SingleFlight())
+    monkeypatch.setattr(main, "analysis_flights", SingleFlight())
+    return model
+
+
+def test_identical_text_requests_generate_once(counting_model):
+    async def run():
+        async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/generate-pattern-from-text", json={"description": f"a beginner  {case} hat"})
+                for case in ["winter", "Winter", "WINTER", "winter "]
+            ))
+
+    responses = asyncio.run(run())
+    assert all(response.status_code == 200 for response in responses)
+    assert len({response.json()["pattern"] for response in responses}) == 1
+    assert counting_model.calls == 1
+
+
+def test_identical_images_are_analyzed_once(counting_model, monkeypatch):
+    import cv2
+    import numpy as np
+
+    vision_calls = []
+
+    async def vision(image, digest=None):
+        vision_calls.append(digest)
+        await asyncio.sleep(0.05)
+        return {"item_type": "hat", "description": "A ribbed hat"}
+
+    monkeypatch.setattr(main, "analyze_image_with_gemini_async", vision)
+    png = cv2.imencode(".png", np.zeros((64, 64, 3), dtype=np.uint8))[1].tobytes()
+
+    async def run():
+        async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/generate-pattern", files={"file": ("hat.png", png, "image/png")})
+                for _ in range(3)
+            ))
+
+    responses = asyncio.run(run())
+    assert all(response.status_code == 200 for response in responses)
+    assert len(vision_calls) == 1
+    assert counting_model.calls == 1
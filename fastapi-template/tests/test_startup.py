@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ["torch", "transformers", "sentence_transformers", "faiss", "skimage.feature._texture"]
+
+PROBE = """
+import json, resource, sys, time
+
+def peak_rss_mb():
+    # ru_maxrss survives exec and would include the pytest parent; VmHWM starts fresh
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+start = time.perf_counter()
+import main
+import_time = time.perf_counter() - start
+loaded = [name for name in {heavy} if name in sys.modules]
+if {warm_up}:
+    main.warm_up()
+print(json.dumps({{
+    "import_s": import_time,
+    "rss_mb": peak_rss_mb(),
+    "loaded": loaded,
+}}))
+"""
+
+
+def measure_startup(tmp_path, warm_up=False):
+    """Import main in a fresh interpreter and report its import time and peak RSS"""
+    env = dict(os.environ, PYTHONPATH=str(APP_DIR))
+    env.pop("GEMINI_API_KEY", None)
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES, warm_up=warm_up)],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_defers_heavy_dependencies(tmp_path):
+    cold = measure_startup(tmp_path)
+    warm = measure_startup(tmp_path, warm_up=True)
+
+    print(f"\nimport main: {cold['import_s']:.2f}s, {cold['rss_mb']:.0f} MB peak RSS; "
+          f"with warm-up: {warm['rss_mb']:.0f} MB")
+    assert cold["loaded"] == []
+    # torch alone is several hundred MB; the API process should stay well below that
+    assert cold["rss_mb"] < 300
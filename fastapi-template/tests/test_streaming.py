@@ -0,0 +1,139 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+import main
+import pattern_generator
+from pattern_cache import PatternCache
+from pattern_generator import CrochetPatternGenerator
+
+PATTERN_CHUNKS = ["MATERIALS:\n", "   • Worsted yarn\n", "GAUGE: 4 in\n", "A simple beginner scarf\n"]
+CHUNK_LATENCY = 0.05
+
+
+class StreamingStubModel:
+    """Gemini stand-in that streams fixed chunks with a delay between them"""
+
+    def __init__(self, chunks=PATTERN_CHUNKS, fail_after=None):
+        self.chunks = chunks
+        self.fail_after = fail_after
+
+    async def stream_content_async(self, prompt):
+        for i, chunk in enumerate(self.chunks):
+            if i == self.fail_after:
+                raise RuntimeError("stream interrupted")
+            await asyncio.sleep(CHUNK_LATENCY)
+            yield chunk
+
+
+@pytest.fixture
+def streaming_generator(tmp_path, monkeypatch):
+    source = tmp_path / "training_data.jsonl"
+    source.write_text(json.dumps({"output": "A winter scarf", "source_file": "a.txt"}) + "\n")
+    monkeypatch.setattr(pattern_generator, "TRAINING_FILE", source)
+    monkeypatch.setattr(pattern_generator, "STORE_FILE", tmp_path / "training_store.bin")
+    generator = CrochetPatternGenerator(None, model=StreamingStubModel())
+    monkeypatch.setattr(main, "pattern_generator", generator)
+    monkeypatch.setattr(main, "pattern_cache", PatternCache())
+    return generator
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def post(path, **kwargs):
+    async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+        return await client.post(path, **kwargs)
+
+
+def test_text_stream_sends_chunks_then_metadata(streaming_generator):
+    response = asyncio.run(post(
+        "/generate-pattern-from-text/stream",
+        json={"description": "a simple winter scarf", "skill_level": "beginner"},
+    ))
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_events(response.text)
+    names = [name for name, _ in events]
+    assert names == ["chunk"] * len(PATTERN_CHUNKS) + ["metadata", "done"]
+    assert "".join(data["text"] for name, data in events if name == "chunk") == "".join(PATTERN_CHUNKS)
+
+    metadata = events[-2][1]
+    assert metadata["skill_level"] == "BEGINNER"
+    assert metadata["materials"] == ["• Worsted yarn"]
+    assert metadata["difficulty"] == "Beginner"
+    assert metadata["timings"]["first_chunk"] < metadata["timings"]["total"]
+
+
+def test_first_chunk_arrives_before_generation_finishes(streaming_generator):
+    async def first_and_last():
+        start = time.perf_counter()
+        stream = main.stream_pattern_events("a simple winter scarf", "BEGINNER", "yarn_master", {}, {}, time.time())
+        first = await stream.__anext__()
+        first_at = time.perf_counter() - start
+        async for _ in stream:
+            pass
+        return first, first_at, time.perf_counter() - start
+
+    first, first_at, total = asyncio.run(first_and_last())
+    assert first.startswith("event: chunk")
+    assert first_at < total / 2
+
+
+def test_stream_reports_errors_as_events(streaming_generator):
+    streaming_generator.model = StreamingStubModel(fail_after=2)
+    response = asyncio.run(post("/generate-pattern-from-text/stream", json={"description": "a simple winter scarf"}))
+
+    names = [name for name, _ in parse_events(response.text)]
+    assert names == ["chunk", "chunk", "error"]
+
+
+def test_short_descriptions_are_accepted(streaming_generator):
+    response = asyncio.run(post("/generate-pattern-from-text/stream", json={"description": "hat"}))
+    assert response.status_code == 200
+    assert [name for name, _ in parse_events(response.text)][-1] == "done"
+
+
+def test_slow_reader_does_not_hold_the_generation_slot(streaming_generator):
+    streaming_generator.semaphore = asyncio.Semaphore(1)
+
+    async def stalled_reader():
+        stream = streaming_generator.generate_pattern_stream("a simple winter scarf")
+        first = await stream.__anext__()
+        # The client stops reading while the model keeps writing
+        await asyncio.sleep(CHUNK_LATENCY * (len(PATTERN_CHUNKS) + 2))
+        released = not streaming_generator.semaphore.locked()
+        rest = [text async for text in stream]
+        return released, [first, *rest]
+
+    released, chunks = asyncio.run(stalled_reader())
+    assert released
+    assert chunks == PATTERN_CHUNKS
+
+
+def test_image_stream_sends_analysis_first(streaming_generator, monkeypatch):
+    import cv2
+    import numpy as np
+
+    async def vision(image, digest=None):
+        return {"item_type": "scarf", "description": "A striped scarf"}
+
+    monkeypatch.setattr(main, "analyze_image_with_gemini_async", vision)
+    png = cv2.imencode(".png", np.zeros((64, 64, 3), dtype=np.uint8))[1].tobytes()
+
+    response = asyncio.run(post("/generate-pattern/stream", files={"file": ("scarf.png", png, "image/png")}))
+    events = parse_events(response.text)
+    assert events[0] == ("analysis", {"item_type": "scarf", "image_analysis": None})
+    assert [name for name, _ in events[-2:]] == ["metadata", "done"]
+    assert "gemini_vision" in events[-2][1]["timings"]
+
+    response = asyncio.run(post("/generate-pattern/stream", files={"file": ("notes.txt", b"hello", "text/plain")}))
+    assert response.status_code == 415
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from google.api_core import exceptions
+
+import gemini_client
+from rate_limiter import TokenBucket
+from train_model import DataPreparationContainer, JsonlWriter
+
+LATENCY = 0.1
+
+
+class FakeModelHandler(BaseHTTPRequestHandler):
+    """Answers structuring prompts after a fixed latency; 429s each prompt's first try if asked"""
+
+    seen = set()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        prompt = self.rfile.read(int(self.headers['Content-Length'])).decode()
+        time.sleep(LATENCY)
+        with self.lock:
+            first_try = prompt not in self.seen
+            self.seen.add(prompt)
+        if self.server.rate_limit_first_try and first_try:
+            self.send_response(429)
+            self.end_headers()
+            return
+        body = json.dumps({"text": '{"title": "Structured"}'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeModelClient:
+    """generate_content over HTTP to the fake server, raising api_core errors like the SDK"""
+
+    def __init__(self, url):
+        self.url = url
+
+    def generate_content(self, prompt):
+        request = urllib.request.Request(self.url, data=prompt.encode(), method='POST')
+        try:
+            with urllib.request.urlopen(request) as response:
+                text = json.loads(response.read())['text']
+        except urllib.error.HTTPError as e:
+            raise exceptions.from_http_status(e.code, "fake model error")
+
+        class Response:
+            pass
+        result = Response()
+        result.text = text
+        return result
+
+
+@pytest.fixture
+def model_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeModelHandler)
+    server.rate_limit_first_try = False
+    FakeModelHandler.seen = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def write_processed(directory, count):
+    directory.mkdir()
+    for i in range(count):
+        (directory / f"pattern_{i}_processed.txt").write_text(
+            f"PDF: pattern_{i}.pdf\nText Content:\nRound {i}: ch 3, 11 dc in ring, join with sl st to top of ch-3.\n"
+            "Image Descriptions:\n"
+        )
+    (directory / "empty_processed.txt").write_text("Text Content:\nshort\nImage Descriptions:\n")
+
+
+def test_wall_time_scales_with_concurrency(tmp_path, model_server):
+    client = FakeModelClient(f"http://127.0.0.1:{model_server.server_port}/")
+    write_processed(tmp_path / "processed", 16)
+
+    timings = {}
+    for workers in (1, 4, 8):
+        output_dir = tmp_path / f"out_{workers}"
+        prep = DataPreparationContainer(None, model=client, workers=workers, requests_per_minute=60000)
+        start = time.perf_counter()
+        assert prep.prepare_training_data(tmp_path / "processed", output_dir) == 16
+        timings[workers] = time.perf_counter() - start
+
+        lines = (output_dir / "training_data.jsonl").read_text().splitlines()
+        assert sorted(json.loads(line)['source_file'] for line in lines) == \
+            sorted(f"pattern_{i}_processed.txt" for i in range(16))
+
+    print(f"\nworkers  wall time\n" + "\n".join(f"{w:7}  {t:8.2f}s" for w, t in timings.items()))
+    assert timings[4] < timings[1] / 3
+    assert timings[8] < timings[4]
+
+    # Already structured files are skipped on the next run
+    prep = DataPreparationContainer(None, model=client, workers=4, requests_per_minute=60000)
+    assert prep.prepare_training_data(tmp_path / "processed", tmp_path / "out_4") == 0
+
+
+def test_rate_limited_calls_are_retried(tmp_path, model_server, monkeypatch):
+    monkeypatch.setattr("train_model.backoff_delay", lambda attempt: 0.01)
+    model_server.rate_limit_first_try = True
+    client = FakeModelClient(f"http://127.0.0.1:{model_server.server_port}/")
+    write_processed(tmp_path / "processed", 4)
+
+    prep = DataPreparationContainer(None, model=client, workers=4, requests_per_minute=60000, max_retries=2)
+    assert prep.prepare_training_data(tmp_path / "processed", tmp_path / "out") == 4
+
+    # Without retries the files fail and are left for the next run
+    model_server.rate_limit_first_try = True
+    FakeModelHandler.seen = set()
+    prep = DataPreparationContainer(None, model=client, workers=4, requests_per_minute=60000, max_retries=0)
+    assert prep.prepare_training_data(tmp_path / "processed", tmp_path / "fresh") == 0
+    assert prep.prepare_training_data(tmp_path / "processed", tmp_path / "fresh") == 4
+
+
+def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(11)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # One token is available up front, the other ten arrive 20ms apart
+    assert 0.18 < time.perf_counter() - start < 0.4
+
+
+def test_writer_syncs_periodically(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr("train_model.os.fsync", lambda fd: synced.append(fd))
+    path = tmp_path / "training_data.jsonl"
+    with JsonlWriter(path, fsync_every=3, fsync_interval=60) as writer:
+        data_fd = writer._file.fileno()
+        for i in range(7):
+            writer.write({"source_file": f"{i}.txt"})
+        assert synced.count(data_fd) == 2
+        assert len(path.read_text().splitlines()) == 6
+    assert synced.count(data_fd) == 3
+    assert len(path.read_text().splitlines()) == 7
+
+
+def test_default_model_leaves_retries_to_the_pipeline(monkeypatch):
+    monkeypatch.setattr(gemini_client, "_configured_key", None)
+    monkeypatch.setattr(gemini_client.genai, "configure", lambda api_key: None)
+    assert DataPreparationContainer("key").model.max_retries == 0
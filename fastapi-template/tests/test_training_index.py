@@ -0,0 +1,70 @@
+import json
+
+from train_model import JsonlWriter
+from training_index import TrainingIndex, index_path
+
+
+def write_examples(path, names):
+    with JsonlWriter(path) as writer:
+        for name in names:
+            writer.write({"input": "Generate", "output": "Pattern", "source_file": name})
+
+
+def test_resume_reads_only_new_entries(tmp_path):
+    path = tmp_path / "training_data.jsonl"
+    write_examples(path, ["a.txt", "b.txt"])
+
+    index = TrainingIndex(path)
+    assert index.source_files == {"a.txt", "b.txt"}
+    assert index.count == 2
+    assert index.end == path.stat().st_size
+    assert index.catch_up() == 0
+
+    # Lines appended without the index (an older writer) are picked up from the tail
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"output": "Pattern", "source_file": "c.txt"}) + '\n')
+        f.write('{"output": "cut off mid-wri')
+    index = TrainingIndex(path)
+    assert index.source_files == {"a.txt", "b.txt", "c.txt"}
+    assert len(index_path(path).read_text().splitlines()) == 3
+
+    # Byte ranges point at the matching examples
+    start, end, name = json.loads(index_path(path).read_text().splitlines()[1])
+    with open(path, 'rb') as f:
+        f.seek(start)
+        assert json.loads(f.read(end - start))["source_file"] == name == "b.txt"
+
+
+def test_entries_past_the_data_are_dropped(tmp_path):
+    path = tmp_path / "training_data.jsonl"
+    write_examples(path, ["a.txt", "b.txt"])
+    first_line = path.read_bytes().splitlines(keepends=True)[0]
+    # The index reached disk but the second example did not
+    path.write_bytes(first_line)
+
+    index = TrainingIndex(path)
+    assert index.source_files == {"a.txt"}
+    assert len(index_path(path).read_text().splitlines()) == 1
+
+    # A replaced, shorter file is re-indexed from the start
+    path.write_text(json.dumps({"source_file": "z"}) + '\n')
+    assert TrainingIndex(path).source_files == {"z"}
+
+
+def test_readonly_monitor_tails_appends(tmp_path):
+    path = tmp_path / "training_data.jsonl"
+    write_examples(path, ["a.txt"])
+    monitor = TrainingIndex(path, readonly=True)
+    assert monitor.count == 1
+
+    write_examples(path, ["b.txt", "c.txt"])
+    assert monitor.catch_up() == 2
+    assert monitor.count == 3
+    assert len(index_path(path).read_text().splitlines()) == 3
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"source_file": "d.txt"}) + '\n')
+    index_before = index_path(path).read_text()
+    assert monitor.catch_up() == 1
+    assert monitor.count == 4
+    assert index_path(path).read_text() == index_before
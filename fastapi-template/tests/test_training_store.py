@@ -0,0 +1,72 @@
+import json
+
+import training_store
+
+
+def write_jsonl(path, examples):
+    with open(path, 'w', encoding='utf-8') as f:
+        for example in examples:
+            f.write(json.dumps(example) + '\n')
+        f.write('not json\n')
+
+
+def test_compile_and_read_back(tmp_path):
+    pattern = {
+        "title": "Winter Scarf",
+        "skill_level": "BEGINNER",
+        "materials": ["Worsted yarn", "5mm hook"],
+        "instructions": {"Row 1": "ch 20"},
+    }
+    source = tmp_path / "training_data.jsonl"
+    store = tmp_path / "training_store.bin"
+    write_jsonl(source, [
+        {"output": f"```json\n{json.dumps(pattern)}\n```", "source_file": "a_processed.txt"},
+        {"output": "Plain text hat pattern", "source_file": "b_processed.txt"},
+    ])
+
+    assert training_store.compile_training_data(source, store) == 2
+    assert not training_store.is_stale(source, store)
+
+    records = training_store.TrainingStore(store)
+    assert len(records) == 2
+    assert records[0].title == "Winter Scarf"
+    assert records[0].skill_level == "BEGINNER"
+    assert records[1].source_file == "b_processed.txt"
+    assert records.field(1, 'title') == ''
+    assert 'hat' in records[1].terms.split()
+
+    assert training_store.format_context(records[0], 1) == (
+        "Example 1 - Winter Scarf:\n"
+        "Materials: ['Worsted yarn', '5mm hook']...\n"
+        "Instructions: {'Row 1': 'ch 20'}...\n\n"
+    )
+    assert training_store.format_context(records[1], 2) == "Example 2: Plain text hat pattern...\n\n"
+
+
+def test_workers_compiling_together_leave_a_valid_store(tmp_path):
+    import os
+
+    import pytest
+
+    if not hasattr(os, "fork"):
+        pytest.skip("needs fork")
+    source = tmp_path / "training_data.jsonl"
+    store = tmp_path / "training_store.bin"
+    write_jsonl(source, [{"output": f"pattern {i} " * 200, "source_file": f"{i}.txt"} for i in range(2000)])
+
+    # Every worker of a fresh `uvicorn --workers N` finds the store stale at once
+    pids = []
+    for _ in range(4):
+        pid = os.fork()
+        if pid == 0:
+            training_store.compile_training_data(source, store)
+            os._exit(0)
+        pids.append(pid)
+    for pid in pids:
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+
+    records = training_store.TrainingStore(store)
+    assert len(records) == 2000
+    assert records[1999].source_file == "1999.txt"
+    assert not list(tmp_path.glob("*.tmp"))
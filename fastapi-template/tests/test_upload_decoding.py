@@ -0,0 +1,56 @@
+import asyncio
+
+import cv2
+import httpx
+import numpy as np
+
+import main
+
+
+def png(color):
+    return cv2.imencode(".png", np.full((48, 64, 3), color, dtype=np.uint8))[1].tobytes()
+
+
+def test_uploads_decode_once_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    decodes = []
+    seen = {}
+
+    def counting_decode(data, min_side=0):
+        decodes.append(len(data))
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+    async def vision(image, digest=None):
+        assert image["mime_type"] == "image/jpeg"
+        return {"item_type": "scarf", "description": "A scarf"}
+
+    def analysis(image, digest=None, original_size=None):
+        seen[digest] = tuple(int(c) for c in image[0, 0])
+        return f"color {seen[digest]}"
+
+    monkeypatch.setattr(main, "pattern_generator", None)
+    monkeypatch.setattr(main, "decode_image", counting_decode)
+    monkeypatch.setattr(main, "analyze_image_with_gemini_async", vision)
+    monkeypatch.setattr(main, "analyze_image_content", analysis)
+
+    async def post(data):
+        async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+            return await client.post(
+                "/generate-pattern",
+                # Same filename for both, which used to collide in uploaded_files/
+                files={"file": ("photo.png", data, "image/png")},
+                data={"include_image_analysis": "true"},
+            )
+
+    async def post_both():
+        return await asyncio.gather(post(png((255, 0, 0))), post(png((0, 0, 255))))
+
+    red, blue = asyncio.run(post_both())
+    assert red.json()["image_analysis"] == "color (255, 0, 0)"
+    assert blue.json()["image_analysis"] == "color (0, 0, 255)"
+    assert len(decodes) == 2
+    assert not (tmp_path / "uploaded_files").exists()
+
+    response = asyncio.run(post(b"not an image at all"))
+    assert response.status_code == 415
+    assert len(decodes) == 2
@@ -1,17 +1,84 @@
-import google.generativeai as genai
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import numpy as np
 from PIL import Image
 import time
 from datetime import datetime
+from gemini_client import GeminiModel, backoff_delay, configure, is_retryable
+from rate_limiter import TokenBucket
+from training_index import TrainingIndex
+
+# Structuring calls in flight at once and the per-minute quota they share
+STRUCTURE_WORKERS = int(os.getenv('STRUCTURE_WORKERS', '8'))
+GEMINI_RPM = float(os.getenv('GEMINI_RPM', '60'))
+STRUCTURE_RETRIES = int(os.getenv('STRUCTURE_RETRIES', '4'))
+
+
+class JsonlWriter:
+    """Single buffered appender for training examples.
+
+    Lines are flushed and fsynced every `fsync_every` records or
+    `fsync_interval` seconds, whichever comes first, and on close, so a
+    crash loses at most one interval of work instead of paying an open and
+    sync per example. Each line's byte range is recorded in the sidecar
+    TrainingIndex as it is appended.
+    """
+
+    def __init__(self, path, index=None, fsync_every=50, fsync_interval=5.0):
+        self.path = Path(path)
+        self.index = index if index is not None else TrainingIndex(self.path)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = open(self.path, 'ab', buffering=1 << 16)
+        self._offset = self._file.seek(0, os.SEEK_END)
+        self._pending = 0
+        self._synced_at = time.monotonic()
+
+    def write(self, record):
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        self._file.write(line)
+        self.index.record(self._offset, self._offset + len(line), record.get('source_file', ''))
+        self._offset += len(line)
+        self._pending += 1
+        if self._pending >= self.fsync_every or time.monotonic() - self._synced_at >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        # Data first: index entries past the end of the data are dropped on load
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.index.sync()
+        self._pending = 0
+        self._synced_at = time.monotonic()
+
+    def close(self):
+        self.sync()
+        self._file.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 
 class DataPreparationContainer:
-    def __init__(self, api_key):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
-        self.vision_model = genai.GenerativeModel('gemini-1.5-flash')
+    def __init__(self, api_key, model=None, workers=STRUCTURE_WORKERS, requests_per_minute=GEMINI_RPM,
+                 max_retries=STRUCTURE_RETRIES):
+        if model is None:
+            # The pipeline retries each call itself so that every attempt,
+            # retries included, passes through the rate limiter
+            configure(api_key)
+            model = GeminiModel(max_retries=0)
+        # Text and vision prompts go to the same model and shared channel
+        self.model = model
+        self.vision_model = self.model
+        self.workers = workers
+        self.max_retries = max_retries
+        self.rate_limiter = TokenBucket(requests_per_minute / 60.0, capacity=workers)
     
     def generate_image_description(self, image_array):
         """Generate detailed image description using Gemini Vision"""
@@ -40,7 +107,13 @@ class DataPreparationContainer:
     def structure_pattern_text(self, raw_text):
         """Convert raw text into structured crochet pattern format"""
         try:
-            prompt = f"""Convert this raw crochet pattern text into a structured JSON format:
+            return self._structure(raw_text)
+        except Exception as e:
+            print(f"Error structuring text: {e}")
+            return raw_text
+
+    def _structure(self, raw_text):
+        prompt = f"""Convert this raw crochet pattern text into a structured JSON format:
 
 Raw text: {raw_text[:2000]}...
 
@@ -55,84 +128,90 @@ Return a JSON with these fields:
 
 Make it clean and well-structured for training data."""
 
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            print(f"Error structuring text: {e}")
-            return raw_text
-    
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                return self.model.generate_content(prompt).text
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                time.sleep(backoff_delay(attempt))
+
+    def _training_example(self, txt_file):
+        """Structured example for one processed PDF, or None if it has too little text"""
+        with open(txt_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        if "Text Content:" in content:
+            text_start = content.find("Text Content:") + len("Text Content:")
+            text_end = content.find("Image Descriptions:")
+            raw_text = content[text_start:text_end].strip()
+        else:
+            raw_text = content
+
+        if len(raw_text.strip()) < 50:
+            return None
+
+        return {
+            "input": f"Generate a crochet pattern for: {txt_file.stem.replace('_processed', '')}",
+            # Failures propagate so the file is not recorded and a later run retries it
+            "output": self._structure(raw_text),
+            "source_file": txt_file.name
+        }
+
     def prepare_training_data(self, processed_pdfs_dir, output_dir):
-        """Prepare training data from processed PDFs"""
+        """Prepare training data from processed PDFs.
+
+        Files are structured concurrently by a pool of `workers` threads,
+        paced by the shared token bucket; finished examples are appended by
+        a single writer in completion order.
+        """
         processed_dir = Path(processed_pdfs_dir)
         output_dir = Path(output_dir)
         output_dir.mkdir(exist_ok=True)
         
         output_file = output_dir / "training_data.jsonl"
         
-        # Load existing processed files
-        processed_files = set()
-        if output_file.exists():
-            with open(output_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    data = json.loads(line)
-                    processed_files.add(data['source_file'])
+        # Already processed files come from the sidecar index, not a re-parse
+        index = TrainingIndex(output_file)
+        processed_files = set(index.source_files)
         
+        all_files = sorted(processed_dir.glob("*_processed.txt"))
+        total_files = len(all_files)
+        pending = [txt_file for txt_file in all_files if txt_file.name not in processed_files]
+        print(f"Structuring {len(pending)} files with {self.workers} workers "
+              f"at {self.rate_limiter.rate * 60:.0f} requests/minute")
+
         count = 0
+        done = 0
         start_time = time.time()
-        total_files = len(list(processed_dir.glob("*_processed.txt")))
-        
-        for txt_file in processed_dir.glob("*_processed.txt"):
-            if txt_file.name in processed_files:
-                continue
-                
-            current_total = count + len(processed_files) + 1
-            elapsed = time.time() - start_time
-            if count > 0:
-                avg_time = elapsed / count
-                remaining = (total_files - current_total) * avg_time
-                eta = datetime.now().timestamp() + remaining
-                eta_str = datetime.fromtimestamp(eta).strftime('%H:%M:%S')
-            else:
-                eta_str = "calculating..."
-            
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Processing {txt_file.name}... ({current_total}/{total_files}) ETA: {eta_str}")
-            
-            try:
-                with open(txt_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                if "Text Content:" in content:
-                    text_start = content.find("Text Content:") + len("Text Content:")
-                    text_end = content.find("Image Descriptions:")
-                    raw_text = content[text_start:text_end].strip()
-                else:
-                    raw_text = content
-                
-                if len(raw_text.strip()) < 50:
+        with JsonlWriter(output_file, index) as writer, ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._training_example, txt_file): txt_file for txt_file in pending}
+            for future in as_completed(futures):
+                txt_file = futures[future]
+                done += 1
+                current_total = done + len(processed_files)
+                elapsed = time.time() - start_time
+                remaining = (len(pending) - done) * elapsed / done
+                eta_str = datetime.fromtimestamp(datetime.now().timestamp() + remaining).strftime('%H:%M:%S')
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] {txt_file.name} ({current_total}/{total_files}) ETA: {eta_str}")
+
+                try:
+                    training_example = future.result()
+                except Exception as e:
+                    print(f"  ❌ Error: {e}")
+                    continue
+                if training_example is None:
                     print(f"  Skipped - insufficient content")
                     continue
-                
-                structured_text = self.structure_pattern_text(raw_text)
-                
-                training_example = {
-                    "input": f"Generate a crochet pattern for: {txt_file.stem.replace('_processed', '')}",
-                    "output": structured_text,
-                    "source_file": txt_file.name
-                }
-                
-                # Append to file immediately
-                with open(output_file, 'a', encoding='utf-8') as f:
-                    f.write(json.dumps(training_example) + '\n')
-                
+
+                writer.write(training_example)
                 count += 1
                 print(f"  ✅ Completed ({count} new examples generated)")
-                
+
                 # Progress checkpoint every 10 files
                 if count % 10 == 0:
                     print(f"\n📊 CHECKPOINT: {count} new examples processed, {current_total}/{total_files} total\n")
-                
-            except Exception as e:
-                print(f"  ❌ Error: {e}")
         
         total_time = time.time() - start_time
         print(f"\n🎉 COMPLETED: Generated {count} new training examples")
@@ -0,0 +1,116 @@
+"""Sidecar index of `training_data.jsonl` for cheap resume and progress checks.
+
+`training_data.jsonl.idx` holds one JSON line per example,
+[start, end, source_file], giving the example's byte range in the JSONL.
+The writer appends to it as it appends examples. Opening the index reads
+only this small file plus whatever the JSONL gained since the index was
+last written, so resuming a run costs O(new entries) rather than a parse of
+the whole corpus.
+
+Index lines pointing past the end of the JSONL (the index was written but
+the data never reached disk) are dropped on open, and any complete JSONL
+lines beyond the last indexed byte are indexed then.
+"""
+import json
+import os
+from pathlib import Path
+
+
+def index_path(jsonl_path):
+    return Path(f"{jsonl_path}.idx")
+
+
+class TrainingIndex:
+    """Processed source files and the byte offset indexed so far.
+
+    With readonly=True nothing is written, so another process (the progress
+    monitor) can follow a file a writer is appending to.
+    """
+
+    def __init__(self, jsonl_path, readonly=False):
+        self.jsonl_path = Path(jsonl_path)
+        self.path = index_path(jsonl_path)
+        self.readonly = readonly
+        self.source_files = set()
+        self.count = 0
+        self.end = 0
+        self._file = None
+        self._load()
+        self.catch_up()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        data_size = self.jsonl_path.stat().st_size if self.jsonl_path.exists() else 0
+        valid_bytes = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    start, end, source_file = json.loads(line)
+                except ValueError:
+                    break
+                if end > data_size:
+                    break
+                self._add(end, source_file)
+                valid_bytes += len(line)
+        if not self.readonly and valid_bytes < self.path.stat().st_size:
+            os.truncate(self.path, valid_bytes)
+
+    def _add(self, end, source_file):
+        if source_file:
+            self.source_files.add(source_file)
+        self.count += 1
+        self.end = end
+
+    def catch_up(self):
+        """Index complete JSONL lines written since `end`; returns how many were added"""
+        if not self.jsonl_path.exists():
+            return 0
+        size = self.jsonl_path.stat().st_size
+        if size < self.end:
+            # The JSONL was replaced or truncated; start over
+            self.source_files.clear()
+            self.count = self.end = 0
+            if not self.readonly and self.path.exists():
+                os.truncate(self.path, 0)
+        if size == self.end:
+            return 0
+
+        added = 0
+        with open(self.jsonl_path, 'rb') as f:
+            f.seek(self.end)
+            offset = self.end
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    source_file = json.loads(line).get('source_file', '')
+                except (ValueError, AttributeError):
+                    source_file = ''
+                self.record(offset, offset + len(line), source_file)
+                offset += len(line)
+                added += 1
+        self.sync()
+        return added
+
+    def record(self, start, end, source_file):
+        """Add one appended example"""
+        self._add(end, source_file)
+        if self.readonly:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps([start, end, source_file]) + '\n')
+
+    def sync(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
@@ -0,0 +1,150 @@
+"""Compiled, memory-mapped store of pre-parsed training examples.
+
+`training_data.jsonl` holds raw model output (often a fenced JSON blob) for
+every scraped pattern. Decoding that on every request is wasted work, so the
+compile step below parses each example once and writes the fields the
+generator needs into a flat binary file that is memory-mapped at startup.
+
+Layout: 8 byte magic, uint32 record count, then one fixed-size row of
+(offset, length) pairs per record, then the UTF-8 field data.
+"""
+import json
+import mmap
+import os
+import struct
+from collections import namedtuple
+from pathlib import Path
+
+from pattern_index import tokenize
+
+MAGIC = b"CPSTORE1"
+FIELDS = ('title', 'skill_level', 'materials', 'instructions', 'context', 'terms', 'source_file')
+ROW = struct.Struct('<' + 'QI' * len(FIELDS))
+HEADER = struct.Struct('<8sI')
+
+TrainingRecord = namedtuple('TrainingRecord', FIELDS)
+
+DEFAULT_SOURCE = Path("training_data/training_data.jsonl")
+DEFAULT_STORE = Path("training_data/training_store.bin")
+
+
+def parse_example(example):
+    """Turn one raw JSONL example into a TrainingRecord"""
+    output = example.get('output', '')
+    title = skill_level = materials = instructions = ''
+    context = f"{output[:400]}..."
+
+    if '```json' in output:
+        try:
+            json_str = output.replace('```json', '').replace('```', '').strip()
+            pattern_data = json.loads(json_str)
+            title = str(pattern_data.get('title', 'Pattern'))
+            skill_level = str(pattern_data.get('skill_level', ''))
+            materials = str(pattern_data.get('materials', []))
+            instructions = str(pattern_data.get('instructions', {}))
+            context = f"Materials: {materials[:200]}...\nInstructions: {instructions[:300]}..."
+        except (ValueError, AttributeError):
+            pass
+
+    return TrainingRecord(
+        title=title,
+        skill_level=skill_level,
+        materials=materials,
+        instructions=instructions,
+        context=context,
+        terms=' '.join(sorted(tokenize(output))),
+        source_file=example.get('source_file', ''),
+    )
+
+
+def format_context(record, i):
+    """Render a record as the numbered example block used in prompts"""
+    if record.title:
+        return f"Example {i} - {record.title}:\n{record.context}\n\n"
+    return f"Example {i}: {record.context}\n\n"
+
+
+def compile_training_data(source=DEFAULT_SOURCE, store=DEFAULT_STORE):
+    """Parse the JSONL corpus once and write the binary store atomically"""
+    source, store = Path(source), Path(store)
+    rows = []
+    data = bytearray()
+
+    with open(source, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = parse_example(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+            row = []
+            for value in record:
+                encoded = value.encode('utf-8')
+                row.extend((len(data), len(encoded)))
+                data += encoded
+            rows.append(row)
+
+    # Per-process name: API workers that start together may all find the store stale
+    tmp_path = store.with_suffix(f"{store.suffix}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(rows)))
+            for row in rows:
+                f.write(ROW.pack(*row))
+            f.write(data)
+        os.replace(tmp_path, store)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return len(rows)
+
+
+def is_stale(source=DEFAULT_SOURCE, store=DEFAULT_STORE):
+    """True when the store is missing or older than its JSONL source"""
+    source, store = Path(source), Path(store)
+    if not store.exists():
+        return True
+    return source.exists() and source.stat().st_mtime > store.stat().st_mtime
+
+
+class TrainingStore:
+    """Read-only sequence of TrainingRecords backed by a memory-mapped file"""
+
+    def __init__(self, path=DEFAULT_STORE):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a training store")
+        self._data_start = HEADER.size + ROW.size * self._count
+
+    def __len__(self):
+        return self._count
+
+    def field(self, index, name):
+        """Decode a single field without materializing the whole record"""
+        row = ROW.unpack_from(self._buffer, HEADER.size + ROW.size * index)
+        pos = FIELDS.index(name) * 2
+        start = self._data_start + row[pos]
+        return self._buffer[start:start + row[pos + 1]].decode('utf-8')
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("training record index out of range")
+        row = ROW.unpack_from(self._buffer, HEADER.size + ROW.size * index)
+        values = []
+        for offset, length in zip(row[::2], row[1::2]):
+            start = self._data_start + offset
+            values.append(self._buffer[start:start + length].decode('utf-8'))
+        return TrainingRecord(*values)
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+
+if __name__ == "__main__":
+    count = compile_training_data()
+    print(f"Compiled {count} training examples into {DEFAULT_STORE}")